@@ -1,4 +1,5 @@
 import os
+from common.utils.document_processor import iter_document_pages
 from common.utils.doc_paraphraser import DocumentParaphraser
 from common.utils.pdf_paraphraser import Paraphrasepdf
 from common.utils.excel_pharaphraser import ExcelDataProcessor
@@ -46,6 +47,10 @@ class FileTextExtractor:
 
         return "", "unknown"
 
+    def iter_pages(self, file_path: str, file_bytes: bytes | None = None):
+        """Yield (page_no, text, source) as pages are extracted; see iter_document_pages."""
+        return iter_document_pages(file_path, file_bytes)
+
     def _extract_pdf(self, file_bytes: bytes) -> str:
         """Extract text from PDF bytes."""
         return self.pdf_processor.extract_text_from_pdf(file_bytes)
@@ -57,3 +62,16 @@ class FileTextExtractor:
     def _extract_docx(self, file_bytes: bytes) -> str:
         """Extract text from Word document bytes."""
         return self.doc_processor.extract_text_from_docx(file_bytes)
+
+
+def iter_text_chunks(texts, chunk_size: int):
+    """Fixed-size windows over "\n".join(texts), produced while the texts are still streaming in."""
+    buffer, first = "", True
+    for text in texts:
+        buffer += text if first else "\n" + text
+        first = False
+        while len(buffer) >= chunk_size:
+            yield buffer[:chunk_size]
+            buffer = buffer[chunk_size:]
+    if buffer:
+        yield buffer
@@ -1,7 +1,6 @@
 import os
-import uuid
 from pinecone import Pinecone, ServerlessSpec
-from sentence_transformers import SentenceTransformer
+from common.utils.text_encoder import get_text_encoder
 
 
 class PineconeStore:
@@ -32,19 +31,20 @@ class PineconeStore:
         # Connect to index
         self.index = self.pc.Index(self.index_name)
 
-        # Load embedding model once
-        self.embedder = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+        # Embedding model is loaded once per process and shared with the document classifiers
+        self.embedder = get_text_encoder()
 
-    def add_chunks(self, upload_id, chunks):
+    def add_chunks(self, upload_id, chunks, start=0):
         """
         Store chunks in Pinecone under a namespace (upload_id).
+        Vector IDs are (upload_id, chunk position), so re-indexing overwrites instead of duplicating.
         Returns list of vector IDs.
         """
         embeddings = self.embedder.encode(chunks).tolist()
 
         vectors, vector_ids = [], []
-        for chunk, embedding in zip(chunks, embeddings):
-            vid = str(uuid.uuid4())
+        for position, (chunk, embedding) in enumerate(zip(chunks, embeddings), start=start):
+            vid = f"{upload_id}-{position}"
             vectors.append({
                 "id": vid,
                 "values": embedding,
@@ -55,6 +55,12 @@ class PineconeStore:
         self.index.upsert(vectors=vectors, namespace=str(upload_id))
         return vector_ids
 
+    def delete_chunks(self, upload_id, vector_ids, batch_size=1000):
+        """Remove vectors by ID from the upload's namespace (missing IDs are ignored)."""
+        vector_ids = list(vector_ids)
+        for i in range(0, len(vector_ids), batch_size):
+            self.index.delete(ids=vector_ids[i:i + batch_size], namespace=str(upload_id))
+
     def query(self, upload_id, question, top_k=3):
         """
         Query Pinecone for top chunks related to a question.
@@ -4,10 +4,15 @@ from django.shortcuts import get_object_or_404
 from common.jsonResponse.response import JSONResponseSender
 from common.models import ChatbotUpload, ChatbotChunk, ChatbotSession
 from common.serializers import ChatbotUploadSerializer, ChatbotSessionSerializer
-from .utils.file_text_extractor import FileTextExtractor
+from .utils.file_text_extractor import FileTextExtractor, iter_text_chunks
 from .utils.pinecone_store import PineconeStore
 from .utils.llm import OpenRouterLLM
+from common.utils.content_hash import uploaded_file_hash
 import os
+from itertools import islice
+
+CHUNK_SIZE = 300
+EMBED_BATCH = 64  # chunks embedded + upserted per round trip while extraction continues
 
 # Initialize shared utilities (singleton style)
 extractor = FileTextExtractor()
@@ -33,7 +38,8 @@ class ChatbotUploadView(APIView):
                 uploaded_by=request.user,
                 file=uploaded_file,
                 file_name=uploaded_file.name,
-                file_type=uploaded_file.name.split(".")[-1]
+                file_type=uploaded_file.name.split(".")[-1],
+                content_hash=uploaded_file_hash(request, uploaded_file),
             )
 
             return JSONResponseSender.send_success( {
@@ -54,20 +60,54 @@ class ProcessChatbotUploadView(APIView):
         # Extract text
         try:
             upload = get_object_or_404(ChatbotUpload, id=pk, uploaded_by=request.user)
-            text, file_type = extractor.extract(upload.file.path, upload.file.read())
 
-            if not text:
+            # A retry replaces the chunks of the earlier attempt instead of adding to them
+            own_namespace = (upload.index_namespace or str(upload.id)) == str(upload.id)
+            stale_vector_ids = set(upload.chunks.values_list("vector_id", flat=True)) if own_namespace else set()
+            ChatbotChunk.objects.filter(upload=upload).delete()
+
+            # Same bytes already indexed by this user: point at the existing vectors instead of re-embedding
+            previous = None
+            if upload.content_hash:
+                previous = (ChatbotUpload.objects
+                            .filter(content_hash=upload.content_hash, processed=True, uploaded_by=request.user)
+                            .exclude(id=upload.id)
+                            .order_by("-uploaded_at")
+                            .first())
+            if previous:
+                ChatbotChunk.objects.bulk_create([
+                    ChatbotChunk(upload=upload, chunk_text=c.chunk_text, vector_id=c.vector_id)
+                    for c in previous.chunks.all()
+                ])
+                upload.index_namespace = previous.index_namespace or str(previous.id)
+                upload.reused_from = previous
+                upload.processed = True
+                upload.save(update_fields=["index_namespace", "reused_from", "processed"])
+                vector_store.delete_chunks(upload.id, stale_vector_ids)
+                return JSONResponseSender.send_success({"message": "File processed & indexed", "reused": True})
+
+            # Chunk & store in Pinecone while later pages are still being extracted
+            pages = extractor.iter_pages(upload.file.path, upload.file.read())
+            chunks = iter_text_chunks((text for _, text, _ in pages), CHUNK_SIZE)
+            indexed = 0
+            while batch := list(islice(chunks, EMBED_BATCH)):
+                vector_ids = vector_store.add_chunks(upload.id, batch, start=indexed)
+                stale_vector_ids.difference_update(vector_ids)
+
+                # Save chunk metadata in DB
+                ChatbotChunk.objects.bulk_create([
+                    ChatbotChunk(upload=upload, chunk_text=chunk, vector_id=vid)
+                    for vid, chunk in zip(vector_ids, batch)
+                ])
+                indexed += len(batch)
+
+            # Vectors of a longer earlier attempt that were not overwritten
+            vector_store.delete_chunks(upload.id, stale_vector_ids)
+
+            if not indexed:
                 return JSONResponseSender.send_error("400", "Unsupported or empty file","Unsupported or empty file")
 
-            # Chunk & store in Pinecone
-            chunk_size = 300
-            chunks = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
-            vector_ids = vector_store.add_chunks(upload.id, chunks)
-
-            # Save chunk metadata in DB
-            for vid, chunk in zip(vector_ids, chunks):
-                ChatbotChunk.objects.create(upload=upload, chunk_text=chunk, vector_id=vid)
-
+            upload.index_namespace = str(upload.id)
             upload.processed = True
             upload.save()
 
@@ -88,7 +128,7 @@ class ChatbotQueryView(APIView):
                 return JSONResponseSender.send_error("error", "Question is required","Question is required")
 
             # Retrieve top chunks
-            top_chunks = vector_store.query(upload.id, question, top_k=3)
+            top_chunks = vector_store.query(upload.index_namespace or upload.id, question, top_k=3)
             context = "\n".join(top_chunks)
 
             # Generate answer
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from common.utils.document_processor import FileTextExtractor
+from common.utils.finance_classifire import FinancialTextClassifier
+
+
+class Command(BaseCommand):
+    help = "Compare documents/sec of the FinBERT backends on the same documents."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="PDF, Word, Excel or plain-text files to classify.")
+        parser.add_argument("--backends", default="local,http",
+                            help="Comma-separated backends to compare (local, http).")
+        parser.add_argument("--repeat", type=int, default=1,
+                            help="Classify the document set this many times per backend.")
+
+    def handle(self, *args, **options):
+        # Text is extracted once up front: only classification is timed
+        extractor = FileTextExtractor()
+        texts = []
+        for path in options["paths"]:
+            if path.endswith(".txt"):
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    texts.append(f.read().lower())
+                continue
+            with open(path, "rb") as f:
+                text, file_type = extractor.extract(path, f.read())
+            if file_type == "unknown":
+                raise CommandError(f"Unsupported file type: {path}")
+            texts.append(text.lower())
+
+        decisions = {}
+        for name in filter(None, (b.strip() for b in options["backends"].split(","))):
+            classifier = FinancialTextClassifier(backend=name)
+            classifier.backend  # load the model outside the timed loop
+            started = time.perf_counter()
+            for _ in range(options["repeat"]):
+                decisions[name] = [classifier.is_financial(text) for text in texts]
+            elapsed = time.perf_counter() - started
+            docs = len(texts) * options["repeat"]
+            self.stdout.write(
+                f"{name:>6}: {docs} docs in {elapsed:.2f}s = {docs / elapsed:.2f} docs/sec, "
+                f"{sum(d is True for d in decisions[name])} financial"
+            )
+
+        if len(decisions) > 1:
+            results = list(decisions.values())
+            agree = sum(len({r[i] for r in results}) == 1 for i in range(len(texts)))
+            self.stdout.write(f"Backends agree on {agree}/{len(texts)} documents")
@@ -0,0 +1,86 @@
+import random
+import re
+import time
+from collections import Counter, deque
+
+from django.core.management.base import BaseCommand
+
+from common.utils.keyword_matcher import KeywordMatcher
+from documents.classifier.tasks import RuleBasedClassifier
+
+FILLER = ["the", "company", "year", "ended", "march", "note", "amount", "total", "q3", "fy24", "1,204", "(12.5)"]
+
+
+class AhoCorasick:
+    """Textbook pure-Python automaton, kept here only as a point of comparison."""
+
+    def __init__(self, keywords):
+        self.goto, self.fail, self.out = [{}], [0], [[]]
+        for kw in keywords:
+            node = 0
+            for ch in kw:
+                if ch not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[node][ch] = len(self.goto) - 1
+                node = self.goto[node][ch]
+            self.out[node].append(kw)
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[child] = self.goto[f].get(ch, 0) if self.goto[f].get(ch, 0) != child else 0
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def counts(self, text: str) -> Counter:
+        hits, node, goto, fail, out = Counter(), 0, self.goto, self.fail, self.out
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                hits.update(out[node])
+        return hits
+
+
+class Command(BaseCommand):
+    help = "Time keyword counting strategies on synthetic sheet text (ms per text)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="200,2000,20000,200000",
+                            help="Comma-separated text lengths in characters.")
+        parser.add_argument("--density", type=float, default=0.02,
+                            help="Share of words that are keywords.")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        keywords = [kw for kws in RuleBasedClassifier.DEFAULT_RULES.values() for kw in kws]
+        alternation = re.compile("|".join(map(re.escape, sorted(keywords, key=len, reverse=True))))
+        strategies = {
+            "str.count": KeywordMatcher(keywords).counts,
+            "regex scan": lambda text: Counter(alternation.findall(text)),  # non-overlapping, not exact
+            "aho-corasick": AhoCorasick(keywords).counts,
+        }
+
+        for size in (int(s) for s in options["sizes"].split(",")):
+            words, length = [], 0
+            while length < size:
+                word = rng.choice(keywords) if rng.random() < options["density"] else rng.choice(FILLER)
+                words.append(word)
+                length += len(word) + 1
+            text = " ".join(words)[:size]
+
+            timings = []
+            for name, count in strategies.items():
+                started = time.perf_counter()
+                for _ in range(options["repeat"]):
+                    count(text)
+                timings.append(f"{name} {(time.perf_counter() - started) * 1000 / options['repeat']:.3f}")
+            self.stdout.write(f"{size:>8} chars: " + " | ".join(timings))
@@ -15,7 +15,6 @@ from django.db import models
 from .enums.company_enums import Sector, SubSector
 from datetime import datetime, date, timedelta
 import mimetypes
-import datetime
 # Create your models here.
 
 class UserManager(BaseUserManager):
@@ -165,11 +164,22 @@ class DocumentUpload(models.Model):
 
 
 class ExtractedDocument(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("done", "Done"),
+        ("skipped", "Skipped"),
+        ("failed", "Failed"),
+    ]
     upload = models.ForeignKey(DocumentUpload, on_delete=models.CASCADE, related_name='extracted_files')
     file_name = models.CharField(max_length=255)
-    file_path = models.TextField()
+    file_path = models.TextField()  # member path inside the ZIP (nested folders kept)
     file_type = models.CharField(max_length=50)
     preview_text = models.TextField(blank=True, null=True)
+    file_size = models.BigIntegerField(null=True, blank=True)  # uncompressed bytes
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    error = models.TextField(blank=True, null=True)
+    # Excel members go through the workbook pipeline
+    workbook = models.ForeignKey("documents.UploadedFile", on_delete=models.SET_NULL, null=True, blank=True, related_name="zip_members")
 
     def save(self, *args, **kwargs):
         if not self.file_type:
@@ -195,6 +205,12 @@ class UserFile(models.Model):
     is_valid = models.BooleanField(default=False)
     validation_reason = models.TextField(blank=True, null=True)
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default="uploaded")
+    stage = models.CharField(max_length=50, null=True, blank=True)  # current pipeline step
+    progress = models.PositiveSmallIntegerField(default=0)  # percent complete
+    stage_updated_at = models.DateTimeField(null=True, blank=True)
+    job_id = models.CharField(max_length=255, null=True, blank=True)  # celery task id
+    content_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)  # sha256 of the upload
+    reused_from = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, blank=True, related_name="reuses")
     created_at = models.DateTimeField(auto_now_add=True)
 
 
@@ -258,6 +274,9 @@ class ChatbotUpload(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
     uploaded_by = models.ForeignKey(User,on_delete=models.CASCADE,related_name="uploaded_user",null=True)
     processed = models.BooleanField(default=False)
+    content_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)  # sha256 of the upload
+    reused_from = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, blank=True, related_name="reuses")
+    index_namespace = models.CharField(max_length=255, null=True, blank=True)  # Pinecone namespace holding the vectors
 
     def __str__(self):
         return f"ChatbotDoc: {self.file_name}"
@@ -276,3 +295,18 @@ class ChatbotSession(models.Model):
     question = models.TextField()
     answer = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+
+
+class OCRCacheEntry(models.Model):
+    """OCR text keyed by the SHA-256 of the image bytes (LRU-evicted by last_used_at)."""
+    content_hash = models.CharField(max_length=64, primary_key=True)
+    text = models.TextField(blank=True)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        db_table = "ocr_cache"
+
+    def __str__(self):
+        return f"OCR cache {self.content_hash[:12]} ({self.hits} hits)"
@@ -1,43 +1,148 @@
-# bronze/tasks.py
+# common/tasks.py
+import hashlib
+import posixpath
 import zipfile
-import os
-import mimetypes
+from collections import Counter
+from itertools import islice
+
+from celery import shared_task, chord, group
 from django.conf import settings
-from documents.models import DocumentUpload, ExtractedDocument
+from django.core.files.base import ContentFile
+
+from .models import DocumentUpload, ExtractedDocument
+from .utils.ocr_cache import evict_ocr_cache
+from .utils.zip_ingest import iter_members
+
+INSERT_BATCH = 500
+
 
+def _batched(iterable, size):
+    it = iter(iterable)
+    while batch := list(islice(it, size)):
+        yield batch
 
+
+# ------------------------------------------------
+# 🔹 ZIP ingestion (fan-out per batch of members)
+# ------------------------------------------------
 @shared_task
 def process_uploaded_zip(upload_id):
+    """
+    Register every member of a data-room ZIP and extract them in parallel.
+
+    Members are read from the archive in place (nothing is unpacked to disk),
+    typed by their leading bytes and inserted in batches. Extraction runs in
+    batches of ZIP_MEMBERS_PER_TASK on the zip_members queue, so the worker
+    pool bounds how many members are processed at once.
+    """
+    upload = DocumentUpload.objects.get(id=upload_id)
     try:
-        upload = DocumentUpload.objects.get(id=upload_id)
+        document_ids = []
+        with upload.zip_file.open("rb") as f, zipfile.ZipFile(f) as zf:
+            for members in _batched(iter_members(zf), INSERT_BATCH):
+                created = ExtractedDocument.objects.bulk_create([
+                    ExtractedDocument(
+                        upload=upload,
+                        file_name=posixpath.basename(info.filename),
+                        file_path=info.filename,
+                        file_type=kind,
+                        file_size=info.file_size,
+                        status="pending" if kind != "unknown" else "skipped",
+                    )
+                    for info, kind in members
+                ])
+                document_ids.extend(d.id for d in created if d.status == "pending")
+
         upload.status = "extracted"
         upload.save(update_fields=["status"])
 
-        extract_dir = os.path.join(settings.MEDIA_ROOT, f"bronze/{upload.company.id}/extracted/{upload.id}")
-        os.makedirs(extract_dir, exist_ok=True)
+        if not document_ids:
+            return task_finish_zip_upload([], upload_id)
+        header = group(
+            task_extract_zip_members.s(upload_id, batch)
+            for batch in _batched(document_ids, settings.ZIP_MEMBERS_PER_TASK)
+        )
+        # Errors outside the per-member handling fail the chord: mark the upload instead of leaving it "extracted"
+        callback = task_finish_zip_upload.s(upload_id).on_error(task_zip_upload_failed.s(upload_id))
+        chord(header)(callback)
+        return {"upload_id": upload_id, "members": len(document_ids)}
 
-        with zipfile.ZipFile(upload.zip_file.path, "r") as zf:
-            zf.extractall(extract_dir)
+    except Exception as e:
+        DocumentUpload.objects.filter(id=upload_id).update(status="failed", error_log=str(e))
+        raise
 
-        for file_name in os.listdir(extract_dir):
-            file_path = os.path.join(extract_dir, file_name)
-            file_type = mimetypes.guess_type(file_path)[0] or "unknown"
 
-            ExtractedDocument.objects.create(
-                upload=upload,
-                file_name=file_name,
-                file_path=file_path,
-                file_type=file_type,
-                preview_text=None  # optional: run OCR/parser later
-            )
+def _extract_member(document: ExtractedDocument, data: bytes, upload: DocumentUpload):
+    # Extractors are imported per type: their native dependencies are only needed on workers that see them
+    if document.file_type == "pdf":
+        from .utils.pdf_paraphraser import Paraphrasepdf
+        document.preview_text = Paraphrasepdf().extract_text_from_pdf(data)
+    elif document.file_type == "docx":
+        from .utils.doc_paraphraser import DocumentParaphraser
+        document.preview_text = DocumentParaphraser().extract_text_from_docx(data)
+    elif document.file_type == "doc":
+        from .utils.doc_paraphraser import DocumentParaphraser
+        document.preview_text = DocumentParaphraser().extract_text_from_doc(data)
+    elif document.file_type == "excel":
+        from documents.models import UploadedFile
+        from documents.extractor.tasks import task_extract_workbook
 
-        upload.status = "processed"
-        upload.save(update_fields=["status"])
-        return f"Upload {upload_id} processed successfully."
+        workbook = UploadedFile(
+            filename=document.file_name,
+            metadata={"file_size": round(len(data) / (1024 * 1024), 2), "zip_upload_id": upload.id},
+            content_hash=hashlib.sha256(data).hexdigest(),
+            company_id=upload.company_id,
+            uploaded_by_id=upload.uploaded_by_id,
+        )
+        workbook.s3_path.save(document.file_name, ContentFile(data), save=True)
+        job = task_extract_workbook.delay(str(workbook.file_id))
+        UploadedFile.objects.filter(file_id=workbook.file_id).update(job_id=job.id)
+        document.workbook = workbook
 
-    except Exception as e:
-        upload = DocumentUpload.objects.get(id=upload_id)
-        upload.status = "failed"
-        upload.error_log = str(e)
-        upload.save(update_fields=["status", "error_log"])
-        raise
+
+@shared_task
+def task_extract_zip_members(upload_id, document_ids):
+    """Extract a batch of members, opening the archive once for the whole batch."""
+    upload = DocumentUpload.objects.get(id=upload_id)
+    documents = list(ExtractedDocument.objects.filter(id__in=document_ids, status="pending"))
+    with upload.zip_file.open("rb") as f, zipfile.ZipFile(f) as zf:
+        for document in documents:
+            try:
+                _extract_member(document, zf.read(document.file_path), upload)
+                document.status, document.error = "done", None
+            except Exception as e:
+                document.status, document.error = "failed", str(e)
+
+    ExtractedDocument.objects.bulk_update(documents, ["preview_text", "status", "error", "workbook"])
+    return dict(Counter(d.status for d in documents))
+
+
+@shared_task
+def task_finish_zip_upload(batch_results, upload_id):
+    counts = {}
+    for result in batch_results:
+        for status, n in result.items():
+            counts[status] = counts.get(status, 0) + n
+
+    failed = counts.get("failed", 0)
+    DocumentUpload.objects.filter(id=upload_id).update(
+        status="processed",
+        error_log=f"{failed} member(s) failed to extract" if failed else None,
+    )
+    return {"upload_id": upload_id, **counts}
+
+
+@shared_task
+def task_zip_upload_failed(request, exc, traceback, upload_id):
+    # Members of the batch that crashed were never written back
+    ExtractedDocument.objects.filter(upload_id=upload_id, status="pending").update(status="failed", error=str(exc))
+    DocumentUpload.objects.filter(id=upload_id).update(status="failed", error_log=f"Member extraction failed: {exc}")
+
+
+# ------------------------------------------------
+# 🔹 OCR cache upkeep (beat)
+# ------------------------------------------------
+@shared_task
+def task_evict_ocr_cache():
+    """Trim the OCR cache to OCR_CACHE_MAX_ENTRIES rows."""
+    return {"evicted": evict_ocr_cache()}
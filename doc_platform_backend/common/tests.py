@@ -1,3 +1,279 @@
-from django.test import TestCase
+import base64
+import io
+import random
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
 
-# Create your tests here.
+import fitz  # PyMuPDF
+from celery.exceptions import TimeoutError as CeleryTimeoutError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from common import tasks as common_tasks
+from common.models import Company, DocumentUpload, ExtractedDocument, OCRCacheEntry, User
+from common.utils import ocr_engine
+from common.utils.ocr_engine import OCREngine
+from common.utils.keyword_matcher import KeywordMatcher
+from common.utils.ocr_cache import OCRResultCache, evict_ocr_cache, image_fingerprint
+from common.utils.pdf_pages import PDFPageExtractor
+from common.utils.zip_ingest import OLE_MAGIC, iter_members
+
+
+class FakeOCREngine:
+    def __init__(self):
+        self.calls = []
+
+    def recognize_many(self, images):
+        self.calls.append(len(images))
+        return [f"text:{img.decode()}" for img in images]
+
+    def recognize(self, img_bytes):
+        return self.recognize_many([img_bytes])[0]
+
+
+# ------------------------------------------------
+# 🔹 OCR result cache
+# ------------------------------------------------
+@override_settings(OCR_CACHE_TOUCH_SECONDS=3600)
+class OCRResultCacheTests(TestCase):
+    def test_misses_are_recognised_and_stored_in_one_batch(self):
+        engine = FakeOCREngine()
+        # read + insert, no eviction on the write path
+        with self.assertNumQueries(2):
+            texts = OCRResultCache(engine=engine).ocr_images([b"a", b"b", b"a"])
+        self.assertEqual(texts, ["text:a", "text:b", "text:a"])
+        self.assertEqual(engine.calls, [2])
+        self.assertEqual(OCRCacheEntry.objects.count(), 2)
+
+    def test_fresh_hits_cost_one_read(self):
+        OCRResultCache(engine=FakeOCREngine()).ocr_images([b"a", b"b"])
+        engine = FakeOCREngine()
+        with self.assertNumQueries(1):
+            texts = OCRResultCache(engine=engine).ocr_images([b"a", b"b"])
+        self.assertEqual(texts, ["text:a", "text:b"])
+        self.assertEqual(engine.calls, [])
+
+    def test_stale_hits_are_touched_with_one_conditional_update(self):
+        OCRResultCache(engine=FakeOCREngine()).ocr_images([b"a", b"b"])
+        old = timezone.now() - timedelta(hours=2)
+        OCRCacheEntry.objects.filter(content_hash=image_fingerprint(b"a")).update(last_used_at=old)
+
+        with self.assertNumQueries(2):
+            OCRResultCache(engine=FakeOCREngine()).ocr_images([b"a", b"b"])
+        touched = OCRCacheEntry.objects.get(content_hash=image_fingerprint(b"a"))
+        self.assertGreater(touched.last_used_at, old)
+        self.assertEqual(touched.hits, 1)
+        self.assertEqual(OCRCacheEntry.objects.get(content_hash=image_fingerprint(b"b")).hits, 0)
+
+    def test_eviction_keeps_the_most_recently_used_rows(self):
+        now = timezone.now()
+        OCRCacheEntry.objects.bulk_create([
+            OCRCacheEntry(content_hash=f"{i:064d}", text=str(i), last_used_at=now - timedelta(minutes=i))
+            for i in range(12)
+        ])
+        self.assertEqual(evict_ocr_cache(max_entries=5), 7)
+        self.assertEqual(
+            sorted(OCRCacheEntry.objects.values_list("text", flat=True)), ["0", "1", "2", "3", "4"]
+        )
+        self.assertEqual(evict_ocr_cache(max_entries=5), 0)
+
+
+# ------------------------------------------------
+# 🔹 OCR engine dispatch
+# ------------------------------------------------
+def daemonic(flag=True):
+    return patch.object(ocr_engine.multiprocessing, "current_process", return_value=SimpleNamespace(daemon=flag))
+
+
+class OCRDispatchTests(SimpleTestCase):
+    def test_daemonic_callers_send_the_batch_to_the_ocr_worker(self):
+        engine = OCREngine(processes=1)
+        with daemonic(), patch.object(ocr_engine.task_recognize_batch, "apply_async") as apply_async, \
+                patch.object(engine, "_recognize_here") as here:
+            apply_async.return_value.get.return_value = ["one", "two"]
+            self.assertEqual(engine.recognize_many([b"1", b"2"]), ["one", "two"])
+        here.assert_not_called()
+        payload = apply_async.call_args.args[0][0]
+        self.assertEqual([base64.b64decode(p) for p in payload], [b"1", b"2"])
+
+    def test_unanswered_ocr_worker_falls_back_in_process(self):
+        engine = OCREngine(processes=1)
+        with daemonic(), patch.object(ocr_engine.task_recognize_batch, "apply_async") as apply_async, \
+                patch.object(engine, "_recognize_here", return_value=["local"]) as here:
+            apply_async.return_value.get.side_effect = CeleryTimeoutError()
+            self.assertEqual(engine.recognize_many([b"1"]), ["local"])
+        apply_async.return_value.revoke.assert_called_once()
+        here.assert_called_once_with([b"1"])
+
+    @override_settings(OCR_DISPATCH="local")
+    def test_local_dispatch_never_uses_the_queue(self):
+        engine = OCREngine(processes=1)
+        with daemonic(), patch.object(ocr_engine.task_recognize_batch, "apply_async") as apply_async, \
+                patch.object(engine, "_recognize_here", return_value=["local"]):
+            self.assertEqual(engine.recognize_many([b"1"]), ["local"])
+        apply_async.assert_not_called()
+
+    def test_ocr_worker_task_recognises_on_its_own_engine(self):
+        with patch.object(OCREngine, "_recognize_here", return_value=["x"]) as here:
+            self.assertEqual(ocr_engine.task_recognize_batch([base64.b64encode(b"img").decode()]), ["x"])
+        here.assert_called_once_with([b"img"])
+
+
+# ------------------------------------------------
+# 🔹 PDF page extraction
+# ------------------------------------------------
+def text_pdf(page_count: int) -> bytes:
+    doc = fitz.open()
+    for i in range(page_count):
+        doc.new_page().insert_text((72, 72), f"Page {i} revenue and operating profit for the year")
+    try:
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+class PDFPageExtractorTests(SimpleTestCase):
+    def test_more_shards_than_the_in_flight_window(self):
+        # 25 shards through a window of 4: every later submit must still name the document
+        extractor = PDFPageExtractor(processes=2, shard_pages=4)
+        try:
+            pages = list(extractor.iter_pages(text_pdf(100)))
+        finally:
+            extractor.shutdown()
+        self.assertEqual([p[0] for p in pages], list(range(100)))
+        self.assertEqual({p[2] for p in pages}, {"native"})
+        self.assertTrue(pages[99][1].startswith("Page 99 "))
+        self.assertEqual(extractor.stats["shards"], 25)
+
+    def test_in_process_path_matches_the_pool(self):
+        pdf = text_pdf(10)
+        extractor = PDFPageExtractor(processes=1, shard_pages=4)
+        self.assertEqual([p[0] for p in extractor.iter_pages(pdf)], list(range(10)))
+
+
+# ------------------------------------------------
+# 🔹 Keyword matcher
+# ------------------------------------------------
+def reference_whole_word_count(text: str, kw: str) -> int:
+    """Left-to-right non-overlapping hits whose neighbours are not word characters."""
+    n, pos = 0, 0
+    while (pos := text.find(kw, pos)) != -1:
+        before = text[pos - 1] if pos else " "
+        after = text[pos + len(kw)] if pos + len(kw) < len(text) else " "
+        if not (before.isalnum() or before == "_") and not (after.isalnum() or after == "_"):
+            n += 1
+            pos += len(kw)
+        else:
+            pos += 1
+    return n
+
+
+class KeywordMatcherTests(SimpleTestCase):
+    ALPHABET = "ab _%&1"
+
+    def random_case(self, rng):
+        keywords = ["".join(rng.choice(self.ALPHABET) for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 8))]
+        text = "".join(rng.choice(self.ALPHABET) for _ in range(rng.randint(0, 80)))
+        return keywords, text
+
+    def test_substring_counts_match_str_count(self):
+        rng = random.Random(3)
+        for trial in range(500):
+            keywords, text = self.random_case(rng)
+            matcher = KeywordMatcher(keywords)
+            with self.subTest(trial=trial, keywords=keywords, text=text):
+                expected = {kw: text.count(kw) for kw in keywords if kw and text.count(kw)}
+                self.assertEqual(dict(matcher.counts(text)), expected)
+                self.assertEqual(matcher.any_match(text), bool(expected))
+
+    def test_whole_word_counts_match_reference(self):
+        rng = random.Random(5)
+        for trial in range(500):
+            keywords, text = self.random_case(rng)
+            matcher = KeywordMatcher(keywords, whole_words=True)
+            expected = {kw: reference_whole_word_count(text, kw) for kw in keywords}
+            expected = {kw: n for kw, n in expected.items() if n}
+            with self.subTest(trial=trial, keywords=keywords, text=text):
+                self.assertEqual(dict(matcher.counts(text)), expected)
+                self.assertEqual(matcher.any_match(text), bool(expected))
+
+    def test_label_counts(self):
+        rules = {"pnl": ["revenue", "net income"], "cash_flow": ["net cash", "cash flow"]}
+        matcher = KeywordMatcher([kw for kws in rules.values() for kw in kws])
+        self.assertEqual(
+            matcher.label_counts("revenue, net income and net cash flow from revenue", rules),
+            {"pnl": 3, "cash_flow": 2},
+        )
+
+
+# ------------------------------------------------
+# 🔹 ZIP ingestion
+# ------------------------------------------------
+def zip_bytes(members: dict) -> bytes:
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w") as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return out.getvalue()
+
+
+class ZipIngestTests(TestCase):
+    def test_ole_word_files_are_typed_doc(self):
+        ole = OLE_MAGIC + b"\0" * 64
+        docx = zip_bytes({"word/document.xml": "<w:document/>"})
+        archive = zip_bytes({
+            "a/legacy.doc": ole, "b/misnamed.docx": ole, "c/book.xls": ole,
+            "d/report.docx": docx, "e/report.pdf": b"%PDF-1.7", "f/other.bin": ole,
+        })
+        with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+            kinds = {info.filename: kind for info, kind in iter_members(zf)}
+        self.assertEqual(kinds, {
+            "a/legacy.doc": "doc", "b/misnamed.docx": "doc", "c/book.xls": "excel",
+            "d/report.docx": "docx", "e/report.pdf": "pdf", "f/other.bin": "unknown",
+        })
+
+    def test_doc_members_go_to_the_converter(self):
+        document = ExtractedDocument(file_name="legacy.doc", file_path="legacy.doc", file_type="doc")
+        with patch("common.utils.doc_paraphraser.DocumentParaphraser._extract_via_pdf", return_value="text") as via_pdf:
+            common_tasks._extract_member(document, b"ole bytes", upload=None)
+        via_pdf.assert_called_once_with(b"ole bytes", suffix=".doc")
+        self.assertEqual(document.preview_text, "text")
+
+    def test_workbook_members_keep_the_uploader(self):
+        user = User.objects.create(email="analyst@example.com", name="Analyst")
+        upload = DocumentUpload.objects.create(
+            company=Company.objects.create(company_name="Acme", incorporation_date="2020-01-01"), uploaded_by=user, file_size=1, status="extracted",
+        )
+        document = ExtractedDocument(upload=upload, file_name="book.xlsx", file_path="book.xlsx", file_type="excel")
+        media = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media), \
+                    patch("documents.extractor.tasks.task_extract_workbook.delay") as delay:
+                delay.return_value.id = "job"
+                common_tasks._extract_member(document, b"xlsx bytes", upload=upload)
+        finally:
+            shutil.rmtree(media, ignore_errors=True)
+        self.assertEqual(document.workbook.uploaded_by_id, user.id)
+        self.assertEqual(document.workbook.company_id, upload.company_id)
+
+    def test_chord_failure_marks_the_upload_failed(self):
+        user = User.objects.create(email="ops@example.com", name="Ops")
+        upload = DocumentUpload.objects.create(
+            company=Company.objects.create(company_name="Acme", incorporation_date="2020-01-01"), uploaded_by=user, file_size=1, status="extracted",
+        )
+        done = ExtractedDocument.objects.create(upload=upload, file_name="a.pdf", file_path="a.pdf",
+                                                file_type="pdf", status="done")
+        pending = ExtractedDocument.objects.create(upload=upload, file_name="b.pdf", file_path="b.pdf",
+                                                   file_type="pdf", status="pending")
+
+        common_tasks.task_zip_upload_failed(None, RuntimeError("archive unreadable"), None, upload.id)
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, "failed")
+        self.assertIn("archive unreadable", upload.error_log)
+        self.assertEqual(ExtractedDocument.objects.get(id=done.id).status, "done")
+        self.assertEqual(ExtractedDocument.objects.get(id=pending.id).status, "failed")
@@ -0,0 +1,51 @@
+import hashlib
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ContentHashUploadHandler(FileUploadHandler):
+    """
+    Compute a SHA-256 of every uploaded file while it streams in.
+
+    Must be listed first in FILE_UPLOAD_HANDLERS: it only observes the chunks
+    and hands them on unchanged, so the memory/temp-file handlers after it
+    still build the UploadedFile. Hashes end up in
+    ``request.upload_content_hashes`` keyed by field name and file name.
+    """
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self._digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self._digest.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        hashes = getattr(self.request, "upload_content_hashes", None)
+        if hashes is None:
+            hashes = self.request.upload_content_hashes = {}
+        hashes[(self.field_name, self.file_name)] = self._digest.hexdigest()
+        return None  # let the next handler produce the file object
+
+
+def file_sha256(fileobj) -> str:
+    """SHA-256 of a Django File / UploadedFile, read in chunks."""
+    digest = hashlib.sha256()
+    if hasattr(fileobj, "chunks"):
+        for chunk in fileobj.chunks(CHUNK_SIZE):
+            digest.update(chunk)
+    else:
+        fileobj.seek(0)
+        for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def uploaded_file_hash(request, uploaded_file, field_name: str = "file") -> str:
+    """Hash recorded by ContentHashUploadHandler, or computed now as a fallback."""
+    hashes = getattr(request, "upload_content_hashes", None) or {}
+    return hashes.get((field_name, uploaded_file.name)) or file_sha256(uploaded_file)
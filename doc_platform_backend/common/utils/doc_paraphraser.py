@@ -1,111 +1,75 @@
-import fitz  # PyMuPDF
-import tempfile
-import subprocess
-import os
-import pythoncom
-from pathlib import Path
-import win32com.client
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from docx2pdf import convert
+import logging
+import zipfile
+from xml.etree.ElementTree import ParseError
 
-class DocumentParaphraser:
-    def _ocr_single_page(self, doc, page_num, temp_dir):
-        """Run OCRmyPDF --force-ocr on a single page and return the text."""
-        single_page_path = os.path.join(temp_dir, f"page_{page_num}.pdf")
-        processed_page_path = os.path.join(temp_dir, f"page_{page_num}_ocr.pdf")
-
-        # Extract single page
-        single_doc = fitz.open()
-        single_doc.insert_pdf(doc, from_page=page_num, to_page=page_num)
-        single_doc.save(single_page_path)
-        single_doc.close()
-
-        # Force OCR
-        subprocess.run(
-            ["ocrmypdf", "--force-ocr", single_page_path, processed_page_path],
-            check=True, capture_output=True
-        )
-
-        # Extract text
-        processed_doc = fitz.open(processed_page_path)
-        ocr_text = processed_doc[0].get_text().strip()
-        processed_doc.close()
-
-        return page_num, ocr_text
+from common.utils.docx_reader import DocxTextReader
+from common.utils.ocr_cache import OCRResultCache
+from common.utils.office_converter import get_office_converter
+from common.utils.pdf_pages import get_pdf_extractor
 
-    def _convert_docx_to_pdf(self, docx_data):
-        """Convert DOCX bytes or BytesIO to PDF bytes using Microsoft Word COM automation (Windows only)."""
+logger = logging.getLogger(__name__)
 
-        # Handle BytesIO or bytes
-        if hasattr(docx_data, "read"):
-            docx_data = docx_data.read()
-
-        # Save temp DOCX file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as temp_docx:
-            temp_docx.write(docx_data)
-            docx_path = Path(temp_docx.name)
 
-        pdf_path = docx_path.with_suffix(".pdf")
+class DocumentParaphraser:
+    def _convert_docx_to_pdf(self, docx_data, suffix: str = ".docx") -> bytes:
+        """Convert Word bytes to PDF with the pooled headless LibreOffice (layout-dependent documents only)."""
+        return get_office_converter().convert_to_pdf(docx_data, suffix=suffix)
+
+    def _extract_via_pdf(self, file_bytes, suffix: str) -> str:
+        """Render through LibreOffice, then read pages like any PDF (OCR gate included)."""
+        extractor = get_pdf_extractor()
+        pdf_bytes = self._convert_docx_to_pdf(file_bytes, suffix=suffix)
+        text = "\n".join(text for _, text, _ in extractor.iter_pages(pdf_bytes))
+        self.ocr_gate_stats = {"path": "pdf", **extractor.stats}
+        return text
+
+    def iter_pages(self, file_bytes):
+        """Yield (page_no, text, source) as each page is read; OCR of a page's images happens when it is reached."""
+        if hasattr(file_bytes, "read"):
+            file_bytes = file_bytes.read()
 
         try:
-            # Initialize COM for the current thread
-            pythoncom.CoInitialize()
-
-            # Open Word and convert DOCX → PDF
-            word = win32com.client.DispatchEx("Word.Application")
-            word.Visible = False
-            doc = word.Documents.Open(str(docx_path))
-            doc.SaveAs(str(pdf_path), FileFormat=17)  # 17 = PDF
-            doc.Close()
-            word.Quit()
-
-            # Read PDF bytes
-            with open(pdf_path, "rb") as f:
-                pdf_bytes = f.read()
+            reader = DocxTextReader(file_bytes)
+        except (zipfile.BadZipFile, KeyError, ParseError):
+            extractor = get_pdf_extractor()
+            yield from extractor.iter_pages(self._convert_docx_to_pdf(file_bytes, suffix=".doc"))
+            self.ocr_gate_stats = {"path": "pdf", **extractor.stats}
+            return
 
+        try:
+            yield from reader.iter_pages(ocr_images=lambda images: OCRResultCache().ocr_images(images, keep_empty=True))
         finally:
-            # Cleanup COM and temp files
-            pythoncom.CoUninitialize()
-            if docx_path.exists():
-                os.remove(docx_path)
-            if pdf_path.exists():
-                os.remove(pdf_path)
-
-        return pdf_bytes
+            reader.close()
+        self.ocr_gate_stats = {"path": "native", **reader.stats}
 
     def extract_text_from_docx(self, file_bytes) -> str:
-        """Convert DOCX to PDF and extract text with OCR when needed."""
-        pdf_bytes = self._convert_docx_to_pdf(file_bytes)
-        text_results = {}
-
-        with tempfile.TemporaryDirectory() as temp_dir:
-            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-
-            ocr_pages = []
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                page_text = page.get_text().strip()
-                images = page.get_images(full=True)
-
-                if page_text and not images:
-                    # Text-only page — store directly
-                    text_results[page_num] = page_text
-                else:
-                    # Mixed or image-only page — needs OCR
-                    ocr_pages.append(page_num)
-
-            # Process OCR pages in parallel
-            with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as executor:
-                futures = [
-                    executor.submit(self._ocr_single_page, doc, p, temp_dir)
-                    for p in ocr_pages
-                ]
-                for future in as_completed(futures):
-                    page_num, ocr_text = future.result()
-                    text_results[page_num] = ocr_text
+        """
+        Read paragraphs, tables, headers and footers from the OOXML package and
+        OCR only embedded content images. Legacy .doc files and packages that
+        cannot be parsed go through the headless converter instead.
+        """
+        # Handle BytesIO or bytes
+        if hasattr(file_bytes, "read"):
+            file_bytes = file_bytes.read()
 
-            doc.close()
+        try:
+            reader = DocxTextReader(file_bytes)
+        except (zipfile.BadZipFile, KeyError, ParseError) as e:
+            logger.info("Not a readable DOCX package (%s); converting with LibreOffice", e)
+            return self._extract_via_pdf(file_bytes, suffix=".doc")
 
-        # Combine results in correct order
-        final_text = "\n".join(text_results[p] for p in sorted(text_results.keys()))
-        return final_text
+        try:
+            text = reader.extract_text(ocr_images=lambda images: OCRResultCache().ocr_images(images, keep_empty=True))
+        except (KeyError, ParseError) as e:
+            logger.info("Unreadable DOCX content (%s); converting with LibreOffice", e)
+            return self._extract_via_pdf(file_bytes, suffix=".docx")
+        finally:
+            reader.close()
+        self.ocr_gate_stats = {"path": "native", **reader.stats}
+        return text
+
+    def extract_text_from_doc(self, file_bytes) -> str:
+        """Legacy binary .doc: straight to the headless converter (there is no OOXML package to read)."""
+        if hasattr(file_bytes, "read"):
+            file_bytes = file_bytes.read()
+        return self._extract_via_pdf(file_bytes, suffix=".doc")
@@ -1,10 +1,92 @@
 import os
+import zipfile
+from xml.etree.ElementTree import ParseError
+
+import fitz  # PyMuPDF
+
 from .doc_paraphraser import DocumentParaphraser
+from .docx_reader import DocxTextReader
+from .workbook_loader import WorkbookSource
 from .pdf_paraphraser import Paraphrasepdf
 from .excel_pharaphraser import ExcelDataProcessor
 # from .finance_classifire import FinancialTextClassifier
 
 
+PAGE_TYPES = {
+    ".pdf": "pdf",
+    ".xls": "excel",
+    ".xlsx": "excel",
+    ".doc": "docx",
+    ".docx": "docx",
+}
+
+
+def iter_document_pages(file_path: str, file_bytes: bytes | None = None):
+    """
+    Stream a document as (page_no, text, source) with source "native" or "ocr".
+
+    Pages are yielded as soon as they are ready (PDF pages, DOCX pages split at
+    page breaks, Excel sheets), so callers can start work on the first pages
+    and stop early; closing the generator stops any remaining extraction.
+    """
+    file_type = PAGE_TYPES.get(os.path.splitext(file_path)[1].lower())
+    if file_type == "pdf":
+        yield from Paraphrasepdf().iter_pages(file_bytes if file_bytes is not None else file_path)
+    elif file_type == "docx":
+        if file_bytes is None:
+            with open(file_path, "rb") as f:
+                file_bytes = f.read()
+        yield from DocumentParaphraser().iter_pages(file_bytes)
+    elif file_type == "excel":
+        yield from ExcelDataProcessor().iter_pages(file_path)
+
+
+def _sample_indexes(count: int, samples: int) -> list[int]:
+    """First, last and evenly spaced pages in between (at most `samples`, in order)."""
+    if count <= samples:
+        return list(range(count))
+    if samples <= 1:
+        return [0]
+    return sorted({round(i * (count - 1) / (samples - 1)) for i in range(samples)})
+
+
+def sample_native_pages(file_path: str, file_bytes: bytes | None = None, samples: int = 3):
+    """
+    Native text of a few sampled pages (first, middle, last) as (page_no, text).
+
+    Nothing is OCRed or converted, so this is cheap enough to run before deciding
+    whether a document is worth a full extraction. Returns [] when the format has
+    no native text layer to sample (legacy .doc, unknown types).
+    """
+    file_type = PAGE_TYPES.get(os.path.splitext(file_path)[1].lower())
+    if file_type == "pdf":
+        with (fitz.open(stream=file_bytes, filetype="pdf") if file_bytes is not None else fitz.open(file_path)) as doc:
+            return [(i, doc[i].get_text().strip()) for i in _sample_indexes(len(doc), samples)]
+
+    if file_type == "docx":
+        if file_bytes is None:
+            with open(file_path, "rb") as f:
+                file_bytes = f.read()
+        try:
+            reader = DocxTextReader(file_bytes)
+        except (zipfile.BadZipFile, KeyError, ParseError):
+            return []
+        try:
+            pages = [(page_no, text) for page_no, text, _ in reader.iter_pages(ocr_images=None)]
+        except (KeyError, ParseError):
+            return []
+        finally:
+            reader.close()
+        return [pages[i] for i in _sample_indexes(len(pages), samples)]
+
+    if file_type == "excel":
+        with WorkbookSource(file_bytes if file_bytes is not None else file_path) as source:
+            names = source.sheet_names
+            return [(i, ExcelDataProcessor.sheet_text(source, names[i])) for i in _sample_indexes(len(names), samples)]
+
+    return []
+
+
 class FileTextExtractor:
     """Class to extract text from different file types."""
 
@@ -34,6 +116,10 @@ class FileTextExtractor:
             return self.supported_types[ext](file_path, file_bytes)
         return "", "unknown"
 
+    def iter_pages(self, file_path: str, file_bytes: bytes | None = None):
+        """Streaming counterpart of extract(): yields (page_no, text, source)."""
+        return iter_document_pages(file_path, file_bytes)
+
     def _extract_pdf(self, file_path, file_bytes):
         pdf = Paraphrasepdf()
         text = pdf.extract_text_from_pdf(file_bytes)
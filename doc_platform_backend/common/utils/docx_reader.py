@@ -0,0 +1,244 @@
+import io
+import posixpath
+from itertools import chain
+import zipfile
+import xml.etree.ElementTree as ET
+
+from common.utils.ocr_gate import DECORATIVE_COVERAGE
+
+NS_W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+NS_R = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_A = "http://schemas.openxmlformats.org/drawingml/2006/main"
+NS_WP = "http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing"
+NS_V = "urn:schemas-microsoft-com:vml"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+REL_OFFICE_DOCUMENT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+REL_HEADER = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/header"
+REL_FOOTER = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/footer"
+
+EMU_PER_INCH = 914400
+TWIPS_PER_INCH = 1440
+A4_TWIPS = (11906, 16838)
+
+
+def _w(tag):
+    return f"{{{NS_W}}}{tag}"
+
+
+class DocxTextReader:
+    """
+    Read text straight from a DOCX (OOXML) package: no Word, no PDF render.
+
+    - Body paragraphs, tables (one line per row, cells joined by " | ") and
+      content controls are read in document order, with header and footer
+      text around them.
+    - Embedded images are the only thing OCRed. Images in headers/footers
+      and images displayed smaller than DECORATIVE_COVERAGE of the page are
+      treated as logos and skipped, the same rule the PDF OCR gate uses.
+    - OCR text is placed right after the paragraph that holds the image.
+    """
+
+    def __init__(self, data: bytes):
+        self.zip = zipfile.ZipFile(io.BytesIO(data))
+        self._names = set(self.zip.namelist())
+        self.main_part = self._main_part()
+        self.stats = {"images": 0, "ocr_images": 0, "ocr_avoided": 0}
+
+    def close(self):
+        self.zip.close()
+
+    # ------------------------------
+    # Package structure
+    # ------------------------------
+    def _rels(self, part: str) -> dict:
+        """{rId: (type, target part)} for a part (empty when it has no relationships)."""
+        folder, name = posixpath.split(part)
+        rels_path = posixpath.join(folder, "_rels", f"{name}.rels")
+        if rels_path not in self._names:
+            return {}
+        rels = {}
+        for rel in ET.fromstring(self.zip.read(rels_path)).iter(f"{{{NS_PKG_REL}}}Relationship"):
+            if rel.get("TargetMode") == "External":
+                continue
+            target = posixpath.normpath(posixpath.join(folder, rel.get("Target"))).lstrip("/")
+            rels[rel.get("Id")] = (rel.get("Type"), target)
+        return rels
+
+    def _main_part(self) -> str:
+        for rel_type, target in self._rels("").values():
+            if rel_type == REL_OFFICE_DOCUMENT:
+                return target
+        return "word/document.xml"
+
+    # ------------------------------
+    # Text
+    # ------------------------------
+    @staticmethod
+    def _paragraph_text(p) -> str:
+        parts = []
+        for node in p.iter():
+            if node.tag == _w("t"):
+                parts.append(node.text or "")
+            elif node.tag == _w("tab"):
+                parts.append("\t")
+            elif node.tag in (_w("br"), _w("cr")):
+                parts.append("\n")
+        return "".join(parts).strip()
+
+    def _table_lines(self, tbl) -> list[str]:
+        lines = []
+        for tr in tbl.findall(_w("tr")):
+            cells = [
+                " ".join(filter(None, (self._paragraph_text(p) for p in tc.iter(_w("p")))))
+                for tc in tr.findall(_w("tc"))
+            ]
+            if any(cells):
+                lines.append(" | ".join(cells))
+        return lines
+
+    def _part_text(self, part: str) -> list[str]:
+        root = ET.fromstring(self.zip.read(part))
+        return [text for p in root.iter(_w("p")) if (text := self._paragraph_text(p))]
+
+    # ------------------------------
+    # Images
+    # ------------------------------
+    def _page_area_sq_in(self, body) -> float:
+        size = body.find(f"{_w('sectPr')}/{_w('pgSz')}")
+        width, height = A4_TWIPS
+        if size is not None:
+            width = int(size.get(_w("w"), width))
+            height = int(size.get(_w("h"), height))
+        return (width / TWIPS_PER_INCH) * (height / TWIPS_PER_INCH)
+
+    def _paragraph_images(self, p, rels: dict, page_area: float) -> list[str]:
+        """Image parts worth OCRing in this paragraph, in order."""
+        images = []
+        for holder in list(p.iter(f"{{{NS_WP}}}inline")) + list(p.iter(f"{{{NS_WP}}}anchor")):
+            extent = holder.find(f"{{{NS_WP}}}extent")
+            area = None
+            if extent is not None:
+                area = (int(extent.get("cx", 0)) / EMU_PER_INCH) * (int(extent.get("cy", 0)) / EMU_PER_INCH)
+            for blip in holder.iter(f"{{{NS_A}}}blip"):
+                images.append((blip.get(f"{{{NS_R}}}embed"), area))
+        # Legacy VML pictures carry no reliable size: always OCR
+        images.extend((img.get(f"{{{NS_R}}}id"), None) for img in p.iter(f"{{{NS_V}}}imagedata"))
+
+        parts, seen = [], set()
+        for rel_id, area in images:
+            target = rels.get(rel_id, (None, None))[1]
+            # mc:AlternateContent repeats a picture as DrawingML and as a VML fallback
+            if not target or target in seen or target not in self._names:
+                continue
+            seen.add(target)
+            self.stats["images"] += 1
+            if area is not None and page_area and area / page_area < DECORATIVE_COVERAGE:
+                self.stats["ocr_avoided"] += 1
+                continue
+            parts.append(target)
+        return parts
+
+    # ------------------------------
+    # Document
+    # ------------------------------
+    def blocks(self):
+        """Yield ("text", line) and ("image", part_name) in reading order."""
+        rels = self._rels(self.main_part)
+        headers = [t for rel_type, t in rels.values() if rel_type == REL_HEADER]
+        footers = [t for rel_type, t in rels.values() if rel_type == REL_FOOTER]
+
+        seen = set()
+        for part in headers:
+            for line in self._part_text(part):
+                # The same letterhead is often repeated for first/odd/even pages
+                if line not in seen:
+                    seen.add(line)
+                    yield "text", line
+
+        body = ET.fromstring(self.zip.read(self.main_part)).find(_w("body"))
+        if body is not None:
+            page_area = self._page_area_sq_in(body)
+            yield from self._body_blocks(body, rels, page_area)
+
+        seen = set()
+        for part in footers:
+            for line in self._part_text(part):
+                if line not in seen:
+                    seen.add(line)
+                    yield "text", line
+
+    @staticmethod
+    def _starts_new_page(p) -> bool:
+        """Explicit page break, page-break-before, or a break Word recorded when it last laid the page out."""
+        if p.find(f"{_w('pPr')}/{_w('pageBreakBefore')}") is not None:
+            return True
+        if p.find(f".//{_w('lastRenderedPageBreak')}") is not None:
+            return True
+        return any(br.get(_w("type")) == "page" for br in p.iter(_w("br")))
+
+    def _body_blocks(self, container, rels, page_area):
+        for child in container:
+            if child.tag == _w("p"):
+                if self._starts_new_page(child):
+                    yield "page_break", None
+                text = self._paragraph_text(child)
+                if text:
+                    yield "text", text
+                for part in self._paragraph_images(child, rels, page_area):
+                    yield "image", part
+            elif child.tag == _w("tbl"):
+                for line in self._table_lines(child):
+                    yield "text", line
+                for p in child.iter(_w("p")):
+                    for part in self._paragraph_images(p, rels, page_area):
+                        yield "image", part
+            elif child.tag == _w("sdt"):
+                content = child.find(_w("sdtContent"))
+                if content is not None:
+                    yield from self._body_blocks(content, rels, page_area)
+
+    def extract_text(self, ocr_images=None) -> str:
+        """
+        Document text with OCR of content images in place.
+
+        ocr_images(list[bytes]) -> list[str] aligned with its input; all images
+        of the document go to it as one batch.
+        """
+        blocks = list(self.blocks())
+        image_parts = [part for kind, part in blocks if kind == "image"]
+        ocr_text = {}
+        if image_parts and ocr_images is not None:
+            unique = list(dict.fromkeys(image_parts))
+            ocr_text = dict(zip(unique, ocr_images([self.zip.read(part) for part in unique])))
+            self.stats["ocr_images"] = len(unique)
+
+        lines = []
+        for kind, value in blocks:
+            text = value if kind == "text" else ocr_text.get(value, "")
+            if text:
+                lines.append(text)
+        return "\n".join(lines)
+
+    def iter_pages(self, ocr_images=None):
+        """
+        Yield (page_no, text, source) page by page, pages split at page breaks.
+
+        Each page yields its native text first, then (when it holds content
+        images) one "ocr" entry; images are OCRed only when their page is reached.
+        """
+        page_no, lines, images = 0, [], []
+        for kind, value in chain(self.blocks(), [("page_break", None)]):
+            if kind == "text":
+                lines.append(value)
+            elif kind == "image":
+                images.append(value)
+            elif lines or images:
+                if lines:
+                    yield page_no, "\n".join(lines), "native"
+                if images and ocr_images is not None:
+                    unique = list(dict.fromkeys(images))
+                    self.stats["ocr_images"] += len(unique)
+                    text = "\n".join(t for t in ocr_images([self.zip.read(part) for part in unique]) if t)
+                    if text:
+                        yield page_no, text, "ocr"
+                page_no, lines, images = page_no + 1, [], []
@@ -1,57 +1,189 @@
+import logging
 import os
 import requests
 import pandas as pd
+from django.conf import settings
 from transformers import AutoTokenizer
 
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "ProsusAI/finbert"
+CHUNK_TOKENS = 510      # + [CLS]/[SEP] = the model's 512-token window
+MIN_POSITIVE_CHUNKS = 2
+POSITIVE_SCORE = 0.8
+
+
+# ------------------------------------------------
+# 🔹 Inference backends: list of chunks -> [(label, score)] per chunk
+# ------------------------------------------------
+class HTTPFinBERTBackend:
+    """HuggingFace inference API; one keep-alive session, one request per batch of chunks."""
+
+    name = "http"
+
+    def __init__(self, hf_token: str = None):
+        self.api_url = f"https://api-inference.huggingface.co/models/{MODEL_NAME}"
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {hf_token or os.environ.get('HF_TOKEN')}"
+
+    def predict(self, chunks: list[str]) -> list[tuple[str, float] | None]:
+        payload = {"inputs": chunks, "parameters": {"truncation": True, "max_length": 512}}
+        result = self.session.post(self.api_url, json=payload, timeout=60).json()
+
+        if isinstance(result, dict) and "error" in result:
+            return [None] * len(chunks)
+        predictions = []
+        for scores in result:
+            if isinstance(scores, list) and scores:
+                best = max(scores, key=lambda x: x["score"])
+                predictions.append((best["label"], best["score"]))
+            else:
+                predictions.append(None)
+        return predictions
+
+
+class LocalFinBERTBackend:
+    """
+    FinBERT on the worker's CPU, loaded once per process.
+
+    Uses an exported ONNX model through onnxruntime when FINBERT_ONNX_PATH
+    points at one; otherwise the PyTorch model with int8 dynamic quantization
+    of its linear layers.
+    """
+
+    name = "local"
+
+    def __init__(self, onnx_path: str | None = None, threads: int | None = None):
+        from transformers import AutoConfig
+
+        self.tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+        self.labels = AutoConfig.from_pretrained(MODEL_NAME).id2label
+        threads = threads or getattr(settings, "FINBERT_THREADS", None) or 1
+        onnx_path = onnx_path or getattr(settings, "FINBERT_ONNX_PATH", None)
+
+        self._session, self._model = None, None
+        try:
+            if not onnx_path:
+                raise ImportError("no ONNX model configured")
+            import onnxruntime as ort
+
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = threads
+            self._session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+            self._inputs = {i.name for i in self._session.get_inputs()}
+        except ImportError:
+            import torch
+            from transformers import AutoModelForSequenceClassification
+
+            torch.set_num_threads(threads)
+            model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME).eval()
+            self._model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def predict_ids(self, chunks: list[list[int]]) -> list[tuple[str, float]]:
+        """Classify already-tokenized chunks (no special tokens) as one padded batch."""
+        batch = self.tokenizer.pad(
+            {"input_ids": [[self.tokenizer.cls_token_id, *ids, self.tokenizer.sep_token_id] for ids in chunks]},
+            return_tensors="np" if self._session is not None else "pt",
+        )
+        batch["token_type_ids"] = batch["input_ids"] * 0
+
+        if self._session is not None:
+            import numpy as np
+
+            logits = self._session.run(None, {k: v.astype(np.int64) for k, v in batch.items() if k in self._inputs})[0]
+            logits = logits - logits.max(axis=1, keepdims=True)
+            probs = np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)
+        else:
+            import torch
+
+            with torch.inference_mode():
+                probs = self._model(**batch).logits.softmax(dim=-1).numpy()
+
+        return [(self.labels[int(row.argmax())], float(row.max())) for row in probs]
+
+    def predict(self, chunks: list[str]) -> list[tuple[str, float]]:
+        return self.predict_ids([self.tokenizer.encode(c, add_special_tokens=False)[:CHUNK_TOKENS] for c in chunks])
+
+
+_backends = {}
+
+
+def get_finbert_backend(name: str | None = None):
+    """Per-process backend instance, so the local model is loaded once per worker."""
+    name = name or getattr(settings, "FINBERT_BACKEND", "local")
+    if name not in _backends:
+        if name == "local":
+            _backends[name] = LocalFinBERTBackend()
+        elif name == "http":
+            _backends[name] = HTTPFinBERTBackend()
+        else:
+            raise ValueError(f"Unknown FinBERT backend '{name}' (expected 'local' or 'http')")
+    return _backends[name]
+
+
 class FinancialTextClassifier:
-    def __init__(self, hf_token: str = None, prob_threshold: float = 0.6):
-        self.api_url = "https://api-inference.huggingface.co/models/ProsusAI/finbert"
-        self.headers = {
-            "Authorization": f"Bearer {hf_token or os.environ.get('HF_TOKEN')}"
-        }
+    def __init__(self, hf_token: str = None, prob_threshold: float = 0.6, backend: str | None = None):
         self.prob_threshold = prob_threshold
+        self.backend_name = backend
+        self.batch_size = getattr(settings, "FINBERT_BATCH_SIZE", 8)
+        if hf_token and (backend or getattr(settings, "FINBERT_BACKEND", "local")) == "http":
+            self._backend = HTTPFinBERTBackend(hf_token)
+        else:
+            self._backend = None
 
         # Tokenizer ensures proper chunking
-        self.tokenizer = AutoTokenizer.from_pretrained("ProsusAI/finbert")
+        self.tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
 
+    @property
+    def backend(self):
+        # Resolved on first use: loading a model must not happen at import time
+        if self._backend is None:
+            self._backend = get_finbert_backend(self.backend_name)
+        return self._backend
 
-    def chunk_text(self, text: str, max_length: int = 512):
-        """Split text into chunks within model's max length"""
+    def chunk_ids(self, text: str, max_length: int = CHUNK_TOKENS):
+        """Token id slices of at most max_length tokens (no special tokens)."""
         tokens = self.tokenizer.encode(text, add_special_tokens=False)
         for i in range(0, len(tokens), max_length):
-            yield self.tokenizer.decode(tokens[i:i+max_length])
+            yield tokens[i:i + max_length]
+
+    def chunk_text(self, text: str, max_length: int = 512):
+        """Split text into chunks within model's max length"""
+        for ids in self.chunk_ids(text, max_length):
+            yield self.tokenizer.decode(ids)
 
     def is_financial(self, text: str) -> bool:
         try:
             if not text or not text.strip():
                 return False
 
+            backend = self.backend
+            chunks = list(self.chunk_ids(text))
             positive_chunks = 0
             total_chunks = 0
 
-            for chunk in self.chunk_text(text, max_length=510):
-                total_chunks += 1
-                payload = {"inputs": chunk,
-                           "parameters": {"truncation": True, "max_length": 512}}
-                response = requests.post(self.api_url, headers=self.headers, json=payload)
-                result = response.json()
-
-                if isinstance(result, dict) and "error" in result:
-                    continue
-                if isinstance(result, list) and len(result) > 0 and isinstance(result[0], list):
-                    result = result[0]
-
-                if isinstance(result, list) and result:
-                    best = max(result, key=lambda x: x["score"])
-                    top_label, top_score = best["label"], best["score"]
+            # Batches in document order; stop as soon as enough chunks are positive
+            for start in range(0, len(chunks), self.batch_size):
+                batch = chunks[start:start + self.batch_size]
+                if hasattr(backend, "predict_ids"):
+                    predictions = backend.predict_ids(batch)
+                else:
+                    predictions = backend.predict([self.tokenizer.decode(ids) for ids in batch])
+                total_chunks += len(batch)
 
-                    if top_label in ("neutral", "positive") and top_score >= 0.8:
+                for prediction in predictions:
+                    if prediction is None:
+                        continue
+                    top_label, top_score = prediction
+                    if top_label in ("neutral", "positive") and top_score >= POSITIVE_SCORE:
                         positive_chunks += 1
+                if positive_chunks >= MIN_POSITIVE_CHUNKS:
+                    break
 
-            print(f"[Decision] {positive_chunks}/{total_chunks} chunks passed")
+            print(f"[Decision] {positive_chunks}/{total_chunks} of {len(chunks)} chunks passed ({backend.name})")
 
             # Require at least 2 positive chunks
-            return positive_chunks >= 2
+            return positive_chunks >= MIN_POSITIVE_CHUNKS
 
         except Exception as e:
             return str(e)
@@ -0,0 +1,56 @@
+import re
+from collections import Counter
+from functools import lru_cache
+
+
+class KeywordMatcher:
+    """
+    Count a fixed keyword set in text, compiled once per process.
+
+    Substring counts are `str.count` per keyword: for the few dozen keywords
+    and short texts scored here that C loop beats both a single-pass regex
+    and a pure-Python Aho–Corasick automaton (see `manage.py
+    benchmark_keyword_matcher`). whole_words=True counts only hits not glued
+    to letters/digits, with one precompiled pattern per keyword.
+
+    `any_match` is one alternation search that stops at the first hit.
+    """
+
+    def __init__(self, keywords, whole_words: bool = False):
+        self.keywords = list(dict.fromkeys(kw for kw in keywords if kw))
+        self.whole_words = whole_words
+
+        # Longest first, so a keyword is not shadowed by its own prefix
+        alternation = "|".join(map(re.escape, sorted(self.keywords, key=len, reverse=True))) or r"(?!)"
+        if whole_words:
+            self._any = re.compile(f"(?<!\\w)(?:{alternation})(?!\\w)")
+            self._patterns = {kw: re.compile(f"(?<!\\w){re.escape(kw)}(?!\\w)") for kw in self.keywords}
+        else:
+            self._any = re.compile(alternation)
+            self._patterns = None
+
+    def counts(self, text: str) -> Counter:
+        """{keyword: hit count}; substring mode returns exactly `text.count(keyword)`."""
+        hits = Counter()
+        if not text:
+            return hits
+        for kw in self.keywords:
+            n = len(self._patterns[kw].findall(text)) if self.whole_words else text.count(kw)
+            if n:
+                hits[kw] = n
+        return hits
+
+    def any_match(self, text: str) -> bool:
+        """Cheap prefilter: stops at the first keyword hit."""
+        return bool(text) and self._any.search(text) is not None
+
+    def label_counts(self, text: str, rules: dict[str, list[str]]) -> dict[str, int]:
+        """Total hits per label for {label: [keywords]} rules."""
+        hits = self.counts(text)
+        return {label: sum(hits[kw] for kw in keywords) for label, keywords in rules.items()}
+
+
+@lru_cache(maxsize=32)
+def get_keyword_matcher(keywords: tuple[str, ...], whole_words: bool = False) -> KeywordMatcher:
+    """Compiled matcher shared per process for a given keyword set."""
+    return KeywordMatcher(keywords, whole_words=whole_words)
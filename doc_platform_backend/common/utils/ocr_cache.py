@@ -0,0 +1,129 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from common.models import OCRCacheEntry
+from common.utils.ocr_engine import get_ocr_engine
+
+
+def image_fingerprint(img_bytes: bytes) -> str:
+    return hashlib.sha256(img_bytes).hexdigest()
+
+
+EVICT_BATCH = 5000  # rows deleted per statement when trimming the table
+
+
+def evict_ocr_cache(max_entries: int | None = None) -> int:
+    """
+    Trim the cache table to its newest `max_entries` rows (by last use).
+
+    Runs periodically from beat rather than on every write; rows are deleted
+    in primary-key batches so a large backlog never becomes one huge delete.
+    """
+    max_entries = max_entries or getattr(settings, "OCR_CACHE_MAX_ENTRIES", 50000)
+    cutoff = list(
+        OCRCacheEntry.objects.order_by("-last_used_at")
+        .values_list("last_used_at", flat=True)[max_entries:max_entries + 1]
+    )
+    if not cutoff:
+        return 0
+    deleted = 0
+    while True:
+        keys = list(
+            OCRCacheEntry.objects.filter(last_used_at__lte=cutoff[0])
+            .values_list("content_hash", flat=True)[:EVICT_BATCH]
+        )
+        if not keys:
+            return deleted
+        deleted += OCRCacheEntry.objects.filter(content_hash__in=keys).delete()[0]
+
+
+class OCRResultCache:
+    """
+    Content-addressed OCR cache.
+
+    Lookups go to an in-memory memo first (so an image is OCRed at most once
+    per extraction), then to the shared `OCRCacheEntry` table, one query per
+    batch of images. A row's last use is only refreshed when it is older than
+    OCR_CACHE_TOUCH_SECONDS, with one conditional update for the whole batch,
+    so repeated hits cost a single read. The table is trimmed to
+    OCR_CACHE_MAX_ENTRIES rows by the periodic `evict_ocr_cache`.
+    """
+
+    def __init__(self, engine=None):
+        self.touch_seconds = getattr(settings, "OCR_CACHE_TOUCH_SECONDS", 3600)
+        self.engine = engine or get_ocr_engine()
+        self._memo = {}
+
+    def get_many(self, keys) -> dict:
+        """{key: text or None}; one read for every key not memoised yet."""
+        missing = [key for key in dict.fromkeys(keys) if key not in self._memo]
+        if missing:
+            now = timezone.now()
+            stale_before = now - timedelta(seconds=self.touch_seconds)
+            stale = []
+            rows = OCRCacheEntry.objects.filter(content_hash__in=missing).values_list(
+                "content_hash", "text", "last_used_at"
+            )
+            for key, text, last_used_at in rows:
+                self._memo[key] = text
+                if last_used_at < stale_before:
+                    stale.append(key)
+            if stale:
+                # `hits` counts refreshes of last use, not every lookup
+                OCRCacheEntry.objects.filter(content_hash__in=stale, last_used_at__lt=stale_before).update(
+                    hits=F("hits") + 1, last_used_at=now
+                )
+        return {key: self._memo.get(key) for key in keys}
+
+    def get(self, key: str):
+        return self.get_many([key])[key]
+
+    def set_many(self, results: dict):
+        self._memo.update(results)
+        OCRCacheEntry.objects.bulk_create(
+            [OCRCacheEntry(content_hash=key, text=text) for key, text in results.items()],
+            ignore_conflicts=True,
+        )
+
+    def set(self, key: str, text: str):
+        self.set_many({key: text})
+
+    def ocr(self, img_bytes: bytes) -> str:
+        key = image_fingerprint(img_bytes)
+        text = self.get(key)
+        if text is None:
+            text = self.engine.recognize(img_bytes)
+            self.set(key, text)
+        return text
+
+    def ocr_images(self, images, keep_empty: bool = False) -> list[str]:
+        """
+        OCR an iterable of image bytes. Cache misses go to the engine as one
+        batch; failures become inline error markers and are never cached.
+        Empty results are dropped unless keep_empty=True (output aligned with input).
+        """
+        images = list(images)
+        keys = [image_fingerprint(img_bytes) for img_bytes in images]
+        texts = self.get_many(keys)
+        misses = {key: img_bytes for key, img_bytes in zip(keys, images) if texts[key] is None}
+
+        if misses:
+            try:
+                results = dict(zip(misses, self.engine.recognize_many(list(misses.values()))))
+                self.set_many(results)
+                texts.update(results)
+            except Exception:
+                # Retry one by one so a single bad image doesn't sink the batch
+                for key, img_bytes in misses.items():
+                    try:
+                        texts[key] = self.ocr(img_bytes)
+                    except Exception as e:
+                        texts[key] = f"[OCR Error: {str(e)}]"
+
+        if keep_empty:
+            return [texts[key] or "" for key in keys]
+        return [texts[key] for key in keys if texts[key]]
@@ -0,0 +1,189 @@
+import base64
+import io
+import logging
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+from celery import shared_task
+from celery.exceptions import TimeoutError as CeleryTimeoutError
+from celery.result import allow_join_result
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Per-process Tesseract handle, created once by the pool initializer
+_tess_api = None
+_tess_lang = "eng"
+
+
+def _init_worker(lang: str):
+    """Pool initializer: load Tesseract once per worker process."""
+    global _tess_api, _tess_lang
+    _tess_lang = lang
+    try:
+        import tesserocr
+        _tess_api = tesserocr.PyTessBaseAPI(lang=lang)
+    except ImportError:
+        _tess_api = None  # fall back to pytesseract per image
+
+
+def _recognize(image_bytes: bytes) -> str:
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    if _tess_api is not None:
+        _tess_api.SetImage(image)
+        return _tess_api.GetUTF8Text().strip()
+
+    import pytesseract
+    return pytesseract.image_to_string(image, lang=_tess_lang).strip()
+
+
+def _recognize_batch(batch: list[bytes]) -> list[str]:
+    return [_recognize(image_bytes) for image_bytes in batch]
+
+
+class OCREngine:
+    """
+    Persistent pool of OCR worker processes fed with raw images.
+
+    Accepts PNG/JPEG bytes, PIL images or PyMuPDF pixmaps — no temporary PDFs
+    and no ocrmypdf subprocess per page. Work is split into batches so a whole
+    document is one pool job, and every pool process keeps one tesserocr
+    handle loaded.
+
+    Celery prefork children are daemonic and cannot start a process pool.
+    There, batches are sent to the dedicated OCR worker instead
+    (OCR_DISPATCH="queue", the default):
+
+        celery -A doc_platform_backend worker -Q ocr --pool=solo
+
+    Its solo pool runs tasks in the worker's own non-daemonic process, which
+    owns the OCR process pool. With OCR_DISPATCH="local", or when that worker
+    does not answer within OCR_TASK_TIMEOUT, OCR runs in-process: one
+    tesserocr handle (pytesseract per image if tesserocr is not installed),
+    one image at a time.
+    """
+
+    def __init__(self, processes: int | None = None, lang: str | None = None):
+        self.processes = processes if processes is not None else (
+            getattr(settings, "OCR_WORKERS", None) or os.cpu_count() or 1
+        )
+        self.lang = lang or getattr(settings, "OCR_LANG", "eng")
+        self._pool = None
+        self._local_ready = False
+        self.pages = 0
+        self.seconds = 0.0
+
+    # ------------------------------
+    # Pool management
+    # ------------------------------
+    def _get_pool(self):
+        if self.processes <= 1 or multiprocessing.current_process().daemon:
+            return None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.processes,
+                initializer=_init_worker,
+                initargs=(self.lang,),
+            )
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    @staticmethod
+    def _to_bytes(image) -> bytes:
+        if isinstance(image, (bytes, bytearray)):
+            return bytes(image)
+        if hasattr(image, "tobytes") and hasattr(image, "irect"):  # fitz.Pixmap
+            return image.tobytes("png")
+        buf = io.BytesIO()
+        image.save(buf, format="PNG")  # PIL.Image
+        return buf.getvalue()
+
+    # ------------------------------
+    # Recognition
+    # ------------------------------
+    def recognize(self, image) -> str:
+        return self.recognize_many([image])[0]
+
+    def _recognize_here(self, payloads: list[bytes]) -> list[str]:
+        pool = self._get_pool()
+        if pool is None:
+            if not self._local_ready:
+                _init_worker(self.lang)
+                self._local_ready = True
+            return _recognize_batch(payloads)
+        size = math.ceil(len(payloads) / self.processes)
+        batches = [payloads[i:i + size] for i in range(0, len(payloads), size)]
+        return [text for batch in pool.map(_recognize_batch, batches) for text in batch]
+
+    def _recognize_on_ocr_worker(self, payloads: list[bytes]) -> list[str]:
+        result = task_recognize_batch.apply_async(([base64.b64encode(p).decode("ascii") for p in payloads],))
+        try:
+            # Safe to wait: the OCR queue is served by its own worker, never by this pool
+            with allow_join_result():
+                return result.get(timeout=getattr(settings, "OCR_TASK_TIMEOUT", 600))
+        except CeleryTimeoutError:
+            result.revoke()
+            logger.warning("OCR worker did not answer; recognising %d images in-process", len(payloads))
+            return self._recognize_here(payloads)
+
+    def recognize_many(self, images) -> list[str]:
+        """OCR many pages/images as one job; results are returned in input order."""
+        payloads = [self._to_bytes(image) for image in images]
+        if not payloads:
+            return []
+
+        started = time.perf_counter()
+        if (
+            multiprocessing.current_process().daemon
+            and getattr(settings, "OCR_DISPATCH", "queue") == "queue"
+        ):
+            texts = self._recognize_on_ocr_worker(payloads)
+        else:
+            texts = self._recognize_here(payloads)
+
+        elapsed = time.perf_counter() - started
+        self.pages += len(payloads)
+        self.seconds += elapsed
+        logger.info(
+            "OCR batch: %d pages in %.2fs (%.2f pages/s)",
+            len(payloads), elapsed, len(payloads) / elapsed if elapsed else 0.0,
+        )
+        return texts
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.seconds if self.seconds else 0.0
+
+    def throughput(self) -> dict:
+        return {
+            "pages": self.pages,
+            "seconds": round(self.seconds, 3),
+            "pages_per_second": round(self.pages_per_second, 2),
+        }
+
+
+_engine = None
+
+
+def get_ocr_engine() -> OCREngine:
+    """Process-wide engine so the worker pool is started once and reused."""
+    global _engine
+    if _engine is None:
+        _engine = OCREngine()
+    return _engine
+
+
+@shared_task
+def task_recognize_batch(images_b64: list[str]) -> list[str]:
+    """OCR queue entry point: runs on the dedicated OCR worker and uses its process pool."""
+    return get_ocr_engine()._recognize_here([base64.b64decode(image) for image in images_b64])
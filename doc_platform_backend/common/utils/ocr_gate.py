@@ -0,0 +1,80 @@
+from collections import Counter
+
+MIN_GLYPHS = 40                 # fewer visible characters than this is not a usable text layer
+MAX_GARBLED_RATIO = 0.2         # share of replacement / private-use glyphs (broken font encodings)
+DECORATIVE_COVERAGE = 0.10      # images covering less of the page than this are logos, rules, signatures
+SCANNED_COVERAGE = 0.90         # a page-sized image ...
+SCANNED_TEXT_GLYPHS = 200       # ... under a text layer this dense is a scan that was already OCRed
+
+
+def _glyph_stats(text: str) -> tuple[int, float]:
+    glyphs = [c for c in text if not c.isspace()]
+    if not glyphs:
+        return 0, 0.0
+    garbled = sum(1 for c in glyphs if c == "\ufffd" or "\ue000" <= c <= "\uf8ff")
+    return len(glyphs), garbled / len(glyphs)
+
+
+def image_coverage(page) -> float:
+    """Share of the page area covered by placed images (summed per placement, capped at 1)."""
+    page_rect = page.rect
+    page_area = page_rect.width * page_rect.height
+    if not page_area:
+        return 0.0
+    covered = 0.0
+    for info in page.get_image_info():
+        bbox = page_rect & info["bbox"]  # clip to the visible page
+        if not bbox.is_empty:
+            covered += bbox.width * bbox.height
+    return min(covered / page_area, 1.0)
+
+
+def ocr_decision(page, text: str) -> tuple[bool, str]:
+    """
+    Decide whether a page needs OCR; returns (needs_ocr, reason).
+
+    A page keeps its native text when the text layer is usable (enough
+    glyphs, not garbled) and its images are either negligible in area or a
+    full-page scan that already carries a dense text layer.
+    """
+    glyphs, garbled = _glyph_stats(text)
+    has_images = bool(page.get_images(full=True))
+
+    if glyphs == 0:
+        return True, "no_text_layer"
+    if garbled > MAX_GARBLED_RATIO:
+        return True, "garbled_text_layer"
+    if not has_images:
+        return False, "text_only"
+    if glyphs < MIN_GLYPHS:
+        return True, "sparse_text_with_images"
+
+    coverage = image_coverage(page)
+    if coverage < DECORATIVE_COVERAGE:
+        return False, "decorative_images"
+    if coverage >= SCANNED_COVERAGE and glyphs >= SCANNED_TEXT_GLYPHS:
+        return False, "scan_with_text_layer"
+    return True, "content_images"
+
+
+class OCRGateStats:
+    """Per-document tally of OCR decisions; `avoided` counts image pages kept on their native text."""
+
+    AVOIDED = {"decorative_images", "scan_with_text_layer"}
+
+    def __init__(self):
+        self.reasons = Counter()
+
+    def add(self, reason: str):
+        self.reasons[reason] += 1
+
+    @property
+    def ocr_pages(self) -> int:
+        return sum(n for reason, n in self.reasons.items() if reason not in self.AVOIDED | {"text_only"})
+
+    @property
+    def avoided(self) -> int:
+        return sum(self.reasons[reason] for reason in self.AVOIDED)
+
+    def as_dict(self) -> dict:
+        return {"ocr_pages": self.ocr_pages, "ocr_avoided": self.avoided, "reasons": dict(self.reasons)}
@@ -0,0 +1,74 @@
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OfficeConversionError(RuntimeError):
+    pass
+
+
+class LibreOfficeConverter:
+    """
+    Headless LibreOffice for the few documents that need real layout
+    (legacy binary .doc, packages the native reader cannot parse).
+
+    A fixed number of slots, each with its own persistent user profile, so
+    conversions run concurrently without fighting over one profile lock and
+    later runs skip LibreOffice's first-start profile setup. Callers block
+    when every slot is busy.
+    """
+
+    def __init__(self, slots: int | None = None, binary: str | None = None, timeout: int | None = None):
+        self.binary = binary or getattr(settings, "LIBREOFFICE_BINARY", "soffice")
+        self.timeout = timeout or getattr(settings, "LIBREOFFICE_TIMEOUT", 120)
+        slots = slots or getattr(settings, "LIBREOFFICE_SLOTS", 2)
+        self._root = Path(tempfile.gettempdir()) / f"lo-profiles-{os.getpid()}"
+        self._slots = queue.Queue()
+        for i in range(slots):
+            self._slots.put(self._root / f"slot{i}")
+
+    def convert_to_pdf(self, data: bytes, suffix: str = ".docx") -> bytes:
+        if shutil.which(self.binary) is None:
+            raise OfficeConversionError(f"LibreOffice binary '{self.binary}' not found")
+
+        profile = self._slots.get()
+        try:
+            with tempfile.TemporaryDirectory() as workdir:
+                source = Path(workdir) / f"input{suffix}"
+                source.write_bytes(data)
+                result = subprocess.run(
+                    [
+                        self.binary, "--headless", "--norestore", "--nologo",
+                        f"-env:UserInstallation={profile.as_uri()}",
+                        "--convert-to", "pdf", "--outdir", workdir, str(source),
+                    ],
+                    capture_output=True,
+                    timeout=self.timeout,
+                )
+                pdf_path = source.with_suffix(".pdf")
+                if result.returncode != 0 or not pdf_path.exists():
+                    raise OfficeConversionError(result.stderr.decode(errors="replace").strip() or "conversion failed")
+                return pdf_path.read_bytes()
+        except subprocess.TimeoutExpired as e:
+            raise OfficeConversionError(f"LibreOffice timed out after {self.timeout}s") from e
+        finally:
+            self._slots.put(profile)
+
+
+_converter = None
+
+
+def get_office_converter() -> LibreOfficeConverter:
+    """Process-wide converter so the slot pool is shared by every caller."""
+    global _converter
+    if _converter is None:
+        _converter = LibreOfficeConverter()
+    return _converter
@@ -0,0 +1,193 @@
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import fitz  # PyMuPDF
+from django.conf import settings
+
+from common.utils import ocr_engine
+from common.utils.ocr_gate import ocr_decision, OCRGateStats
+
+logger = logging.getLogger(__name__)
+
+OCR_DPI = 300
+SHARD_PAGES = 16  # pages per worker job: one document open, native text for the whole range
+
+# Per-process document handle, reused across the shards of one document
+_open_doc = None
+_open_key = None
+
+
+# ------------------------------------------------
+# 🔹 Worker side (runs in pool processes, or inline)
+# ------------------------------------------------
+def _document(source: tuple):
+    """
+    Open the PDF named by `source` in this process, at most once per document.
+
+    source is ("path", file_path, mtime_ns) or ("shm", shared_memory_name, size);
+    nothing from the parent's fitz objects crosses a process boundary.
+    """
+    global _open_doc, _open_key
+    if _open_key != source:
+        if _open_doc is not None:
+            _open_doc.close()
+        if source[0] == "path":
+            _open_doc = fitz.open(source[1])
+        else:
+            shm = shared_memory.SharedMemory(name=source[1])
+            try:
+                _open_doc = fitz.open(stream=bytes(shm.buf[:source[2]]), filetype="pdf")
+            finally:
+                shm.close()
+        _open_key = source
+    return _open_doc
+
+
+def _extract_pages(doc, start: int, stop: int, recognize=ocr_engine._recognize_batch) -> list[tuple[int, str, str, str]]:
+    """
+    (page_no, text, "native"|"ocr", gate reason) for pages [start, stop), in page order.
+
+    Pages the gate selects are rendered and passed to `recognize` as one batch.
+    """
+    pages, renders = [], {}
+    for page_no in range(start, stop):
+        page = doc[page_no]
+        text = page.get_text().strip()
+        needs_ocr, reason = ocr_decision(page, text)
+        if needs_ocr:
+            renders[page_no] = page.get_pixmap(dpi=OCR_DPI).tobytes("png")
+        pages.append((page_no, text, reason))
+
+    ocr_texts = dict(zip(renders, recognize(list(renders.values())))) if renders else {}
+    results = []
+    for page_no, text, reason in pages:
+        # Fallback: If OCR text is empty, keep the native text
+        if ocr_texts.get(page_no):
+            results.append((page_no, ocr_texts[page_no], "ocr", reason))
+        else:
+            results.append((page_no, text, "native", reason))
+    return results
+
+
+def _extract_range(source: tuple, start: int, stop: int) -> list[tuple[int, str, str, str]]:
+    # Pool process: OCR with this process's own tesserocr handle
+    return _extract_pages(_document(source), start, stop)
+
+
+# ------------------------------------------------
+# 🔹 Page-range sharded extractor
+# ------------------------------------------------
+class PDFPageExtractor:
+    """
+    Extract PDF text in page-range shards across worker processes.
+
+    Each worker opens the document itself (from its path, or from a shared
+    memory block for in-memory uploads), extracts the native text of its whole
+    range in one pass and OCRs only the pages the OCR gate selects, with its
+    own once-loaded Tesseract handle. Shards are submitted through a bounded
+    window and pages are yielded strictly in order as soon as their shard is
+    done. Inside daemonic processes (Celery prefork workers cannot fork
+    children) shards run in-process and each shard's OCR pages go to the OCR
+    engine as one batch, which sends them to the dedicated OCR worker.
+    """
+
+    def __init__(self, processes: int | None = None, shard_pages: int = SHARD_PAGES):
+        self.processes = processes if processes is not None else (
+            getattr(settings, "OCR_WORKERS", None) or os.cpu_count() or 1
+        )
+        self.shard_pages = shard_pages
+        self.lang = getattr(settings, "OCR_LANG", "eng")
+        self._pool = None
+        self.stats = {}
+
+    def _get_pool(self):
+        if self.processes <= 1 or multiprocessing.current_process().daemon:
+            return None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.processes,
+                initializer=ocr_engine._init_worker,
+                initargs=(self.lang,),
+            )
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def iter_pages(self, pdf):
+        """Yield (page_no, text, source) in page order; `pdf` is a file path or the PDF bytes."""
+        started = time.perf_counter()
+        by_path = isinstance(pdf, str) or hasattr(pdf, "__fspath__")
+        with (fitz.open(pdf) if by_path else fitz.open(stream=pdf, filetype="pdf")) as doc:
+            page_count = len(doc)
+        shards = [(s, min(s + self.shard_pages, page_count)) for s in range(0, page_count, self.shard_pages)]
+
+        pool = self._get_pool() if len(shards) > 1 else None
+        shm = None
+        pending = deque()
+        gate = OCRGateStats()
+        try:
+            if pool is None:
+                # In-process: OCR goes through the engine, which hands it to the OCR worker from prefork children
+                recognize = ocr_engine.get_ocr_engine().recognize_many
+                with (fitz.open(pdf) if by_path else fitz.open(stream=pdf, filetype="pdf")) as doc:
+                    for start, stop in shards:
+                        for page_no, text, page_source, reason in _extract_pages(doc, start, stop, recognize):
+                            gate.add(reason)
+                            yield page_no, text, page_source
+                return
+
+            if by_path:
+                source = ("path", os.fspath(pdf), os.stat(pdf).st_mtime_ns)
+            else:
+                shm = shared_memory.SharedMemory(create=True, size=len(pdf))
+                shm.buf[:len(pdf)] = pdf
+                source = ("shm", shm.name, len(pdf))
+
+            # Keep at most two shards per worker in flight: bounded memory, ordered output
+            shard_iter = iter(shards)
+            for start, stop in shard_iter:
+                pending.append(pool.submit(_extract_range, source, start, stop))
+                if len(pending) >= 2 * self.processes:
+                    break
+            while pending:
+                # page_source, not source: the document handle is still needed for the next submit
+                for page_no, text, page_source, reason in pending.popleft().result():
+                    gate.add(reason)
+                    yield page_no, text, page_source
+                next_shard = next(shard_iter, None)
+                if next_shard:
+                    pending.append(pool.submit(_extract_range, source, *next_shard))
+        finally:
+            # Consumer stopped early: drop queued shards before the shared block goes away
+            for future in pending:
+                future.cancel()
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            elapsed = time.perf_counter() - started
+            self.stats = {
+                "pages": sum(gate.reasons.values()),
+                **gate.as_dict(),
+                "shards": len(shards),
+                "seconds": round(elapsed, 3),
+            }
+            logger.info("PDF pages: %s", self.stats)
+
+
+_extractor = None
+
+
+def get_pdf_extractor() -> PDFPageExtractor:
+    """Process-wide extractor so the worker pool is started once and reused."""
+    global _extractor
+    if _extractor is None:
+        _extractor = PDFPageExtractor()
+    return _extractor
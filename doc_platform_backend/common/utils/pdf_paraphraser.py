@@ -1,72 +1,14 @@
-import fitz  # PyMuPDF
-import tempfile
-import subprocess
-import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from common.utils.pdf_pages import get_pdf_extractor
 
 
 class Paraphrasepdf:
 
-    def _ocr_single_page(self, doc, page_num, temp_dir):
-        """Run OCRmyPDF --force-ocr on a single page and return the text."""
-        single_page_path = os.path.join(temp_dir, f"page_{page_num}.pdf")
-        processed_page_path = os.path.join(temp_dir, f"page_{page_num}_ocr.pdf")
-
-        # Extract single page
-        single_doc = fitz.open()
-        single_doc.insert_pdf(doc, from_page=page_num, to_page=page_num)
-        single_doc.save(single_page_path)
-        single_doc.close()
-
-        # Force OCR
-        subprocess.run(
-            ["ocrmypdf", "--force-ocr", single_page_path, processed_page_path],
-            check=True, capture_output=True
-        )
-
-        # Extract text
-        processed_doc = fitz.open(processed_page_path)
-        ocr_text = processed_doc[0].get_text().strip()
-        processed_doc.close()
-
-        return page_num, ocr_text
+    def iter_pages(self, file_bytes):
+        """Yield (page_no, text, source) in page order while later pages are still being extracted."""
+        extractor = get_pdf_extractor()
+        yield from extractor.iter_pages(file_bytes)
+        self.extraction_stats = extractor.stats
 
     def extract_text_from_pdf(self, file_bytes) -> str:
-        print(f"inside the extract_text_from_pdf")
-        text_results = {}
-        doc = fitz.open(stream=file_bytes, filetype="pdf")
-        print(f"doc={doc}")
-
-        # Create one temp directory for all OCR files
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Identify pages needing OCR
-            ocr_pages = []
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                page_text = page.get_text().strip()
-                images = page.get_images(full=True)
-
-                if page_text and not images:
-                    # Text-only page — store directly
-                    text_results[page_num] = page_text
-                else:
-                    # Mixed or image-only page — needs OCR
-                    ocr_pages.append(page_num)
-
-            # Process OCR pages in parallel
-            with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as executor:
-                futures = [executor.submit(self._ocr_single_page, doc, p, temp_dir) for p in ocr_pages]
-                for future in as_completed(futures):
-                    page_num, ocr_text = future.result()
-
-                    # Fallback: If OCR text is empty, try original extraction
-                    if not ocr_text:
-                        ocr_text = doc[page_num].get_text().strip()
-
-                    text_results[page_num] = ocr_text
-
-        doc.close()
-
-        # Combine results in correct order
-        final_text = "\n".join(text_results[p] for p in sorted(text_results.keys()))
-        return final_text
+        # Page-range shards run in worker processes that each open the PDF themselves
+        return "\n".join(text for _, text, _ in self.iter_pages(file_bytes))
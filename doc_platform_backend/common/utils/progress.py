@@ -0,0 +1,28 @@
+from django.utils import timezone
+
+
+def report_progress(instance, stage: str, progress: int | None = None, **fields):
+    """
+    Record the current pipeline stage (and optional percent complete) on a job row.
+
+    Uses a queryset update so concurrent workers touching other columns of the
+    same row (status, counters) are never overwritten by a stale instance.
+    """
+    values = {"stage": stage, "stage_updated_at": timezone.now(), **fields}
+    if progress is not None:
+        values["progress"] = max(0, min(100, int(progress)))
+    type(instance).objects.filter(pk=instance.pk).update(**values)
+    for name, value in values.items():
+        setattr(instance, name, value)
+
+
+def job_status_payload(instance, **extra) -> dict:
+    """Common shape returned by the upload status endpoints."""
+    return {
+        "status": instance.status,
+        "stage": instance.stage,
+        "progress": instance.progress,
+        "job_id": instance.job_id,
+        "updated_at": instance.stage_updated_at,
+        **extra,
+    }
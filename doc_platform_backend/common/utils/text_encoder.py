@@ -0,0 +1,18 @@
+from django.conf import settings
+
+DEFAULT_ENCODER = "sentence-transformers/all-MiniLM-L6-v2"
+
+_encoders = {}
+
+
+def get_text_encoder(model_name: str | None = None):
+    """
+    Per-process sentence-transformers encoder, loaded on first use and shared by
+    every caller (document type classifier, chatbot index).
+    """
+    name = model_name or getattr(settings, "TEXT_ENCODER_MODEL", DEFAULT_ENCODER)
+    if name not in _encoders:
+        from sentence_transformers import SentenceTransformer
+
+        _encoders[name] = SentenceTransformer(name)
+    return _encoders[name]
@@ -0,0 +1,207 @@
+import io
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+
+import pandas as pd
+from openpyxl import load_workbook
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+NS_DRAWING = "http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing"
+NS_A = "http://schemas.openxmlformats.org/drawingml/2006/main"
+NS_CHART = "http://schemas.openxmlformats.org/drawingml/2006/chart"
+
+
+class WorkbookSource:
+    """
+    Load a workbook once and share it between cell parsing and chart/image scanning.
+
+    - The file is read into memory a single time.
+    - Cell values are streamed from openpyxl in read-only mode (no full DOM).
+    - Charts and images are read straight from the OOXML package, and only
+      for sheets whose relationships actually reference a drawing.
+    - Legacy .xls files fall back to pandas and expose no drawings.
+    """
+
+    def __init__(self, source):
+        self.data = self._read_bytes(source)
+        self._zip = None
+        self._wb = None
+        self._xls = None
+        self._sheet_parts = None
+        self._drawings = {}
+
+        if zipfile.is_zipfile(io.BytesIO(self.data)):
+            self._zip = zipfile.ZipFile(io.BytesIO(self.data))
+            self._wb = load_workbook(io.BytesIO(self.data), read_only=True, data_only=True)
+        else:
+            self._xls = pd.ExcelFile(io.BytesIO(self.data))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._wb is not None:
+            self._wb.close()
+        if self._zip is not None:
+            self._zip.close()
+        if self._xls is not None:
+            self._xls.close()
+
+    @staticmethod
+    def _read_bytes(source) -> bytes:
+        if isinstance(source, (bytes, bytearray)):
+            return bytes(source)
+        if isinstance(source, str) or hasattr(source, "__fspath__"):
+            with open(source, "rb") as f:
+                return f.read()
+        # Django FieldFile / UploadedFile / any file-like object
+        if hasattr(source, "open") and getattr(source, "closed", False):
+            source.open("rb")
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return source.read()
+
+    # ------------------------------
+    # Cell values
+    # ------------------------------
+    @property
+    def sheet_names(self) -> list[str]:
+        if self._wb is not None:
+            return list(self._wb.sheetnames)
+        return list(self._xls.sheet_names)
+
+    @staticmethod
+    def _cell_to_str(value) -> str:
+        if value is None:
+            return ""
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+
+    def iter_rows(self, sheet_name):
+        """Yield each row as a tuple of raw cell values, trailing empty rows trimmed."""
+        if self._wb is None:
+            df = self._xls.parse(sheet_name, header=None)
+            for row in df.itertuples(index=False, name=None):
+                yield tuple(None if pd.isna(v) else v for v in row)
+            return
+
+        ws = self._wb[sheet_name]
+        ws.reset_dimensions()  # stored dimensions are often wrong in read-only mode
+        pending_blank = 0
+        for row in ws.iter_rows(values_only=True):
+            if all(v is None or (isinstance(v, str) and not v.strip()) for v in row):
+                pending_blank += 1
+                continue
+            for _ in range(pending_blank):
+                yield ()
+            pending_blank = 0
+            yield row
+
+    def sheet_frame(self, sheet_name, header: bool = False) -> pd.DataFrame:
+        """
+        Build a DataFrame for one sheet.
+
+        header=False -> every cell as a string, blanks as "" (extractor contract).
+        header=True  -> first row becomes column names, remaining values kept raw.
+        """
+        rows = list(self.iter_rows(sheet_name))
+        width = max((len(r) for r in rows), default=0)
+        # Trim trailing all-empty columns so ragged rows don't widen the frame
+        while width and all(len(r) < width or r[width - 1] is None for r in rows):
+            width -= 1
+        rows = [tuple(r[:width]) + (None,) * (width - len(r)) for r in rows]
+
+        if not header:
+            return pd.DataFrame(
+                [[self._cell_to_str(v) for v in r] for r in rows],
+                columns=range(width), dtype=str,
+            )
+
+        if not rows:
+            return pd.DataFrame()
+        columns, seen = [], {}
+        for idx, name in enumerate(rows[0]):
+            name = f"Unnamed: {idx}" if name is None else str(name)
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+            columns.append(name)
+        return pd.DataFrame(rows[1:], columns=columns)
+
+    # ------------------------------
+    # Charts / images (lazy)
+    # ------------------------------
+    def _rels(self, part: str) -> dict:
+        folder, name = posixpath.split(part)
+        rels_part = posixpath.join(folder, "_rels", f"{name}.rels")
+        try:
+            root = ET.fromstring(self._zip.read(rels_part))
+        except KeyError:
+            return {}
+        rels = {}
+        for rel in root.iter(f"{{{NS_PKG_REL}}}Relationship"):
+            target = rel.get("Target", "")
+            if rel.get("TargetMode") == "External":
+                continue
+            if target.startswith("/"):
+                target = target.lstrip("/")
+            else:
+                target = posixpath.normpath(posixpath.join(folder, target))
+            rels[rel.get("Id")] = (rel.get("Type", ""), target)
+        return rels
+
+    def _sheet_part(self, sheet_name):
+        if self._sheet_parts is None:
+            self._sheet_parts = {}
+            workbook_part = "xl/workbook.xml"
+            rels = self._rels(workbook_part)
+            root = ET.fromstring(self._zip.read(workbook_part))
+            for sheet in root.iter(f"{{{NS_MAIN}}}sheet"):
+                rel = rels.get(sheet.get(f"{{{NS_REL}}}id"))
+                if rel:
+                    self._sheet_parts[sheet.get("name")] = rel[1]
+        return self._sheet_parts.get(sheet_name)
+
+    def _drawing(self, sheet_name) -> dict:
+        """Return {"charts": int, "images": [media part, ...]} for a sheet (cached)."""
+        if sheet_name in self._drawings:
+            return self._drawings[sheet_name]
+
+        info = {"charts": 0, "images": []}
+        sheet_part = self._sheet_part(sheet_name) if self._zip is not None else None
+        if sheet_part:
+            for rel_type, drawing_part in self._rels(sheet_part).values():
+                if not rel_type.endswith("/drawing"):
+                    continue
+                drawing_rels = self._rels(drawing_part)
+                root = ET.fromstring(self._zip.read(drawing_part))
+                info["charts"] += sum(1 for _ in root.iter(f"{{{NS_CHART}}}chart"))
+                for pic in root.iter(f"{{{NS_DRAWING}}}pic"):
+                    blip = pic.find(f".//{{{NS_A}}}blip")
+                    rel = drawing_rels.get(blip.get(f"{{{NS_REL}}}embed")) if blip is not None else None
+                    if rel:
+                        info["images"].append(rel[1])
+
+        self._drawings[sheet_name] = info
+        return info
+
+    def has_drawings(self, sheet_name) -> bool:
+        info = self._drawing(sheet_name)
+        return bool(info["charts"] or info["images"])
+
+    def chart_count(self, sheet_name) -> int:
+        return self._drawing(sheet_name)["charts"]
+
+    def iter_images(self, sheet_name):
+        """Yield raw bytes of each image embedded in the sheet, read on demand."""
+        for media_part in self._drawing(sheet_name)["images"]:
+            yield self._zip.read(media_part)
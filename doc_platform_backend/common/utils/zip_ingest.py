@@ -0,0 +1,59 @@
+import posixpath
+import zipfile
+
+PDF_MAGIC = b"%PDF"
+ZIP_MAGIC = b"PK\x03\x04"
+OLE_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"  # legacy .xls / .doc
+
+EXCEL_EXTENSIONS = {".xlsx", ".xlsm", ".xls"}
+WORD_EXTENSIONS = {".docx", ".doc"}
+SKIP_DIRS = ("__MACOSX/",)
+
+
+def is_ingestable(info: zipfile.ZipInfo) -> bool:
+    """Regular files only: no folders, OS metadata, hidden or Office lock files."""
+    if info.is_dir() or info.filename.startswith(SKIP_DIRS) or info.file_size == 0:
+        return False
+    base = posixpath.basename(info.filename)
+    return not base.startswith((".", "~$"))
+
+
+def sniff_member(zf: zipfile.ZipFile, info: zipfile.ZipInfo) -> str:
+    """
+    "excel", "pdf", "docx", "doc" or "unknown" from the member's leading bytes.
+
+    Only the first block of the member is decompressed. Extensions are used
+    to tell container formats apart (OOXML packages and OLE files); an OOXML
+    package with a misleading extension is identified by its part names.
+    Legacy OLE Word files are "doc": only LibreOffice can read them.
+    """
+    with zf.open(info) as f:
+        head = f.read(8)
+    ext = posixpath.splitext(info.filename)[1].lower()
+
+    if head.startswith(PDF_MAGIC):
+        return "pdf"
+    if head.startswith(OLE_MAGIC):
+        return "excel" if ext in EXCEL_EXTENSIONS else "doc" if ext in WORD_EXTENSIONS else "unknown"
+    if head.startswith(ZIP_MAGIC):
+        if ext in EXCEL_EXTENSIONS:
+            return "excel"
+        if ext in WORD_EXTENSIONS:
+            return "docx"
+        try:
+            with zf.open(info) as f, zipfile.ZipFile(f) as package:
+                parts = package.namelist()
+        except zipfile.BadZipFile:
+            return "unknown"
+        if any(p.startswith("xl/") for p in parts):
+            return "excel"
+        if any(p.startswith("word/") for p in parts):
+            return "docx"
+    return "unknown"
+
+
+def iter_members(zf: zipfile.ZipFile):
+    """Yield (ZipInfo, kind) for every file in the archive, nested folders included."""
+    for info in zf.infolist():
+        if is_ingestable(info):
+            yield info, sniff_member(zf, info)
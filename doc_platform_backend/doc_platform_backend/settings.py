@@ -177,4 +177,92 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CELERY_BROKER_URL = 'redis://localhost:6379/0'  # Redis running locally
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+# Task modules that live outside <app>/tasks.py and are not autodiscovered
+CELERY_IMPORTS = (
+    'documents.extractor.tasks',
+    'documents.classifier.tasks',
+    'documents.classifier.online',
+    'documents.chunker.tasks',
+    'documents.mapper.tasks',
+    'reportsg.utils.tasks',
+    'common.utils.ocr_engine',
+)
+CELERY_TASK_TRACK_STARTED = True
+# LLM schema mapping runs on its own queue so its concurrency is bounded by that worker pool:
+#   celery -A doc_platform_backend worker -Q llm_mapping -c $MAPPER_CONCURRENCY
+CELERY_TASK_ROUTES = {
+    'documents.mapper.tasks.task_process_chunk': {'queue': 'llm_mapping'},
+    # ZIP members are extracted on their own queue too (size the pool for the data-room load)
+    'common.tasks.task_extract_zip_members': {'queue': 'zip_members'},
+    # OCR batches from prefork workers go to the dedicated OCR worker (see OCR_DISPATCH)
+    'common.utils.ocr_engine.task_recognize_batch': {'queue': 'ocr'},
+}
+ZIP_MEMBERS_PER_TASK = int(os.getenv('ZIP_MEMBERS_PER_TASK', 20))
+# Workbook sheets extracted per task; each task downloads and opens the workbook once
+SHEETS_PER_TASK = int(os.getenv('SHEETS_PER_TASK', 5))
+MAPPER_LLM_MODEL = os.getenv('MAPPER_LLM_MODEL', 'openai/gpt-4o-mini')
+MAPPER_RATE_LIMIT = os.getenv('MAPPER_RATE_LIMIT', '30/m')  # per mapping worker process
+
+
+# OCR results for embedded images, keyed by image SHA-256 (trimmed to this many rows by beat, least recently used first)
+OCR_CACHE_MAX_ENTRIES = int(os.getenv('OCR_CACHE_MAX_ENTRIES', 50000))
+OCR_CACHE_TOUCH_SECONDS = int(os.getenv('OCR_CACHE_TOUCH_SECONDS', 3600))  # refresh last use at most this often
+# OCR engine worker pool (defaults to one process per core)
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', 0)) or None
+OCR_LANG = os.getenv('OCR_LANG', 'eng')
+# Celery prefork children cannot own a process pool. "queue": send their OCR batches to the
+# dedicated OCR worker, which owns the pool:
+#   celery -A doc_platform_backend worker -Q ocr --pool=solo
+# "local": OCR in-process, one image at a time (also the fallback when that worker does not answer)
+OCR_DISPATCH = os.getenv('OCR_DISPATCH', 'queue')
+OCR_TASK_TIMEOUT = int(os.getenv('OCR_TASK_TIMEOUT', 600))  # seconds to wait for the OCR worker
+# Headless LibreOffice for Word documents the native DOCX reader cannot handle (legacy .doc)
+LIBREOFFICE_BINARY = os.getenv('LIBREOFFICE_BINARY', 'soffice')
+LIBREOFFICE_SLOTS = int(os.getenv('LIBREOFFICE_SLOTS', 2))  # concurrent conversions per process
+LIBREOFFICE_TIMEOUT = int(os.getenv('LIBREOFFICE_TIMEOUT', 120))
+
+# Report uploads are processed asynchronously, so the request no longer bounds the size
+REPORT_UPLOAD_MAX_MB = int(os.getenv('REPORT_UPLOAD_MAX_MB', 25))
+# "staged": classify sampled native-text pages first and only fully extract documents that pass;
+# "full": extract (and OCR) the whole document, then classify it
+REPORT_SCREENING = os.getenv('REPORT_SCREENING', 'staged')
+REPORT_SCREEN_SAMPLE_PAGES = int(os.getenv('REPORT_SCREEN_SAMPLE_PAGES', 3))
+# FinBERT financial-text check: "local" CPU inference (loaded once per worker) or "http" (HuggingFace API)
+FINBERT_BACKEND = os.getenv('FINBERT_BACKEND', 'local')
+FINBERT_ONNX_PATH = os.getenv('FINBERT_ONNX_PATH') or None  # exported model.onnx; int8 PyTorch when unset
+FINBERT_BATCH_SIZE = int(os.getenv('FINBERT_BATCH_SIZE', 8))  # 512-token chunks per forward pass
+FINBERT_THREADS = int(os.getenv('FINBERT_THREADS', 1))  # intra-op threads per worker process
+# Sentence encoder shared by the chatbot index and the document type classifier
+# (the Pinecone index is created with this model's 384 dimensions)
+TEXT_ENCODER_MODEL = os.getenv('TEXT_ENCODER_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+# Logit scale + acceptance threshold of the document type classifier for TEXT_ENCODER_MODEL,
+# written by `manage.py calibrate_doc_classifier` (module defaults are used until then)
+DOC_TYPE_CALIBRATION_FILE = os.getenv(
+    'DOC_TYPE_CALIBRATION_FILE', os.path.join(BASE_DIR, 'ml_models', 'doc_type_calibration.json')
+)
+
+# Hash uploads while they stream in (must stay first), then Django's default handlers
+FILE_UPLOAD_HANDLERS = [
+    'common.utils.content_hash.ContentHashUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
 
+# Versioned sheet classifier artifacts (+ CURRENT pointer), written by `manage.py train_sheet_classifier`
+# and by the periodic online update from manual labels
+SHEET_CLASSIFIER_MODEL_DIR = os.getenv(
+    'SHEET_CLASSIFIER_MODEL_DIR', os.path.join(BASE_DIR, 'ml_models', 'sheet_classifier')
+)
+# The first online model replaces a batch-trained one only once this many manual labels are available
+SHEET_CLASSIFIER_MIN_ONLINE_LABELS = int(os.getenv('SHEET_CLASSIFIER_MIN_ONLINE_LABELS', 200))
+
+CELERY_BEAT_SCHEDULE = {
+    'evict-ocr-cache': {
+        'task': 'common.tasks.task_evict_ocr_cache',
+        'schedule': int(os.getenv('OCR_CACHE_EVICT_SECONDS', 600)),
+    },
+    'update-sheet-classifier': {
+        'task': 'documents.classifier.online.task_update_sheet_classifier',
+        'schedule': int(os.getenv('SHEET_CLASSIFIER_UPDATE_SECONDS', 1800)),
+    },
+}
@@ -0,0 +1,26 @@
+# chunker/planner.py
+from typing import Iterator
+
+
+# ------------------------------------------------
+# 🔹 Chunk planning (row ranges only, no row data)
+# ------------------------------------------------
+def plan_chunks(row_count: int, chunk_rows: int, overlap: int = 0) -> Iterator[dict]:
+    """
+    Yield {"chunk_index", "start", "end"} windows covering rows [0, row_count).
+
+    Consecutive windows share `overlap` rows for continuity. The window start
+    strictly increases (chunk_rows > overlap) and the last window ends exactly
+    at row_count, so the plan always terminates.
+    """
+    if chunk_rows <= overlap:
+        raise ValueError(f"chunk_rows ({chunk_rows}) must be larger than overlap ({overlap})")
+
+    start, index = 0, 0
+    while start < row_count:
+        end = min(start + chunk_rows, row_count)
+        yield {"chunk_index": index, "start": start, "end": end}
+        if end >= row_count:
+            return
+        start, index = end - overlap, index + 1
+
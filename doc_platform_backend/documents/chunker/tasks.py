@@ -1,52 +1,76 @@
 # chunker/tasks.py
-from celery import shared_task
-from ..models import SheetUnit, StructuredDocument, Annexure, AuditLog
-import math
+from celery import shared_task, chord, group
+from django.db import transaction
+from ..models import SheetUnit, AuditLog, MappedChunk
+from ..extractor.raw_tables import RawTableReader
+from ..mapper.schemas import schema_for
+from ..classifier.templates import same_layout
+from .planner import plan_chunks
 
 MAX_ROWS_FOR_SINGLE_CALL = 400
 CHUNK_ROWS = 300
 OVERLAP = 2
 
-# @shared_task
+
+def sync_chunk_plan(sheet: SheetUnit, row_count: int) -> list[int]:
+    """
+    Store the chunk plan as MappedChunk rows and return the indexes still to map.
+
+    Chunks already mapped for the same window are kept, so re-running a sheet
+    only redoes failed or missing chunks. A changed plan starts over.
+    """
+    # Small sheets go to the mapper in one call; larger ones in overlapping windows
+    chunk_rows = row_count if row_count <= MAX_ROWS_FOR_SINGLE_CALL else CHUNK_ROWS
+    overlap = 0 if chunk_rows == row_count else OVERLAP
+    plan = [(c["chunk_index"], c["start"], c["end"]) for c in plan_chunks(row_count, chunk_rows, overlap)]
+
+    with transaction.atomic():
+        existing = {
+            (c.chunk_index, c.start_row, c.end_row): c.status
+            for c in MappedChunk.objects.filter(sheet_unit=sheet).only("chunk_index", "start_row", "end_row", "status")
+        }
+        if set(existing) != set(plan):
+            MappedChunk.objects.filter(sheet_unit=sheet).delete()
+            MappedChunk.objects.bulk_create(
+                [MappedChunk(sheet_unit=sheet, chunk_index=i, start_row=s, end_row=e) for i, s, e in plan],
+                batch_size=1000,
+            )
+            existing = {}
+    return [i for i, s, e in plan if existing.get((i, s, e)) != "done"]
+
+
+@shared_task
 def task_process_sheet(sheet_unit_id):
-    sheet = SheetUnit.objects.get(id=sheet_unit_id)
-    # get raw table
-    raw = sheet.raw_table
-    # if pointer -> read CSV from storage (not shown)
-    # assume raw_table is a list for simplicity
-    if isinstance(raw, dict) and raw.get("csv_pointer"):
-        # load CSV from storage (omitted here) -> df_rows
-        df_rows = load_csv_from_storage(raw["csv_pointer"])
-    else:
-        df_rows = raw or []
-
-    row_count = sheet.row_count or len(df_rows)
-    if row_count <= MAX_ROWS_FOR_SINGLE_CALL:
-        # send full sheet to schema_mapper
-        result = schema_map_full(sheet, df_rows)
-        persist_mapped_result(sheet, result)
-    else:
-        # chunk
-        chunks = []
-        header = sheet.header_rows or []
-        start = 0
-        while start < row_count:
-            end = min(start + CHUNK_ROWS, row_count)
-            chunk_rows = df_rows[start:end]
-            chunks.append({
-                "sheet_id": str(sheet.id),
-                "chunk_index": len(chunks),
-                "start": start,
-                "end": end,
-                "header": header,
-                "rows": chunk_rows,
-                "total_chunks": None  # fill later
-            })
-            start = end - OVERLAP  # overlap to keep continuity
-        total = len(chunks)
-        for c in chunks:
-            c["total_chunks"] = total
-            # enqueue chunk processing
-            from mapper.tasks import task_process_chunk
-            task_process_chunk(c)
-        AuditLog.objects.create(sheet_unit=sheet, action="chunks_created", details={"total_chunks": total})
+    """Map a classified sheet: template mapping, annexure, or parallel LLM chunks merged by a chord callback."""
+    from ..mapper.tasks import (
+        task_process_chunk, task_merge_chunks, task_mapping_failed, map_with_template, persist_annexure,
+    )
+
+    sheet = SheetUnit.objects.select_related("template").get(id=sheet_unit_id)
+    sheet_id = str(sheet.id)
+
+    if schema_for(sheet.classification) is None:
+        persist_annexure(sheet, f"unknown format ({sheet.classification or 'unclassified'})")
+        return {"sheet_id": sheet_id, "status": "annexure"}
+
+    # Exactly the known layout with a learned column mapping: no LLM calls
+    if sheet.template and sheet.template.schema_mapping and same_layout(sheet, sheet.template):
+        map_with_template(sheet, sheet.template)
+        return {"sheet_id": sheet_id, "status": "done", "source": "template"}
+
+    # inline rows, Parquet spill or legacy CSV pointer — all read by row range
+    with RawTableReader.for_sheet(sheet) as reader:
+        row_count = reader.row_count
+    pending = sync_chunk_plan(sheet, row_count)
+
+    if not pending:
+        # Resumed run with every chunk already mapped (or an empty sheet)
+        task_merge_chunks.delay([], sheet_id)
+        return {"sheet_id": sheet_id, "status": "merging", "chunks": 0}
+
+    # Chunk tasks carry only (sheet, index); each streams its own window
+    chord(group(task_process_chunk.s({"sheet_id": sheet_id, "chunk_index": i}) for i in pending))(
+        task_merge_chunks.s(sheet_id).on_error(task_mapping_failed.s(sheet_id))
+    )
+    AuditLog.objects.create(sheet_unit=sheet, action="chunks_created", details={"total_chunks": len(pending)})
+    return {"sheet_id": sheet_id, "status": "mapping", "chunks": len(pending)}
@@ -0,0 +1,113 @@
+# classifier/model_store.py
+import fcntl
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import joblib
+from django.conf import settings
+
+CURRENT_POINTER = "CURRENT"  # JSON {"version": n, "file": "v000n.joblib"}
+PUBLISH_LOCK = ".publish.lock"
+RELOAD_CHECK_SECONDS = 30
+
+# Per-process cache; refreshed when the CURRENT pointer changes on disk
+_artifact = None
+_pointer_mtime = None
+_checked_at = 0.0
+
+
+def model_dir() -> str:
+    return settings.SHEET_CLASSIFIER_MODEL_DIR
+
+
+def _pointer_path() -> str:
+    return os.path.join(model_dir(), CURRENT_POINTER)
+
+
+def _atomic_write(path: str, write):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def _publish_lock():
+    """Exclusive lock across processes (and threads) publishing into the model directory."""
+    fd = os.open(os.path.join(model_dir(), PUBLISH_LOCK), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def current_version() -> int:
+    try:
+        with open(_pointer_path()) as f:
+            return json.load(f)["version"]
+    except (FileNotFoundError, ValueError, KeyError):
+        return 0
+
+
+def save_artifact(artifact: dict) -> str:
+    """
+    Publish {"vectorizer", "model", "meta"} as a new version.
+
+    The versioned file is written first; the CURRENT pointer is then swapped
+    with os.replace, so readers see either the old or the new model, never a
+    partial one. Concurrent publishers (the trainer command and the online
+    update) are serialized by a lock file, so each gets its own version.
+    Older versions stay on disk for rollback.
+    """
+    os.makedirs(model_dir(), exist_ok=True)
+    with _publish_lock():
+        version = current_version() + 1
+        artifact["meta"] = {**artifact.get("meta", {}), "version": version}
+        file_name = f"v{version:04d}.joblib"
+
+        _atomic_write(os.path.join(model_dir(), file_name), lambda f: joblib.dump(artifact, f, compress=3))
+        pointer = json.dumps({"version": version, "file": file_name}).encode()
+        _atomic_write(_pointer_path(), lambda f: f.write(pointer))
+    return os.path.join(model_dir(), file_name)
+
+
+def load_artifact() -> dict | None:
+    """
+    Current model for this process, or None when nothing was published yet.
+
+    The pointer's mtime is checked at most every RELOAD_CHECK_SECONDS, so
+    running workers hot-swap to a newly published version without a restart.
+    """
+    global _artifact, _pointer_mtime, _checked_at
+    now = time.monotonic()
+    if _pointer_mtime is not None and now - _checked_at < RELOAD_CHECK_SECONDS:
+        return _artifact
+    _checked_at = now
+
+    try:
+        mtime = os.stat(_pointer_path()).st_mtime_ns
+    except FileNotFoundError:
+        _artifact, _pointer_mtime = None, 0
+        return None
+    if mtime != _pointer_mtime:
+        with open(_pointer_path()) as f:
+            pointer = json.load(f)
+        _artifact = joblib.load(os.path.join(model_dir(), pointer["file"]))
+        _pointer_mtime = mtime
+    return _artifact
+
+
+def reset_cache():
+    """Force the next load_artifact() to re-read the pointer (used after publishing)."""
+    global _pointer_mtime
+    _pointer_mtime = None
@@ -0,0 +1,131 @@
+# classifier/online.py
+import copy
+import hashlib
+import logging
+
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score
+
+from ..models import SheetUnit, AuditLog
+from .model_store import load_artifact, save_artifact, reset_cache
+from .tasks import MLClassifier, SheetClassifier
+
+logger = logging.getLogger(__name__)
+
+HOLDOUT_BUCKETS = 5        # 1 in 5 manual labels is kept for evaluation only
+MAX_ACCURACY_DROP = 0.02   # publish unless holdout accuracy drops by more than this
+
+
+def _is_holdout(sheet: SheetUnit) -> bool:
+    """Stable split: a given sheet is always either training or holdout data."""
+    return int(hashlib.sha1(str(sheet.id).encode()).hexdigest(), 16) % HOLDOUT_BUCKETS == 0
+
+
+def _new_online_classifier() -> MLClassifier:
+    """Stateless hashing features + SGD logistic regression: trainable batch by batch."""
+    clf = MLClassifier(artifact={})
+    clf.vectorizer = HashingVectorizer(n_features=2 ** 18, ngram_range=(1, 2), alternate_sign=False)
+    clf.model = SGDClassifier(loss="log_loss", alpha=1e-5, random_state=42)
+    return clf
+
+
+def _holdout_accuracy(clf: MLClassifier | None, holdout: list[SheetUnit]) -> float | None:
+    if clf is None or not clf.is_trained or not holdout:
+        return None
+    predicted = [label for label, _ in clf.classify_many(holdout)]
+    return accuracy_score([s.classification for s in holdout], predicted)
+
+
+class OnlineSheetTrainer:
+    """
+    Learn from analyst corrections without full retrains.
+
+    Manual labels newer than the current model are fed to `partial_fit` on a
+    copy of the online model. The candidate is scored on the holdout bucket
+    of all manual labels and published as a new version only if it is not
+    worse than the current model. A label the model has never seen forces a
+    rebuild from all manual labels, since SGD cannot grow its class set.
+
+    A batch-trained model (TF-IDF features, so SGD cannot warm-start from it)
+    is only replaced once SHEET_CLASSIFIER_MIN_ONLINE_LABELS manual labels
+    exist and the candidate at least matches it on the holdout.
+    """
+
+    FIELDS = SheetClassifier.CLASSIFY_FIELDS
+
+    def _manual(self):
+        return SheetUnit.objects.filter(classification_source="manual").only(*self.FIELDS)
+
+    def update(self) -> dict:
+        artifact = load_artifact()
+        meta = (artifact or {}).get("meta", {})
+        online = meta.get("kind") == "online"
+        trained_until = meta.get("trained_until") if online else None
+
+        new_labels = self._manual()
+        if trained_until:
+            new_labels = new_labels.filter(classified_at__gt=trained_until)
+        new_labels = list(new_labels.order_by("classified_at"))
+        if not new_labels:
+            return {"published": False, "reason": "no new labels"}
+
+        current = MLClassifier(artifact=artifact) if artifact else None
+        replacing_batch = current is not None and not online
+        known = list(getattr(current.model, "classes_", [])) if online else []
+        train = [s for s in new_labels if not _is_holdout(s)]
+        if not online or {s.classification for s in train} - set(known):
+            # First online model, or new label: rebuild from every manual label
+            train = [s for s in self._manual() if not _is_holdout(s)]
+            classes = sorted({s.classification for s in train})
+            if len(classes) < 2:
+                return {"published": False, "reason": "need at least two labelled classes"}
+            if replacing_batch and len(train) < settings.SHEET_CLASSIFIER_MIN_ONLINE_LABELS:
+                return {"published": False, "reason": "too few manual labels to replace the batch model",
+                        "labels": len(train)}
+            candidate = _new_online_classifier()
+        else:
+            if not train:
+                return {"published": False, "reason": "only holdout labels"}
+            candidate = MLClassifier(artifact=copy.deepcopy(artifact))
+            classes = known
+
+        X = candidate._extract_features(train)
+        candidate.model.partial_fit(X, [s.classification for s in train], classes=classes)
+        candidate.is_trained = True
+
+        holdout = [s for s in self._manual() if _is_holdout(s)]
+        old_acc = _holdout_accuracy(current, holdout)
+        new_acc = _holdout_accuracy(candidate, holdout)
+        if replacing_batch and (old_acc is None or new_acc is None or new_acc < old_acc):
+            logger.warning("Sheet classifier update rejected: batch holdout %s, online candidate %s", old_acc, new_acc)
+            return {"published": False, "holdout_accuracy": old_acc, "candidate_accuracy": new_acc}
+        if old_acc is not None and new_acc is not None and new_acc < old_acc - MAX_ACCURACY_DROP:
+            logger.warning("Sheet classifier update rejected: holdout %.3f -> %s", old_acc or 0, new_acc)
+            return {"published": False, "holdout_accuracy": old_acc, "candidate_accuracy": new_acc}
+
+        path = save_artifact(candidate.artifact(
+            kind="online",
+            trained_at=timezone.now().isoformat(),
+            trained_until=new_labels[-1].classified_at.isoformat(),
+            new_samples=len(train),
+            holdout_accuracy=new_acc,
+            previous_holdout_accuracy=old_acc,
+            classes=list(map(str, candidate.model.classes_)),
+        ))
+        reset_cache()
+        AuditLog.objects.create(
+            sheet_unit=None,
+            action="classifier_published",
+            details={"path": path, "new_samples": len(train), "holdout_accuracy": new_acc},
+        )
+        return {"published": True, "path": path, "holdout_accuracy": new_acc, "previous": old_acc}
+
+
+@shared_task
+def task_update_sheet_classifier():
+    """Periodic (celery beat) incremental update from newly corrected sheets."""
+    return OnlineSheetTrainer().update()
@@ -1,13 +1,21 @@
 # classifier/system.py
 import re
 from abc import ABC, abstractmethod
+from collections import Counter
 from typing import Optional, Tuple
 
 import numpy as np
+from scipy.sparse import csr_matrix, hstack
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
+from celery import shared_task
+from django.db import transaction
+from django.utils import timezone
 
 from ..models import SheetUnit, AuditLog
+from .model_store import load_artifact
+from .templates import TemplateIndex, template_signature
+from common.utils.keyword_matcher import get_keyword_matcher
 
 
 # ==============================
@@ -56,6 +64,8 @@ class RuleBasedClassifier(BaseClassifier):
 
     def __init__(self, rules: dict[str, list[str]] | None = None):
         self.rules = rules or self.DEFAULT_RULES
+        # One matcher per keyword set and process
+        self.matcher = get_keyword_matcher(tuple(kw for kws in self.rules.values() for kw in kws))
 
     def _flatten_text(self, rows: list[list[str]]) -> str:
         return " ".join(" ".join(map(str, r)) for r in rows if r).lower()
@@ -84,12 +94,11 @@ class RuleBasedClassifier(BaseClassifier):
         }
 
         # --- Weighted scoring (text) ---
-        for label, keywords in self.rules.items():
-            for source, text in signals.items():
-                if not text:
-                    continue
-                for kw in keywords:
-                    scores[label] += text.count(kw) * self.WEIGHTS[source]
+        for source, text in signals.items():
+            if not text:
+                continue
+            for label, hits in self.matcher.label_counts(text, self.rules).items():
+                scores[label] += hits * self.WEIGHTS[source]
 
         # --- Structural heuristics ---
         # Cap tables: wide tables, many columns
@@ -121,56 +130,65 @@ class RuleBasedClassifier(BaseClassifier):
 # ML Classifier (TF-IDF + Logistic Regression)
 # ==============================
 class MLClassifier(BaseClassifier):
-    def __init__(self):
-        # Load pretrained model from disk in production
-        self.vectorizer = TfidfVectorizer(max_features=5000, ngram_range=(1, 2))
-        self.model = LogisticRegression(max_iter=500)
-        self.is_trained = False
+    """
+    TF-IDF + logistic regression over sheet text and log-scaled shape features.
+
+    The fitted vectorizer/model come from the artifact store (trained with
+    `manage.py train_sheet_classifier`) and are loaded once per worker process.
+    """
+
+    def __init__(self, artifact: dict | None = None):
+        # artifact=None -> shared per-process artifact; pass {} for a fresh, untrained instance
+        artifact = load_artifact() if artifact is None else artifact
+        self.vectorizer = (artifact or {}).get("vectorizer")
+        self.model = (artifact or {}).get("model")
+        self.is_trained = self.model is not None
 
     def _extract_text(self, sheet: SheetUnit) -> str:
         parts = []
         parts.append(sheet.sheet_name or "")
-        for rows in (sheet.header_rows, sheet.sample_rows, sheet.metadata.get("pre_header_context", [])):
+        for rows in (sheet.header_rows, sheet.sample_rows, (sheet.metadata or {}).get("pre_header_context", [])):
             if rows:
                 parts.append(" ".join(" ".join(map(str, r)) for r in rows))
         return " ".join(parts).lower()
 
-    def _extract_features(self, sheets: list[SheetUnit]):
+    def _extract_features(self, sheets: list[SheetUnit], fit: bool = False):
         texts = [self._extract_text(s) for s in sheets]
-        X_text = self.vectorizer.fit_transform(texts)
+        X_text = self.vectorizer.fit_transform(texts) if fit else self.vectorizer.transform(texts)
 
-        # Add structural features
-        struct_feats = np.array([
-            [s.row_count, s.col_count, s.metadata.get("table_count", 1)]
+        # Structural features, log-scaled so raw row counts don't swamp tf-idf weights
+        struct_feats = np.log1p(np.array([
+            [s.row_count or 0, s.col_count or 0, (s.metadata or {}).get("table_count", 1)]
             for s in sheets
-        ])
-        # Concatenate sparse + dense
-        from scipy.sparse import hstack
-        return hstack([X_text, struct_feats])
+        ], dtype=float))
+        return hstack([X_text, csr_matrix(struct_feats)], format="csr")
 
-    def train(self, sheets: list[SheetUnit]):
+    def train(self, sheets: list[SheetUnit], sample_weight: list[float] | None = None):
         labels = [s.classification for s in sheets]
 
-        X = self._extract_features(sheets)
-        self.model.fit(X, labels)
+        self.vectorizer = TfidfVectorizer(max_features=5000, ngram_range=(1, 2), sublinear_tf=True)
+        self.model = LogisticRegression(max_iter=500)
+        X = self._extract_features(sheets, fit=True)
+        self.model.fit(X, labels, sample_weight=sample_weight)
         self.is_trained = True
 
-    def classify(self, sheet: SheetUnit) -> Tuple[Optional[str], float]:
-        if not self.is_trained:
-            return None, 0.0
+    def artifact(self, **meta) -> dict:
+        return {"vectorizer": self.vectorizer, "model": self.model, "meta": meta}
 
-        text = self._extract_text(sheet)
-        X_text = self.vectorizer.transform([text])
-        struct_feats = np.array([
-            [sheet.row_count, sheet.col_count, sheet.metadata.get("table_count", 1)]
-        ])
-        from scipy.sparse import hstack
-        X = hstack([X_text, struct_feats])
+    def classify_many(self, sheets: list[SheetUnit]) -> list[Tuple[Optional[str], float]]:
+        """Vectorize all sheets in one sparse matrix and predict them together."""
+        if not self.is_trained or not sheets:
+            return [(None, 0.0)] * len(sheets)
 
-        proba = self.model.predict_proba(X)[0]
-        idx = np.argmax(proba)
-        label = self.model.classes_[idx]
-        return label, float(proba[idx])
+        proba = self.model.predict_proba(self._extract_features(sheets))
+        best = proba.argmax(axis=1)
+        return [
+            (str(self.model.classes_[idx]), float(proba[row, idx]))
+            for row, idx in enumerate(best)
+        ]
+
+    def classify(self, sheet: SheetUnit) -> Tuple[Optional[str], float]:
+        return self.classify_many([sheet])[0]
 
 
 # ==============================
@@ -179,30 +197,129 @@ class MLClassifier(BaseClassifier):
 class SheetClassifier:
     """Pipeline combining multiple classifiers."""
 
+    THRESHOLD = 0.65
+
     def __init__(self, classifiers: list[BaseClassifier] | None = None):
         # Order: rule first, ML second
         self.classifiers = classifiers or [RuleBasedClassifier(), MLClassifier()]
 
-    def classify(self, sheet_id: int) -> str:
-        sheet = SheetUnit.objects.get(id=sheet_id)
+    def predict(self, sheet: SheetUnit) -> Tuple[str, float, Optional[str]]:
+        """Classify an in-memory sheet; returns (label, confidence, classifier name or None)."""
+        return self.predict_many([sheet])[0]
 
+    def predict_many(self, sheets: list[SheetUnit]) -> list[Tuple[str, float, Optional[str]]]:
+        """
+        Classify many sheets; each tier only sees the sheets earlier tiers left
+        undecided, and tiers with `classify_many` get them in one call.
+        """
+        # Fallback: unknown
+        results = [("unknown", 0.0, None)] * len(sheets)
+        pending = list(range(len(sheets)))
         for clf in self.classifiers:
-            label, confidence = clf.classify(sheet)
-            if label and confidence >= 0.65:  # threshold
-                sheet.classification = label
-                sheet.classification_confidence = float(confidence)
-                sheet.save()
-                AuditLog.objects.create(
-                    sheet_unit=sheet,
-                    action=f"classified_{clf.__class__.__name__.lower()}",
-                    details={"label": label, "confidence": confidence},
-                )
-                print(f"label {label}")
-                return label
+            if not pending:
+                break
+            batch = [sheets[i] for i in pending]
+            if hasattr(clf, "classify_many"):
+                outputs = clf.classify_many(batch)
+            else:
+                outputs = [clf.classify(sheet) for sheet in batch]
+
+            still_pending = []
+            for i, (label, confidence) in zip(pending, outputs):
+                if label and confidence >= self.THRESHOLD:
+                    results[i] = (label, float(confidence), clf.__class__.__name__.lower())
+                else:
+                    still_pending.append(i)
+            pending = still_pending
+        return results
+
+    def apply(self, sheet: SheetUnit) -> AuditLog:
+        """Set the label on the sheet (unsaved) and return the matching unsaved AuditLog."""
+        return self.apply_many([sheet])[0]
+
+    def apply_many(self, sheets: list[SheetUnit]) -> list[AuditLog]:
+        return [
+            self._label(sheet, label, confidence, source)
+            for sheet, (label, confidence, source) in zip(sheets, self.predict_many(sheets))
+        ]
+
+    @staticmethod
+    def _label(sheet: SheetUnit, label, confidence, source) -> AuditLog:
+        sheet.classification = label
+        sheet.classification_confidence = confidence
+        sheet.classification_source = source
+        sheet.classified_at = timezone.now()
+        if source is None:
+            return AuditLog(sheet_unit=sheet, action="classified_none", details={})
+        return AuditLog(
+            sheet_unit=sheet,
+            action=f"classified_{source}",
+            details={"label": label, "confidence": confidence},
+        )
+
+    # Fields the tiers read, plus the ones they write
+    CLASSIFY_FIELDS = (
+        "id", "sheet_name", "header_rows", "sample_rows", "metadata", "row_count", "col_count",
+        "classification", "classification_confidence", "classification_source", "classified_at",
+    )
+    LABEL_FIELDS = ["classification", "classification_confidence", "classification_source", "classified_at"]
+    # Labels an analyst may assign; each has a mapper schema
+    LABELS = tuple(RuleBasedClassifier.DEFAULT_RULES)
 
-        # Fallback: unknown
-        sheet.classification = "unknown"
-        sheet.classification_confidence = 0.0
-        sheet.save()
-        AuditLog.objects.create(sheet_unit=sheet, action="classified_none", details={})
-        return "unknown"
+    def classify(self, sheet_id: int) -> str:
+        sheet = SheetUnit.objects.only(*self.CLASSIFY_FIELDS).get(id=sheet_id)
+
+        audit = self.apply(sheet)
+        sheet.save(update_fields=self.LABEL_FIELDS)
+        audit.save()
+        return sheet.classification
+
+    def classify_upload(self, uploaded_file_id, only_unlabelled: bool = False) -> dict:
+        """
+        Classify every SheetUnit of an upload: one select, tiers run in memory,
+        one bulk_update and one batched audit insert.
+
+        Sheets matching a known template inherit its label (and, downstream,
+        its schema mapping) without running the tiers; confidently classified
+        sheets are registered as new templates.
+        """
+        sheets = (SheetUnit.objects
+                  .filter(uploaded_file_id=uploaded_file_id)
+                  .exclude(classification_source="manual")  # analyst corrections are never overwritten
+                  .only(*self.CLASSIFY_FIELDS, "template"))
+        if only_unlabelled:
+            sheets = sheets.filter(classification__isnull=True)
+        sheets = list(sheets)
+        if not sheets:
+            return {"labels": {}, "template_hits": 0, "sheets": 0}
+
+        index = TemplateIndex()
+        audits, misses, matched = [], [], []
+        for sheet, (template, similarity) in zip(sheets, index.match_many(sheets)):
+            if template is None:
+                misses.append(sheet)
+                continue
+            sheet.template = template
+            matched.append(template)
+            audits.append(self._label(sheet, template.classification, similarity, "template"))
+
+        audits.extend(self.apply_many(misses))
+        learned = index.learn(misses)
+        for sheet in misses:
+            sheet.template = learned.get(template_signature(sheet))
+
+        with transaction.atomic():
+            SheetUnit.objects.bulk_update(sheets, self.LABEL_FIELDS + ["template"], batch_size=500)
+            AuditLog.objects.bulk_create(audits, batch_size=500)
+            index.record_hits(matched)
+        return {
+            "labels": dict(Counter(sheet.classification for sheet in sheets)),
+            "template_hits": len(matched),
+            "sheets": len(sheets),
+        }
+
+
+@shared_task
+def task_classify_upload(uploaded_file_id):
+    """Re-run classification for a whole upload (e.g. after retraining the model)."""
+    return SheetClassifier().classify_upload(uploaded_file_id)
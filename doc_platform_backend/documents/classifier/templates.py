@@ -0,0 +1,166 @@
+# classifier/templates.py
+import hashlib
+import re
+import zlib
+
+import numpy as np
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import SheetTemplate, SheetUnit
+
+NUM_PERM = 64
+NEAR_MATCH_THRESHOLD = 0.85   # estimated Jaccard of header tokens
+MIN_LEARN_CONFIDENCE = 0.65
+_PRIME = (1 << 61) - 1
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERM).astype(np.uint64)
+
+_DIGITS = re.compile(r"\d+([.,/-]\d+)*")
+_NOISE = re.compile(r"[^\w%#&]+")
+
+
+# ------------------------------------------------
+# 🔹 Normalization + signatures
+# ------------------------------------------------
+def normalize_cell(value) -> str:
+    """Lowercase, numbers/dates -> '#', punctuation collapsed ("Q3 2024 Revenue:" -> "q# # revenue")."""
+    text = _DIGITS.sub("#", str(value or "").lower())
+    return _NOISE.sub(" ", text).strip()
+
+
+def header_tokens(sheet: SheetUnit) -> list[str]:
+    return [cell for row in (sheet.header_rows or []) for cell in map(normalize_cell, row) if cell]
+
+
+def template_signature(sheet: SheetUnit) -> str:
+    key = "\x1f".join([normalize_cell(sheet.sheet_name), "|".join(header_tokens(sheet)), str(sheet.col_count)])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def same_layout(sheet: SheetUnit, template: SheetTemplate) -> bool:
+    """
+    True when the sheet has the template's exact layout and label.
+
+    Near matches compare header words as a set and ignore column order, so a
+    template's index-based schema_mapping only applies to exact signatures.
+    """
+    return template.classification == sheet.classification and template.signature == template_signature(sheet)
+
+
+def minhash(tokens) -> list[int]:
+    """MinHash over header words and the normalized sheet name."""
+    words = {w for token in tokens for w in token.split()}
+    if not words:
+        return []
+    hashes = np.array([zlib.crc32(w.encode()) for w in words], dtype=np.uint64)
+    # (a*h + b) mod p for every permutation x every word, min per permutation
+    mixed = (np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % _PRIME
+    return mixed.min(axis=1).astype(np.int64).tolist()
+
+
+# ------------------------------------------------
+# 🔹 Template index
+# ------------------------------------------------
+class TemplateIndex:
+    """
+    Recognize sheets that follow a known layout.
+
+    Exact matches use the normalized (name, headers, width) signature with one
+    indexed lookup for the whole batch. Sheets without an exact match are
+    compared against every template of the same width by MinHash similarity
+    of their header tokens (a few hundred templates -> one numpy comparison).
+    """
+
+    def __init__(self, threshold: float = NEAR_MATCH_THRESHOLD):
+        self.threshold = threshold
+        self._near = None  # {col_count: (templates, signatures matrix)}
+
+    def _near_index(self):
+        if self._near is None:
+            groups = {}
+            for template in SheetTemplate.objects.only(
+                "id", "col_count", "minhash", "classification", "schema_mapping",
+            ):
+                if len(template.minhash) == NUM_PERM:
+                    groups.setdefault(template.col_count, []).append(template)
+            self._near = {
+                cols: (templates, np.array([t.minhash for t in templates], dtype=np.int64))
+                for cols, templates in groups.items()
+            }
+        return self._near
+
+    def match_many(self, sheets: list[SheetUnit]) -> list[tuple[SheetTemplate | None, float]]:
+        """(template, similarity) per sheet; similarity 1.0 for exact signature matches."""
+        signatures = [template_signature(s) for s in sheets]
+        exact = {t.signature: t for t in SheetTemplate.objects.filter(signature__in=set(signatures))}
+
+        results = []
+        for sheet, signature in zip(sheets, signatures):
+            if signature in exact:
+                results.append((exact[signature], 1.0))
+                continue
+            results.append(self._near_match(sheet))
+        return results
+
+    def _near_match(self, sheet: SheetUnit):
+        group = self._near_index().get(sheet.col_count)
+        signature = minhash(header_tokens(sheet) + [normalize_cell(sheet.sheet_name)])
+        if not group or not signature:
+            return None, 0.0
+        templates, matrix = group
+        similarity = (matrix == np.array(signature, dtype=np.int64)).mean(axis=1)
+        best = int(similarity.argmax())
+        if similarity[best] < self.threshold:
+            return None, 0.0
+        return templates[best], float(similarity[best])
+
+    def record_hits(self, templates: list[SheetTemplate]):
+        counts = {}
+        for template in templates:
+            counts[template.id] = counts.get(template.id, 0) + 1
+        now = timezone.now()
+        for template_id, n in counts.items():
+            SheetTemplate.objects.filter(id=template_id).update(hit_count=F("hit_count") + n, last_matched_at=now)
+
+    def learn(self, sheets: list[SheetUnit], overwrite: bool = False) -> dict:
+        """
+        Register confidently classified sheets as templates; returns {signature: template}.
+
+        overwrite=True (manual corrections) replaces the label of an existing template;
+        a relabelled template also drops its schema mapping (learned for the old schema).
+        """
+        candidates = {}
+        for sheet in sheets:
+            confident = sheet.classification_source == "manual" or (
+                sheet.classification_source and (sheet.classification_confidence or 0) >= MIN_LEARN_CONFIDENCE
+            )
+            if not confident or sheet.classification in (None, "unknown"):
+                continue
+            tokens = header_tokens(sheet)
+            candidates[template_signature(sheet)] = SheetTemplate(
+                signature=template_signature(sheet),
+                sheet_name=normalize_cell(sheet.sheet_name),
+                header_tokens=tokens,
+                minhash=minhash(tokens + [normalize_cell(sheet.sheet_name)]),
+                col_count=sheet.col_count,
+                classification=sheet.classification,
+                classification_source=sheet.classification_source,
+            )
+        if not candidates:
+            return {}
+
+        if overwrite:
+            relabelled = Q()
+            for signature, template in candidates.items():
+                relabelled |= Q(signature=signature) & ~Q(classification=template.classification)
+            SheetTemplate.objects.filter(relabelled).update(schema_mapping=None)
+            SheetTemplate.objects.bulk_create(
+                candidates.values(), update_conflicts=True, unique_fields=["signature"],
+                update_fields=["classification", "classification_source"],
+            )
+        else:
+            SheetTemplate.objects.bulk_create(candidates.values(), ignore_conflicts=True)
+        self._near = None
+        return {t.signature: t for t in SheetTemplate.objects.filter(signature__in=candidates)}
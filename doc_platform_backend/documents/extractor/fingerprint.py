@@ -0,0 +1,27 @@
+# extractor/fingerprint.py
+import hashlib
+
+import pandas as pd
+
+from common.utils.ocr_cache import image_fingerprint
+
+
+# ------------------------------------------------
+# 🔹 Per-sheet fingerprint (cells + drawings)
+# ------------------------------------------------
+def sheet_fingerprint(df, chart_count: int = 0, images=()) -> str:
+    """
+    SHA-256 over everything that feeds extraction of one sheet.
+
+    Cell values are hashed row-wise by pandas (vectorised), then folded with
+    the grid shape, the chart count and the hash of every embedded image, so a
+    sheet only matches when detection, OCR and classification would see
+    exactly the same input.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{df.shape[0]}x{df.shape[1]}|charts={chart_count}".encode())
+    if not df.empty:
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    for img_bytes in images:
+        digest.update(image_fingerprint(img_bytes).encode())
+    return digest.hexdigest()
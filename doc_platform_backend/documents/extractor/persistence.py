@@ -0,0 +1,97 @@
+# extractor/persistence.py
+from django.db import transaction
+
+from documents.models import SheetUnit, AuditLog, StructuredDocument, Annexure, MappedChunk
+from ..classifier.tasks import SheetClassifier
+
+
+class SheetUnitBatch:
+    """
+    Collect the SheetUnits and audit events of one sheet and write them together.
+
+    A sheet costs one transaction with two bulk inserts instead of
+    create/get/save/create per table. Pass a classifier to label units in
+    memory before the write; otherwise they are left for
+    `SheetClassifier.classify_upload` once the whole upload is extracted.
+    """
+
+    def __init__(self, classifier: SheetClassifier | None = None):
+        self.classifier = classifier
+        self.units: list[SheetUnit] = []
+        self.audit_events: list[AuditLog] = []
+
+    def __len__(self):
+        return len(self.units)
+
+    def add(self, unit: SheetUnit, details: dict | None = None):
+        self.units.append(unit)
+        self.audit_events.append(
+            AuditLog(sheet_unit=unit, action="sheet_extracted", details=details or {})
+        )
+
+    def flush(self) -> list[SheetUnit]:
+        if not self.units:
+            return []
+
+        if self.classifier is not None:
+            self.audit_events.extend(self.classifier.apply_many(self.units))
+
+        with transaction.atomic():
+            SheetUnit.objects.bulk_create(self.units)
+            AuditLog.objects.bulk_create(self.audit_events)
+
+        written = self.units
+        self.units, self.audit_events = [], []
+        return written
+
+
+# Fields copied when a SheetUnit is reused for an identical upload
+CLONED_FIELDS = (
+    "sheet_name", "row_count", "col_count", "header_rows", "sample_rows", "raw_table",
+    "metadata", "bounding_box", "table_index", "classification", "classification_confidence",
+    "classification_source", "classified_at", "template_id",
+)
+
+
+def clone_sheet_units(units, uploaded_file) -> list[SheetUnit]:
+    """
+    Copy already-extracted SheetUnits onto another upload in one transaction.
+
+    Their mapping output (StructuredDocument, Annexure, MappedChunk rows) is
+    copied too, so cloned units are not sent to the mapper again. Spilled raw
+    tables are immutable, so the clones share the same Parquet pointer.
+    """
+    units = list(units)
+    clones, audit_events, clone_of = [], [], {}
+    for unit in units:
+        clone = SheetUnit(uploaded_file=uploaded_file, **{f: getattr(unit, f) for f in CLONED_FIELDS})
+        clones.append(clone)
+        clone_of[unit.id] = clone
+        audit_events.append(AuditLog(
+            sheet_unit=clone, action="sheet_reused", details={"source_sheet_unit": str(unit.id)},
+        ))
+
+    source_ids = list(clone_of)
+    documents = [
+        StructuredDocument(sheet_unit=clone_of[d.sheet_unit_id], schema_type=d.schema_type,
+                           json_data=d.json_data, provenance=d.provenance)
+        for d in StructuredDocument.objects.filter(sheet_unit_id__in=source_ids)
+    ]
+    annexures = [
+        Annexure(sheet_unit=clone_of[a.sheet_unit_id], json_data=a.json_data, reason=a.reason)
+        for a in Annexure.objects.filter(sheet_unit_id__in=source_ids)
+    ]
+    chunks = [
+        MappedChunk(sheet_unit=clone_of[c.sheet_unit_id], chunk_index=c.chunk_index, start_row=c.start_row,
+                    end_row=c.end_row, status=c.status, records=c.records, column_mapping=c.column_mapping,
+                    attempts=c.attempts, error=c.error)
+        for c in MappedChunk.objects.filter(sheet_unit_id__in=source_ids)
+    ]
+
+    with transaction.atomic():
+        SheetUnit.objects.bulk_create(clones)
+        StructuredDocument.objects.bulk_create(documents)
+        Annexure.objects.bulk_create(annexures)
+        MappedChunk.objects.bulk_create(chunks, batch_size=1000)
+        AuditLog.objects.bulk_create(audit_events)
+    return clones
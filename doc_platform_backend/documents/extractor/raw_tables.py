@@ -0,0 +1,145 @@
+# extractor/raw_tables.py
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+ROW_GROUP_ROWS = 10_000  # row-group size => granularity of range reads
+
+
+# ------------------------------------------------
+# 🔹 Write: oversized tables -> typed, compressed Parquet
+# ------------------------------------------------
+def _typed_column(values: list) -> pa.Array:
+    """Infer int64 / float64 / string for one column of cell strings ("" = null)."""
+    cleaned = [None if v is None or str(v).strip() == "" else str(v).strip() for v in values]
+    present = [v for v in cleaned if v is not None]
+    # Codes like "00123" must keep their leading zeros -> leave them as strings
+    has_padded_codes = any(len(v) > 1 and v[0] == "0" and v[1] != "." for v in present)
+    if present and not has_padded_codes:
+        numbers = pd.to_numeric(pd.Series(present), errors="coerce")
+        if not numbers.isna().any():
+            if (numbers % 1 == 0).all() and numbers.abs().max() < 2 ** 53:
+                return pa.array([None if v is None else int(float(v)) for v in cleaned], type=pa.int64())
+            return pa.array([None if v is None else float(v) for v in cleaned], type=pa.float64())
+    return pa.array(["" if v is None else str(v) for v in values], type=pa.string())
+
+
+def spill_raw_table(uploaded_file_id, rows: list[list], leading_rows: int = 0) -> dict:
+    """
+    Store rows as zstd Parquet with column statistics; return the raw_table pointer.
+
+    The first `leading_rows` (title and header rows) are kept as strings in
+    the pointer, so column types are inferred from the data rows alone.
+    """
+    col_count = max((len(r) for r in rows), default=0)
+    leading = [["" if v is None else str(v) for v in r] + [""] * (col_count - len(r)) for r in rows[:leading_rows]]
+    data = rows[leading_rows:]
+    columns = [[r[i] if i < len(r) else "" for r in data] for i in range(col_count)]
+    names = [f"c{i}" for i in range(col_count)]
+    table = pa.table([_typed_column(col) for col in columns], names=names)
+
+    buf = pa.BufferOutputStream()
+    pq.write_table(
+        table, buf,
+        compression="zstd",
+        row_group_size=ROW_GROUP_ROWS,
+        write_statistics=True,
+    )
+    object_name = f"uploaded_raw_tables/{uploaded_file_id}/{uuid.uuid4()}.parquet"
+    object_name = default_storage.save(object_name, ContentFile(buf.getvalue().to_pybytes()))
+
+    return {
+        "parquet_pointer": object_name,
+        "row_count": len(rows),
+        "col_count": col_count,
+        "leading_rows": leading,
+        "schema": {field.name: str(field.type) for field in table.schema},
+    }
+
+
+# ------------------------------------------------
+# 🔹 Read: stream row ranges without loading the table
+# ------------------------------------------------
+class RawTableReader:
+    """
+    Uniform reader over SheetUnit.raw_table.
+
+    Handles inline lists, Parquet pointers (only the row groups overlapping
+    the requested range are read) and legacy CSV pointers. Row indexes count
+    a Parquet pointer's leading string rows, as in the original block.
+    """
+
+    def __init__(self, raw_table):
+        self.raw_table = raw_table or []
+        self._handle = None
+        self._parquet = None
+        self._leading = []
+        self._inline = None
+
+        if isinstance(self.raw_table, dict) and self.raw_table.get("parquet_pointer"):
+            self._handle = default_storage.open(self.raw_table["parquet_pointer"], "rb")
+            self._parquet = pq.ParquetFile(self._handle)
+            self._leading = self.raw_table.get("leading_rows") or []
+        elif isinstance(self.raw_table, dict) and self.raw_table.get("csv_pointer"):
+            with default_storage.open(self.raw_table["csv_pointer"], "rb") as f:
+                df = pd.read_csv(f, header=None, dtype=str, keep_default_na=False)
+            self._inline = df.values.tolist()
+        else:
+            self._inline = list(self.raw_table)
+
+    @classmethod
+    def for_sheet(cls, sheet):
+        return cls(sheet.raw_table)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+        if self._handle is not None:
+            self._handle.close()
+
+    @property
+    def row_count(self) -> int:
+        if self._parquet is not None:
+            return len(self._leading) + self._parquet.metadata.num_rows
+        return len(self._inline)
+
+    def iter_rows(self, start: int = 0, stop: int | None = None, batch_rows: int = ROW_GROUP_ROWS):
+        """Yield rows [start, stop) as lists, reading one row group at a time."""
+        stop = self.row_count if stop is None else min(stop, self.row_count)
+        if start >= stop:
+            return
+
+        if self._parquet is None:
+            yield from (list(row) for row in self._inline[start:stop])
+            return
+
+        yield from (list(row) for row in self._leading[start:stop])
+        # The rest are Parquet rows, indexed from the end of the leading rows
+        start, stop = max(start - len(self._leading), 0), stop - len(self._leading)
+        if start >= stop:
+            return
+        group_start = 0
+        for group in range(self._parquet.num_row_groups):
+            group_rows = self._parquet.metadata.row_group(group).num_rows
+            group_end = group_start + group_rows
+            if group_end > start and group_start < stop:
+                lo = max(start, group_start) - group_start
+                hi = min(stop, group_end) - group_start
+                for batch in self._parquet.read_row_group(group).slice(lo, hi - lo).to_batches(batch_rows):
+                    yield from (list(row) for row in zip(*(col.to_pylist() for col in batch.columns)))
+            if group_end >= stop:
+                break
+            group_start = group_end
+
+    def read_rows(self, start: int = 0, stop: int | None = None) -> list[list]:
+        return list(self.iter_rows(start, stop))
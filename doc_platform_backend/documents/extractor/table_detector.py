@@ -0,0 +1,121 @@
+# extractor/table_detector.py
+import numpy as np
+import pandas as pd
+from scipy import ndimage
+
+
+# ------------------------------------------------
+# 🔹 Cell mask + connected components
+# ------------------------------------------------
+def non_empty_mask(df) -> np.ndarray:
+    """Boolean grid, True where the cell holds a non-blank value."""
+    values = df.to_numpy(dtype=object).astype(str)
+    return np.char.str_len(np.char.strip(values)) > 0
+
+
+def label_blocks(mask: np.ndarray, gap_tolerance: int = 1):
+    """
+    Label groups of non-empty cells that sit within `gap_tolerance` cells
+    (Chebyshev distance) of each other.
+
+    Every cell is dilated by a `gap_tolerance` x `gap_tolerance` square, so two
+    cells end up touching (8-connectivity) exactly when they are at most
+    `gap_tolerance` rows/cols apart. Labels are then masked back to the
+    original non-empty cells so blank cells never count towards a block.
+    """
+    gap = max(int(gap_tolerance), 1)
+    grown = mask
+    if gap > 1:
+        grown = ndimage.binary_dilation(mask, structure=np.ones((gap, gap), dtype=bool))
+
+    labels, count = ndimage.label(grown, structure=np.ones((3, 3), dtype=bool))
+    labels[~mask] = 0
+    return labels, count
+
+
+# ------------------------------------------------
+# 🔹 2D Table Detector with Gap Tolerance + Headers
+# ------------------------------------------------
+def detect_tables_2d(df, max_header_search=15, sample_limit=20,
+                     max_header_rows=3, min_block_size=5, gap_tolerance=1):
+    if df.empty:
+        return []
+
+    mask = non_empty_mask(df)
+    labels, count = label_blocks(mask, gap_tolerance)
+    if count == 0:
+        return []
+
+    # Step 1: Bounding boxes + sizes for every block in one pass
+    sizes = np.bincount(labels.ravel(), minlength=count + 1)
+    tables = []
+    for label, box in enumerate(ndimage.find_objects(labels), start=1):
+        if box is None or sizes[label] < min_block_size:
+            continue
+        rows, cols = box
+        # Scan order of the block's first cell: its top row, leftmost cell in that row
+        first_col = cols.start + int(np.argmax(labels[rows.start, cols] == label))
+        tables.append((rows.start, first_col, rows.stop - 1, cols.start, cols.stop - 1))
+
+    # Keep the original scan order (top-to-bottom, left-to-right)
+    tables.sort()
+
+    results = []
+
+    # Step 2: Run header detection
+    for (rmin, _, rmax, cmin, cmax) in tables:
+        block_df = df.iloc[rmin:rmax + 1, cmin:cmax + 1]
+        block_values = block_df.to_numpy(dtype=object)
+        # Any non-null value counts (blank strings included), as before
+        non_empty_rows = np.flatnonzero(pd.notna(block_values).any(axis=1)).tolist()
+        if not non_empty_rows:
+            continue
+
+        def score_row(row_idx):
+            values = [str(v).strip() for v in block_values[row_idx]]
+            non_empty = sum(1 for v in values if v)
+            text_like = sum(1 for v in values if v.isalpha())
+            num_like = sum(1 for v in values if v.replace(".", "", 1).isdigit())
+            return non_empty + text_like - num_like
+
+        candidates = non_empty_rows[:max_header_search]
+        scores = {r: score_row(r) for r in candidates}
+        header_row_idx = max(scores, key=scores.get)
+
+        # Multi-row headers
+        header_rows = [block_values[header_row_idx].tolist()]
+        for i in range(1, max_header_rows):
+            if header_row_idx + i < block_values.shape[0]:
+                next_score = score_row(header_row_idx + i)
+                if next_score >= scores[header_row_idx] * 0.6:
+                    header_rows.append(block_values[header_row_idx + i].tolist())
+                else:
+                    break
+
+        # Pre-header
+        pre_header_context = [
+            block_values[r].tolist()
+            for r in non_empty_rows if r < header_row_idx
+        ]
+
+        # Sample rows after headers (basic)
+        last_header_row = header_row_idx + len(header_rows) - 1
+        sample_rows = [
+            block_values[r].tolist()
+            for r in non_empty_rows if r > last_header_row
+        ][:sample_limit]
+
+        results.append({
+            "header_rows": header_rows,
+            "sample_rows": sample_rows,
+            "pre_header_context": pre_header_context,
+            "raw_table": block_values.tolist(),
+            "bounding_box": {
+                "row_min": int(rmin), "row_max": int(rmax),
+                "col_min": int(cmin), "col_max": int(cmax)
+            },
+            "row_count": block_values.shape[0],
+            "col_count": block_values.shape[1],
+        })
+
+    return results
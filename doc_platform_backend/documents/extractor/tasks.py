@@ -1,120 +1,23 @@
 import json
-import io
-import uuid
-import tempfile
-import os
-import subprocess
-import pandas as pd
-import fitz  # PyMuPDF
-import numpy as np
-from PIL import Image
-from openpyxl import load_workbook
-from django.core.files.storage import default_storage
+import time
+from celery import shared_task, chord, group
+from django.conf import settings
+from django.db.models import F
 from documents.models import UploadedFile, SheetUnit, AuditLog
+from common.utils.workbook_loader import WorkbookSource
+from common.utils.ocr_cache import OCRResultCache
+from common.utils.progress import report_progress
+from .table_detector import detect_tables_2d
+from .persistence import SheetUnitBatch, clone_sheet_units
+from .fingerprint import sheet_fingerprint
+from .raw_tables import spill_raw_table
 from ..classifier.tasks import SheetClassifier
+from ..chunker.tasks import task_process_sheet
 
 MAX_INLINE_ROWS = 300
 CHUNK_ROWS = 200
 
 
-# ------------------------------------------------
-# 🔹 2D Table Detector with Gap Tolerance + Headers
-# ------------------------------------------------
-def detect_tables_2d(df, max_header_search=15, sample_limit=20,
-                     max_header_rows=3, min_block_size=5, gap_tolerance=1):
-    row_count, col_count = df.shape
-    mask = df.applymap(lambda x: str(x).strip() != "")  # True = non-empty
-
-    tables = []
-    visited = np.zeros(mask.shape, dtype=bool)
-
-    def dfs(r, c, coords):
-        stack = [(r, c)]
-        while stack:
-            rr, cc = stack.pop()
-            if 0 <= rr < row_count and 0 <= cc < col_count and not visited[rr, cc]:
-                visited[rr, cc] = True
-                coords.append((rr, cc))
-                # Explore neighbors within gap tolerance
-                for dr in range(-gap_tolerance, gap_tolerance + 1):
-                    for dc in range(-gap_tolerance, gap_tolerance + 1):
-                        nr, nc = rr + dr, cc + dc
-                        if 0 <= nr < row_count and 0 <= nc < col_count and not visited[nr, nc]:
-                            if mask.iat[nr, nc] or (abs(dr) <= gap_tolerance and abs(dc) <= gap_tolerance):
-                                stack.append((nr, nc))
-
-    # Step 1: Find connected blocks
-    for r in range(row_count):
-        for c in range(col_count):
-            if mask.iat[r, c] and not visited[r, c]:
-                coords = []
-                dfs(r, c, coords)
-                if len(coords) >= min_block_size:
-                    rows = [p[0] for p in coords]
-                    cols = [p[1] for p in coords]
-                    rmin, rmax = min(rows), max(rows)
-                    cmin, cmax = min(cols), max(cols)
-                    block_df = df.iloc[rmin:rmax + 1, cmin:cmax + 1]
-                    tables.append((rmin, rmax, cmin, cmax, block_df))
-
-    results = []
-
-    # Step 2: Run header detection
-    for (rmin, rmax, cmin, cmax, block_df) in tables:
-        non_empty_rows = [i for i in range(block_df.shape[0]) if block_df.iloc[i].notna().any()]
-        if not non_empty_rows:
-            continue
-
-        def score_row(row_idx):
-            values = [str(v).strip() for v in block_df.iloc[row_idx].tolist()]
-            non_empty = sum(1 for v in values if v)
-            text_like = sum(1 for v in values if v.isalpha())
-            num_like = sum(1 for v in values if v.replace(".", "", 1).isdigit())
-            return non_empty + text_like - num_like
-
-        candidates = non_empty_rows[:max_header_search]
-        scores = {r: score_row(r) for r in candidates}
-        header_row_idx = max(scores, key=scores.get)
-
-        # Multi-row headers
-        header_rows = [list(block_df.iloc[header_row_idx].tolist())]
-        for i in range(1, max_header_rows):
-            if header_row_idx + i < block_df.shape[0]:
-                next_score = score_row(header_row_idx + i)
-                if next_score >= scores[header_row_idx] * 0.6:
-                    header_rows.append(list(block_df.iloc[header_row_idx + i].tolist()))
-                else:
-                    break
-
-        # Pre-header
-        pre_header_context = [
-            list(block_df.iloc[r].tolist())
-            for r in non_empty_rows if r < header_row_idx
-        ]
-
-        # Sample rows after headers (basic)
-        last_header_row = header_row_idx + len(header_rows) - 1
-        sample_rows = [
-            list(block_df.iloc[r].tolist())
-            for r in non_empty_rows if r > last_header_row
-        ][:sample_limit]
-
-        results.append({
-            "header_rows": header_rows,
-            "sample_rows": sample_rows,
-            "pre_header_context": pre_header_context,
-            "raw_table": block_df.values.tolist(),
-            "bounding_box": {
-                "row_min": rmin, "row_max": rmax,
-                "col_min": cmin, "col_max": cmax
-            },
-            "row_count": block_df.shape[0],
-            "col_count": block_df.shape[1],
-        })
-
-    return results
-
-
 # ------------------------------------------------
 # 🔹 Utility: Representative Rows (first, mid, last)
 # ------------------------------------------------
@@ -141,87 +44,193 @@ def get_representative_rows(raw_table, count=2):
     return reps
 
 
+def header_end(table):
+    """Index of the first row below the header block in table["raw_table"], 0 if it is not found."""
+    header, rows = table["header_rows"], table["raw_table"]
+    # The detector takes the first best-scoring row, so the first match is its header
+    for i in range(len(rows) - len(header) + 1):
+        if rows[i:i + len(header)] == header:
+            return i + len(header)
+    return 0
+
+
 # -------------------------------
-# 🔹 Main Extraction Task
+# 🔹 Main Extraction Task (fan-out)
 # -------------------------------
+@shared_task
 def task_extract_workbook(uploaded_file_id):
+    """Dispatch the sheets in batches as a chord; the callback marks the upload complete."""
     uploaded = UploadedFile.objects.get(file_id=uploaded_file_id)
-    file_obj = uploaded.s3_path
+    report_progress(uploaded, "loading", 2, status="processing")
+
+    # Identical bytes were extracted before: copy the SheetUnits instead of re-parsing
+    previous = find_reusable_upload(uploaded)
+    if previous:
+        return reuse_previous_extraction(previous, uploaded)
 
-    # Step 1: Load with pandas
     try:
-        xls = pd.ExcelFile(file_obj)
+        with WorkbookSource(uploaded.s3_path) as source:
+            sheet_names = source.sheet_names
     except Exception as e:
         AuditLog.objects.create(sheet_unit=None, action="extract_error", details={"error": str(e)})
+        report_progress(uploaded, "failed", status="failed")
         raise
 
-    # Step 2: Load with openpyxl for charts/images
-    try:
-        wb = load_workbook(file_obj)
-    except Exception as e:
-        wb = None
-        AuditLog.objects.create(sheet_unit=None, action="openpyxl_error", details={"error": str(e)})
-
-    for sheet_name in xls.sheet_names:
-        df = xls.parse(sheet_name, header=None, dtype=str).fillna("")
-
-        detected_tables = detect_tables_2d(df)
-
-        for idx, table in enumerate(detected_tables, start=1):
-            row_count, col_count = table["row_count"], table["col_count"]
-
-            # Save raw_table or CSV pointer
-            if row_count <= MAX_INLINE_ROWS:
-                raw_table = table["raw_table"]
-            else:
-                tmp_csv = io.StringIO()
-                pd.DataFrame(table["raw_table"]).to_csv(tmp_csv, index=False, header=False)
-                csv_bytes = tmp_csv.getvalue().encode()
-                object_name = f"uploaded_raw_tables/{uploaded.file_id}/{uuid.uuid4()}.csv"
-                default_storage.save(object_name, io.BytesIO(csv_bytes))
-                raw_table = {"csv_pointer": object_name}
-
-            # Metadata: charts + OCR
-            charts_info, ocr_results = {}, {}
-            if wb:
-                ws = wb[sheet_name]
-                charts_info[sheet_name] = len(getattr(ws, "_charts", []))
-                extracted_texts = []
-                for img in getattr(ws, "_images", []):
-                    try:
-                        img_bytes = img._data()
-                        image = Image.open(io.BytesIO(img_bytes))
-                        with tempfile.TemporaryDirectory() as tmp_dir:
-                            pdf_path = os.path.join(tmp_dir, "img.pdf")
-                            ocr_pdf_path = os.path.join(tmp_dir, "img_ocr.pdf")
-                            image.convert("RGB").save(pdf_path)
-
-                            subprocess.run(
-                                ["ocrmypdf", "--force-ocr", pdf_path, ocr_pdf_path],
-                                check=True, capture_output=True
-                            )
-
-                            doc = fitz.open(ocr_pdf_path)
-                            ocr_text = "\n".join([page.get_text().strip() for page in doc])
-                            doc.close()
-
-                            if ocr_text.strip():
-                                extracted_texts.append(ocr_text.strip())
-                    except Exception as e:
-                        extracted_texts.append(f"[OCR Error: {str(e)}]")
-
-                if extracted_texts:
-                    ocr_results[sheet_name] = extracted_texts
-
-            metadata = {
-                "charts": charts_info,
-                "ocr_from_images": ocr_results,
-                "pre_header_context": table["pre_header_context"],
-                "table_count": len(detected_tables)
-            }
+    uploaded.metadata = {**(uploaded.metadata or {}), "sheet_count": len(sheet_names)}
+    uploaded.save(update_fields=["metadata"])
+    report_progress(uploaded, "extracting_sheets", 5, sheets_done=0)
+
+    if not sheet_names:
+        return task_finalize_extraction([], uploaded_file_id)
 
-            # Save to DB
-            sheet_unit = SheetUnit.objects.create(
+    # Sheets whose fingerprint matches the previous version are cloned, not re-extracted
+    previous = find_previous_version(uploaded)
+    previous_id = str(previous.file_id) if previous else None
+
+    # Several sheets per task: each task loads the workbook once for its whole batch
+    per_task = max(settings.SHEETS_PER_TASK, 1)
+    header = group(
+        task_extract_sheets.s(uploaded_file_id, sheet_names[i:i + per_task], previous_id)
+        for i in range(0, len(sheet_names), per_task)
+    )
+    callback = task_finalize_extraction.s(uploaded_file_id).on_error(
+        task_extraction_failed.s(uploaded_file_id)
+    )
+    chord(header)(callback)
+    return {"uploaded_file_id": str(uploaded_file_id), "sheets": len(sheet_names)}
+
+
+# -------------------------------
+# 🔹 Reuse: identical upload already extracted
+# -------------------------------
+def find_reusable_upload(uploaded):
+    """Latest extracted upload with the same bytes, from the same company or (without one) the same uploader."""
+    if not uploaded.content_hash:
+        return None
+    matches = UploadedFile.objects.filter(content_hash=uploaded.content_hash, status="done").exclude(file_id=uploaded.file_id)
+    if uploaded.company_id:
+        matches = matches.filter(company_id=uploaded.company_id)
+    elif uploaded.uploaded_by_id:
+        matches = matches.filter(company__isnull=True, uploaded_by_id=uploaded.uploaded_by_id)
+    else:
+        return None
+    return matches.order_by("-uploaded_at").first()
+
+
+def reuse_previous_extraction(previous, uploaded):
+    units = clone_sheet_units(previous.sheets.all().order_by("sheet_name", "table_index"), uploaded)
+    previous_meta = previous.metadata or {}
+    uploaded.metadata = {
+        **(uploaded.metadata or {}),
+        **{k: previous_meta[k] for k in ("sheet_count", "sheet_timings", "table_count", "slowest_sheet",
+                                         "sheet_fingerprints") if k in previous_meta},
+        "reused_from": str(previous.file_id),
+    }
+    uploaded.reused_from = previous
+    uploaded.save(update_fields=["metadata", "reused_from"])
+    report_progress(uploaded, "done", 100, status="done", sheets_done=previous.sheets_done)
+    AuditLog.objects.create(
+        sheet_unit=None,
+        action="workbook_reused",
+        details={"uploaded_file_id": str(uploaded.file_id), "source": str(previous.file_id), "units": len(units)},
+    )
+    return {"uploaded_file_id": str(uploaded.file_id), "reused_from": str(previous.file_id)}
+
+
+def find_previous_version(uploaded):
+    """Latest extracted upload of the same company, or of the same file name by the same uploader."""
+    versions = UploadedFile.objects.filter(status="done").exclude(file_id=uploaded.file_id)
+    if uploaded.company_id:
+        versions = versions.filter(company_id=uploaded.company_id)
+    elif uploaded.uploaded_by_id:
+        versions = versions.filter(company__isnull=True, uploaded_by_id=uploaded.uploaded_by_id,
+                                   filename=uploaded.filename)
+    else:
+        return None
+    return versions.only("file_id", "metadata").order_by("-uploaded_at").first()
+
+
+def unchanged_sheet_units(previous_file_id, sheet_name, fingerprint):
+    """SheetUnits of the previous version of this sheet, or None if the sheet changed."""
+    if not previous_file_id:
+        return None
+    previous = UploadedFile.objects.filter(file_id=previous_file_id).only("metadata").first()
+    fingerprints = ((previous.metadata or {}).get("sheet_fingerprints") or {}) if previous else {}
+    if fingerprints.get(sheet_name) != fingerprint:
+        return None
+    return list(
+        SheetUnit.objects.filter(uploaded_file_id=previous_file_id, sheet_name=sheet_name).order_by("table_index")
+    )
+
+
+# -------------------------------
+# 🔹 Per-sheet Extraction
+# -------------------------------
+@shared_task
+def task_extract_sheets(uploaded_file_id, sheet_names, previous_file_id=None):
+    """Extract a batch of sheets from one load of the workbook (read-only mode streams one sheet at a time)."""
+    uploaded = UploadedFile.objects.get(file_id=uploaded_file_id)
+    with WorkbookSource(uploaded.s3_path) as source:
+        return [extract_sheet(source, uploaded, name, previous_file_id) for name in sheet_names]
+
+
+@shared_task
+def task_extract_sheet(uploaded_file_id, sheet_name, previous_file_id=None):
+    """Single-sheet form, kept for messages queued before sheets were batched."""
+    return task_extract_sheets(uploaded_file_id, [sheet_name], previous_file_id)
+
+
+def extract_sheet(source, uploaded, sheet_name, previous_file_id=None):
+    started = time.perf_counter()
+    uploaded_file_id = uploaded.file_id
+
+    df = source.sheet_frame(sheet_name)
+    chart_count = source.chart_count(sheet_name)
+    images = list(source.iter_images(sheet_name)) if source.has_drawings(sheet_name) else []
+    fingerprint = sheet_fingerprint(df, chart_count, images)
+
+    # Unchanged since the previous version: clone its units, skip detection/OCR/classification
+    previous_units = unchanged_sheet_units(previous_file_id, sheet_name, fingerprint)
+    if previous_units is not None:
+        clone_sheet_units(previous_units, uploaded)
+        UploadedFile.objects.filter(file_id=uploaded_file_id).update(sheets_done=F("sheets_done") + 1)
+        return {
+            "sheet_name": sheet_name,
+            "tables": len(previous_units),
+            "seconds": round(time.perf_counter() - started, 3),
+            "fingerprint": fingerprint,
+            "reused": True,
+        }
+
+    detected_tables = detect_tables_2d(df)
+    batch = SheetUnitBatch()
+
+    # Metadata: charts + OCR, once per sheet (shared by every table on it)
+    charts_info, ocr_results = {sheet_name: chart_count}, {}
+    if detected_tables and images:
+        extracted_texts = OCRResultCache().ocr_images(images)
+        if extracted_texts:
+            ocr_results[sheet_name] = extracted_texts
+
+    for idx, table in enumerate(detected_tables, start=1):
+        row_count, col_count = table["row_count"], table["col_count"]
+
+        # Save raw_table inline or spill it to Parquet
+        if row_count <= MAX_INLINE_ROWS:
+            raw_table = table["raw_table"]
+        else:
+            raw_table = spill_raw_table(uploaded.file_id, table["raw_table"], leading_rows=header_end(table))
+
+        metadata = {
+            "charts": charts_info,
+            "ocr_from_images": ocr_results,
+            "pre_header_context": table["pre_header_context"],
+            "table_count": len(detected_tables)
+        }
+
+        # Queue for the per-sheet bulk write
+        batch.add(
+            SheetUnit(
                 uploaded_file=uploaded,
                 sheet_name=sheet_name,
                 row_count=row_count,
@@ -232,33 +241,83 @@ def task_extract_workbook(uploaded_file_id):
                 bounding_box=table["bounding_box"],
                 table_index=idx,
                 metadata=metadata
-            )
-            AuditLog.objects.create(
-                sheet_unit=sheet_unit,
-                action="sheet_extracted",
-                details={
-                    "rows": row_count,
-                    "cols": col_count,
-                    "charts": charts_info.get(sheet_name, 0),
-                    "header_detected": table["header_rows"][:2],
-                    "pre_header_count": len(table["pre_header_context"]),
-                    "table_index": idx,
-                    "table_count": len(detected_tables)
-                }
-            )
-
-            # Representative rows for classification
-            representative_rows = get_representative_rows(table["raw_table"], count=2)
-            # print(f"\n=== Processing sheet: {sheet_name}, Table {idx}/{len(detected_tables)} ===")
-            # print(f"headers_row : {table['header_rows']}")
-            # print(f"sample_rows : {table['sample_rows']}")
-            # print(f"raw_table : {table['raw_table']}")
-            # print(f"pre_header_context : {table['pre_header_context']}")
-            # print(f"bounding_box : {table['bounding_box']}")
-            # print(f"representative rows: {representative_rows}")
-            # print(f"charts : {charts_info.get(sheet_name, 0)}")
-            classifier = SheetClassifier()
-            classifier.classify(sheet_unit.id)
-
-
-    # return ""
+            ),
+            details={
+                "rows": row_count,
+                "cols": col_count,
+                "charts": charts_info.get(sheet_name, 0),
+                "header_detected": table["header_rows"][:2],
+                "pre_header_count": len(table["pre_header_context"]),
+                "table_index": idx,
+                "table_count": len(detected_tables)
+            }
+        )
+
+    # One transaction for all units + audit rows of this sheet (classified at fan-in)
+    batch.flush()
+
+    UploadedFile.objects.filter(file_id=uploaded_file_id).update(sheets_done=F("sheets_done") + 1)
+    return {
+        "sheet_name": sheet_name,
+        "tables": len(detected_tables),
+        "seconds": round(time.perf_counter() - started, 3),
+        "fingerprint": fingerprint,
+        "reused": False,
+    }
+
+
+# -------------------------------
+# 🔹 Fan-in: mark upload complete
+# -------------------------------
+@shared_task
+def task_finalize_extraction(batch_results, uploaded_file_id):
+    uploaded = UploadedFile.objects.get(file_id=uploaded_file_id)
+    # One list of sheet results per batch task (a bare dict from the single-sheet task)
+    sheet_results = [r for batch in batch_results for r in (batch if isinstance(batch, list) else [batch])]
+    timings = {r["sheet_name"]: r["seconds"] for r in sheet_results}
+
+    # Every new unit of the upload in one batch (cloned units keep their labels)
+    report_progress(uploaded, "classifying", 95)
+    classified = SheetClassifier().classify_upload(uploaded_file_id, only_unlabelled=True)
+
+    uploaded.metadata = {
+        **(uploaded.metadata or {}),
+        "sheet_timings": timings,
+        "table_count": sum(r["tables"] for r in sheet_results),
+        "slowest_sheet": max(timings, key=timings.get) if timings else None,
+        "sheet_fingerprints": {r["sheet_name"]: r.get("fingerprint") for r in sheet_results},
+        "sheets_reused": [r["sheet_name"] for r in sheet_results if r.get("reused")],
+        "classification_counts": classified["labels"],
+        # Known-layout reuse: share of new sheets labelled straight from a template
+        "template_hits": classified["template_hits"],
+        "template_hit_rate": round(classified["template_hits"] / classified["sheets"], 3) if classified["sheets"] else None,
+    }
+    uploaded.save(update_fields=["metadata"])
+
+    # Schema mapping continues per sheet in the background (LLM chunks on the llm_mapping queue);
+    # cloned units that came with their mapped output are not mapped again
+    sheet_ids = (SheetUnit.objects
+                 .filter(uploaded_file_id=uploaded_file_id, structured__isnull=True, annexure__isnull=True)
+                 .values_list("id", flat=True))
+    group(task_process_sheet.s(str(sheet_id)) for sheet_id in sheet_ids).apply_async()
+    report_progress(uploaded, "done", 100, status="done")
+    AuditLog.objects.create(
+        sheet_unit=None,
+        action="workbook_extracted",
+        details={
+            "uploaded_file_id": str(uploaded_file_id),
+            "sheets": len(sheet_results),
+            "template_hit_rate": uploaded.metadata["template_hit_rate"],
+        },
+    )
+    return {"uploaded_file_id": str(uploaded_file_id), "sheet_timings": timings}
+
+
+@shared_task
+def task_extraction_failed(request, exc, traceback, uploaded_file_id):
+    UploadedFile.objects.filter(file_id=uploaded_file_id).update(status="failed", stage="failed")
+    AuditLog.objects.create(
+        sheet_unit=None,
+        action="extract_error",
+        details={"uploaded_file_id": str(uploaded_file_id), "error": str(exc)},
+    )
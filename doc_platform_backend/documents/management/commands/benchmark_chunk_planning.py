@@ -0,0 +1,68 @@
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from documents.chunker.planner import plan_chunks
+from documents.chunker.tasks import CHUNK_ROWS, OVERLAP
+from documents.extractor.raw_tables import RawTableReader, spill_raw_table
+
+
+class Command(BaseCommand):
+    help = "Time chunk planning and windowed reads for a large synthetic sheet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--cols", type=int, default=6)
+        parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+        parser.add_argument("--overlap", type=int, default=OVERLAP)
+        parser.add_argument("--sample-every", type=int, default=100,
+                            help="Read every Nth planned window back from the Parquet spill.")
+        parser.add_argument("--skip-spill", action="store_true", help="Only time the plan.")
+
+    def handle(self, *args, **options):
+        rows, chunk_rows, overlap = options["rows"], options["chunk_rows"], options["overlap"]
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        chunks = 0
+        for chunk in plan_chunks(rows, chunk_rows, overlap):
+            chunks += 1
+            last = chunk
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(f"plan: {rows} rows -> {chunks} chunks in {elapsed * 1000:.1f} ms, peak {peak} B traced")
+        if chunks and last["end"] != rows:
+            self.stderr.write(f"last window ends at {last['end']}, expected {rows}")
+
+        if options["skip_spill"] or not rows:
+            return
+
+        # Spill to a throwaway media root so nothing lands in real storage
+        media = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media):
+                table = [[f"item {r}"] + [r * c for c in range(1, options["cols"])] for r in range(rows)]
+                started = time.perf_counter()
+                pointer = spill_raw_table("benchmark", table)
+                self.stdout.write(f"spill: {rows} rows in {time.perf_counter() - started:.2f} s")
+                del table
+
+                windows = list(plan_chunks(rows, chunk_rows, overlap))[::options["sample_every"]]
+                tracemalloc.start()
+                started = time.perf_counter()
+                with RawTableReader(pointer) as reader:
+                    read = sum(len(reader.read_rows(w["start"], w["end"])) for w in windows)
+                elapsed = time.perf_counter() - started
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.stdout.write(
+                    f"read: {len(windows)} windows ({read} rows) in {elapsed:.2f} s, "
+                    f"{elapsed * 1000 / max(len(windows), 1):.1f} ms/window, peak {peak / 1e6:.1f} MB"
+                )
+        finally:
+            shutil.rmtree(media, ignore_errors=True)
@@ -0,0 +1,65 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from common.utils.document_processor import FileTextExtractor
+from common.utils.text_encoder import DEFAULT_ENCODER
+from documents.utils.financial_type_classifier import FinancialDocClassifier, calibrate
+
+
+class Command(BaseCommand):
+    help = "Fit the document type classifier's logit scale and threshold on labelled documents."
+
+    def add_arguments(self, parser):
+        parser.add_argument("examples",
+                            help='JSONL, one {"label": ..., "text": ...} or {"label": ..., "path": ...} per line. '
+                                 "Labels outside the category list mark documents of no listed type.")
+        parser.add_argument("--target-precision", type=float, default=0.9,
+                            help="Precision required of predictions above the threshold.")
+        parser.add_argument("--dry-run", action="store_true", help="Report the fit without writing it.")
+
+    def handle(self, *args, **options):
+        classifier = FinancialDocClassifier()
+        extractor = FileTextExtractor()
+        similarities, labels = [], []
+        with open(options["examples"], encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                example = json.loads(line)
+                text = example.get("text")
+                if text is None:
+                    with open(example["path"], "rb") as doc:
+                        text, file_type = extractor.extract(example["path"], doc.read())
+                    if file_type == "unknown":
+                        raise CommandError(f"line {line_no}: unsupported file type {example['path']}")
+                if not text.strip():
+                    continue
+                similarities.append(classifier.similarities(text))
+                label = example["label"]
+                labels.append(classifier.categories.index(label) if label in classifier.categories else None)
+
+        try:
+            fitted = calibrate(similarities, labels, target_precision=options["target_precision"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            f"{fitted['examples']} documents: logit scale {fitted['logit_scale']}, threshold {fitted['threshold']} "
+            f"(precision {fitted['precision']}, coverage {fitted['coverage']}, nll {fitted['nll']})"
+        )
+        if options["dry_run"]:
+            return
+
+        path = settings.DOC_TYPE_CALIBRATION_FILE
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({
+                **fitted,
+                "model": getattr(settings, "TEXT_ENCODER_MODEL", DEFAULT_ENCODER),
+                "target_precision": options["target_precision"],
+                "calibrated_at": timezone.now().isoformat(),
+            }, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {path}"))
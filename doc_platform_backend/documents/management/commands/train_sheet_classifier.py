@@ -0,0 +1,78 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+
+from documents.models import SheetUnit
+from documents.classifier.tasks import MLClassifier
+from documents.classifier.model_store import save_artifact
+
+
+class Command(BaseCommand):
+    help = "Fit the ML sheet classifier on labelled SheetUnits and save the artifact."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-confidence", type=float, default=0.8,
+                            help="Only train on non-manual labels at least this confident.")
+        parser.add_argument("--sources", default="mlclassifier",
+                            help="Comma-separated non-manual label sources to train on besides analyst labels "
+                                 "(rule labels are keyword matches, so training on them only relearns the rules).")
+        parser.add_argument("--pseudo-weight", type=float, default=0.3,
+                            help="Sample weight of non-manual labels; analyst labels weigh 1.0.")
+        parser.add_argument("--holdout", type=float, default=0.2,
+                            help="Fraction of sheets held out to report accuracy (0 to skip).")
+
+    def handle(self, *args, **options):
+        sources = [s.strip() for s in options["sources"].split(",") if s.strip() and s.strip() != "manual"]
+        sheets = list(
+            SheetUnit.objects
+            .exclude(classification__isnull=True)
+            .exclude(classification="unknown")
+            .filter(Q(classification_source="manual") | Q(
+                classification_source__in=sources, classification_confidence__gte=options["min_confidence"],
+            ))
+            .only("sheet_name", "header_rows", "sample_rows", "metadata",
+                  "row_count", "col_count", "classification", "classification_source")
+        )
+        counts = Counter(s.classification for s in sheets)
+        if len(counts) < 2:
+            raise CommandError(f"Need at least two labelled classes, found {dict(counts)}")
+        by_source = dict(Counter(s.classification_source for s in sheets))
+        self.stdout.write(f"Training on {len(sheets)} sheets: {dict(counts)}, by source {by_source}")
+
+        def weights(batch):
+            return [1.0 if s.classification_source == "manual" else options["pseudo_weight"] for s in batch]
+
+        accuracy = None
+        if options["holdout"] > 0 and min(counts.values()) >= 2:
+            train, test = train_test_split(
+                sheets, test_size=options["holdout"], random_state=42,
+                stratify=[s.classification for s in sheets],
+            )
+            clf = MLClassifier(artifact={})
+            clf.train(train, sample_weight=weights(train))
+            # Scored against analyst labels only: model-made labels would grade the model against itself
+            test = [s for s in test if s.classification_source == "manual"]
+            if test:
+                predicted = [label for label, _ in clf.classify_many(test)]
+                accuracy = accuracy_score([s.classification for s in test], predicted)
+                self.stdout.write(f"Holdout accuracy: {accuracy:.3f} on {len(test)} manually labelled sheets")
+            else:
+                self.stdout.write("No manually labelled sheets in the holdout; accuracy not reported")
+
+        # Final model uses every labelled sheet
+        clf = MLClassifier(artifact={})
+        clf.train(sheets, sample_weight=weights(sheets))
+        path = save_artifact(clf.artifact(
+            kind="batch",
+            trained_at=timezone.now().isoformat(),
+            samples=len(sheets),
+            sources=by_source,
+            pseudo_weight=options["pseudo_weight"],
+            classes=sorted(counts),
+            holdout_accuracy=accuracy,
+        ))
+        self.stdout.write(self.style.SUCCESS(f"Published sheet classifier {path}"))
@@ -0,0 +1,80 @@
+# mapper/llm.py
+import json
+import re
+
+from django.conf import settings
+
+from common.ai.openrouter_client import openrouter_chat
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+class MappingError(ValueError):
+    """The LLM reply could not be used as a chunk mapping (retried by the chunk task)."""
+
+
+def build_prompt(schema_type: str, schema: dict, labels: list[str], rows: list[list], first_row: int) -> str:
+    fields = "\n".join(f"- {name}: {desc}" for name, desc in schema.items())
+    columns = "\n".join(f"{i}: {label}" for i, label in enumerate(labels))
+    body = "\n".join(
+        f"{first_row + i} | " + " | ".join("" if v is None else str(v) for v in row)
+        for i, row in enumerate(rows)
+    )
+    return f"""Map rows of a {schema_type} sheet to this schema.
+
+Fields (a field ending in "." takes several columns and is keyed by the column header):
+{fields}
+
+Columns:
+{columns}
+
+Rows (row number | cells):
+{body}
+
+Reply with JSON only:
+{{"column_mapping": {{"<column index>": "<field>"}},
+ "records": [{{"_row": <row number>, "<field>": <value>, ...}}]}}
+Emit one record per data row, keep the given row numbers, skip blank and header rows,
+and copy numbers as they appear. Do not invent values."""
+
+
+def parse_reply(reply: str, schema: dict, start: int, end: int) -> dict:
+    """Validate the reply; only records for rows [start, end) and known fields are kept."""
+    try:
+        data = json.loads(_FENCE.sub("", reply.strip()))
+    except json.JSONDecodeError as e:
+        raise MappingError(f"Reply is not JSON: {e}") from e
+    if not isinstance(data, dict) or not isinstance(data.get("records"), list):
+        raise MappingError("Reply has no records list")
+
+    known = set(schema)
+    allowed = {field.rstrip(".") for field in known}
+    mapping = {
+        str(col): field for col, field in (data.get("column_mapping") or {}).items()
+        if str(col).isdigit() and field in known
+    }
+    records = []
+    for record in data["records"]:
+        if not isinstance(record, dict):
+            continue
+        try:
+            row_no = int(record.get("_row"))
+        except (TypeError, ValueError):
+            continue
+        if start <= row_no < end:
+            fields = {k: v for k, v in record.items() if k in allowed}
+            records.append({"_row": row_no, **fields})
+    return {"column_mapping": mapping, "records": records}
+
+
+def schema_map_rows(schema_type: str, schema: dict, labels: list[str], rows: list[list], first_row: int) -> dict:
+    """One LLM call for a row window -> {"column_mapping", "records"}."""
+    reply = openrouter_chat(
+        [
+            {"role": "system", "content": "You convert spreadsheet rows into structured JSON. Reply with JSON only."},
+            {"role": "user", "content": build_prompt(schema_type, schema, labels, rows, first_row)},
+        ],
+        model=settings.MAPPER_LLM_MODEL,
+        temperature=0,
+    )
+    return parse_reply(reply, schema, first_row, first_row + len(rows))
@@ -0,0 +1,45 @@
+# mapper/merge.py
+import json
+from collections import Counter
+
+
+def merge_chunks(chunks: list[dict]) -> tuple[list[dict], list[dict]]:
+    """
+    Combine chunk outputs into one record list, independent of completion order.
+
+    Chunks are taken by chunk_index; a chunk owns its rows from the end of the
+    previous chunk onwards, so records for overlap rows come from the earlier
+    chunk only. Within a chunk the first record per row wins. Returns
+    (records sorted by row, per-chunk provenance).
+    """
+    records, provenance = [], []
+    previous_end = 0
+    for chunk in sorted(chunks, key=lambda c: c["chunk_index"]):
+        owned_start = max(chunk["start_row"], previous_end)
+        seen = set()
+        kept = 0
+        for record in chunk["records"] or []:
+            row_no = record["_row"]
+            if owned_start <= row_no < chunk["end_row"] and row_no not in seen:
+                seen.add(row_no)
+                records.append(record)
+                kept += 1
+        provenance.append({
+            "chunk_index": chunk["chunk_index"],
+            "rows": [chunk["start_row"], chunk["end_row"]],
+            "owned": [owned_start, chunk["end_row"]],
+            "records": kept,
+        })
+        previous_end = chunk["end_row"]
+    records.sort(key=lambda r: r["_row"])
+    return records, provenance
+
+
+def consensus_mapping(chunks: list[dict]) -> tuple[dict, float]:
+    """Most common non-empty column mapping across chunks and the share of chunks that agree on it."""
+    keyed = [json.dumps(c["column_mapping"], sort_keys=True) for c in chunks if c["column_mapping"]]
+    if not keyed:
+        return {}, 0.0
+    # Counter keeps first-seen order on ties, and chunks arrive sorted -> deterministic
+    best, votes = Counter(keyed).most_common(1)[0]
+    return json.loads(best), votes / len(chunks)
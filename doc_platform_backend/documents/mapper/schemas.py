@@ -0,0 +1,57 @@
+# mapper/schemas.py
+
+# Per-row record fields for each sheet classification. A field ending in "."
+# collects several columns into a dict keyed by the column header
+# (e.g. "values." -> {"FY23": ..., "FY24": ...}) for period-wide statements.
+SCHEMAS = {
+    "cap_table": {
+        "shareholder": "Name of the shareholder / holder",
+        "share_class": "Class or series of the security",
+        "shares": "Number of shares held",
+        "options": "Options / warrants held",
+        "ownership_pct": "Ownership percentage (fully diluted if given)",
+    },
+    "balance_sheet": {
+        "line_item": "Line item label",
+        "section": "assets / liabilities / equity",
+        "values.": "Amount per period column, keyed by the period header",
+    },
+    "pnl": {
+        "line_item": "Line item label",
+        "section": "revenue / cost / operating expense / other / net income",
+        "values.": "Amount per period column, keyed by the period header",
+    },
+    "cash_flow": {
+        "line_item": "Line item label",
+        "section": "operating / investing / financing",
+        "values.": "Amount per period column, keyed by the period header",
+    },
+}
+
+
+def schema_for(classification: str | None) -> dict | None:
+    return SCHEMAS.get(classification or "")
+
+
+def header_labels(header_rows: list[list] | None, col_count: int) -> list[str]:
+    """One label per column: the header cells of that column joined top to bottom."""
+    labels = []
+    for col in range(col_count):
+        parts = [str(row[col]).strip() for row in (header_rows or []) if col < len(row) and str(row[col] or "").strip()]
+        labels.append(" ".join(parts) or f"col_{col}")
+    return labels
+
+
+def apply_column_mapping(row: list, row_no: int, mapping: dict, labels: list[str]) -> dict | None:
+    """Map one raw row with a {"<col>": "<field>"} mapping; None for rows with no mapped value."""
+    record = {}
+    for col, field in mapping.items():
+        col = int(col)
+        value = row[col] if col < len(row) else None
+        if value in (None, ""):
+            continue
+        if field.endswith("."):
+            record.setdefault(field[:-1], {})[labels[col] if col < len(labels) else f"col_{col}"] = value
+        else:
+            record[field] = value
+    return {"_row": row_no, **record} if record else None
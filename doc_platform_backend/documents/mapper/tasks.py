@@ -1,16 +1,158 @@
 # mapper/tasks.py
-# from celery import shared_task
-from ..models import StructuredDocument, Annexure, AuditLog, SheetUnit
-import json
-
-# @shared_task
-def task_process_chunk(chunk_payload):
-    # chunk_payload: dict with header, rows, metadata
-    # Build prompt to call LLM (include schema definition, chunk index)
-    # Call LLM to map rows -> JSON chunk
-    # Save chunk output to temporary storage (Redis or DB table). For brevity, write to AuditLog
-    AuditLog.objects.create(sheet_unit_id=chunk_payload["sheet_id"],
-                            action="chunk_mapped",
-                            details={"chunk_index": chunk_payload["chunk_index"], "mapped_len": len(chunk_payload["rows"])})
-    # After mapping all chunks, a separate orchestrator should call merge_chunks
-    return {"status":"ok"}
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from ..models import StructuredDocument, Annexure, AuditLog, SheetUnit, MappedChunk, SheetTemplate
+from ..extractor.raw_tables import RawTableReader
+from .schemas import schema_for, header_labels, apply_column_mapping
+from .llm import schema_map_rows
+from .merge import merge_chunks, consensus_mapping
+from ..classifier.templates import same_layout
+
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 10  # seconds, doubled per retry
+
+
+# ------------------------------------------------
+# 🔹 Persistence
+# ------------------------------------------------
+def persist_mapped_result(sheet: SheetUnit, records: list[dict], provenance: dict) -> StructuredDocument:
+    doc, _ = StructuredDocument.objects.update_or_create(
+        sheet_unit=sheet,
+        defaults={
+            "schema_type": sheet.classification,
+            "json_data": {"schema_type": sheet.classification, "records": records},
+            "provenance": provenance,
+        },
+    )
+    AuditLog.objects.create(sheet_unit=sheet, action="sheet_mapped",
+                            details={"records": len(records), "source": provenance.get("source")})
+    return doc
+
+
+def persist_annexure(sheet: SheetUnit, reason: str) -> Annexure:
+    """Sheets without a target schema are kept as-is (the raw table may be a storage pointer)."""
+    with transaction.atomic():
+        Annexure.objects.filter(sheet_unit=sheet).delete()
+        annexure = Annexure.objects.create(
+            sheet_unit=sheet,
+            json_data={"sheet_name": sheet.sheet_name, "header_rows": sheet.header_rows, "raw_table": sheet.raw_table},
+            reason=reason,
+        )
+    AuditLog.objects.create(sheet_unit=sheet, action="sheet_annexed", details={"reason": reason})
+    return annexure
+
+
+def _provenance(sheet: SheetUnit, source: str, **extra) -> dict:
+    return {
+        "uploaded_file_id": str(sheet.uploaded_file_id),
+        "sheet_name": sheet.sheet_name,
+        "table_index": sheet.table_index,
+        "bounding_box": sheet.bounding_box,
+        "source": source,
+        **extra,
+    }
+
+
+def _row_key(row) -> tuple:
+    return tuple("" if v is None else str(v).strip() for v in row)
+
+
+# ------------------------------------------------
+# 🔹 Known layout: apply the template's column mapping (no LLM)
+# ------------------------------------------------
+def map_with_template(sheet: SheetUnit, template: SheetTemplate) -> StructuredDocument:
+    labels = header_labels(sheet.header_rows, sheet.col_count)
+    # Header and title rows are part of raw_table; they are not records
+    skip = {_row_key(row) for row in (sheet.header_rows or []) + (sheet.metadata or {}).get("pre_header_context", [])}
+    records = []
+    with RawTableReader.for_sheet(sheet) as reader:
+        for row_no, row in enumerate(reader.iter_rows()):
+            if _row_key(row) in skip:
+                continue
+            record = apply_column_mapping(row, row_no, template.schema_mapping, labels)
+            if record:
+                records.append(record)
+    return persist_mapped_result(sheet, records, _provenance(sheet, "template", template_id=str(template.id)))
+
+
+# ------------------------------------------------
+# 🔹 Per-chunk LLM mapping (resumable, retried with backoff)
+# ------------------------------------------------
+@shared_task(bind=True, max_retries=MAX_ATTEMPTS - 1, rate_limit=settings.MAPPER_RATE_LIMIT)
+def task_process_chunk(self, chunk_payload):
+    # chunk_payload: {"sheet_id", "chunk_index"}; the window itself lives on the MappedChunk row
+    chunk = MappedChunk.objects.select_related("sheet_unit").get(
+        sheet_unit_id=chunk_payload["sheet_id"], chunk_index=chunk_payload["chunk_index"],
+    )
+    if chunk.status == "done":
+        return {**chunk_payload, "status": "done", "skipped": True}
+
+    sheet = chunk.sheet_unit
+    with RawTableReader.for_sheet(sheet) as reader:
+        rows = reader.read_rows(chunk.start_row, chunk.end_row)
+    MappedChunk.objects.filter(pk=chunk.pk).update(attempts=F("attempts") + 1)
+
+    try:
+        result = schema_map_rows(
+            sheet.classification, schema_for(sheet.classification),
+            header_labels(sheet.header_rows, sheet.col_count), rows, chunk.start_row,
+        )
+    except Exception as exc:
+        # MappingError / RequestException are the usual causes, but a reply without choices
+        # (KeyError) or a missing API key (RuntimeError) must not leave the chunk pending either
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=exc, countdown=RETRY_BACKOFF * 2 ** self.request.retries)
+        # Give up on this chunk only; the merge reports it and a re-run maps just the failed chunks
+        MappedChunk.objects.filter(pk=chunk.pk).update(status="failed", error=str(exc))
+        return {**chunk_payload, "status": "failed"}
+
+    MappedChunk.objects.filter(pk=chunk.pk).update(
+        status="done", records=result["records"], column_mapping=result["column_mapping"], error=None,
+    )
+    return {**chunk_payload, "status": "done", "records": len(result["records"])}
+
+
+# ------------------------------------------------
+# 🔹 Fan-in: deterministic merge into StructuredDocument
+# ------------------------------------------------
+def record_incomplete_mapping(sheet, chunks, unfinished, **details):
+    AuditLog.objects.create(sheet_unit=sheet, action="mapping_incomplete",
+                            details={"chunks": chunks, "unfinished": unfinished, **details})
+
+
+@shared_task
+def task_merge_chunks(chunk_results, sheet_id):
+    """Merge stored chunk outputs (not the chord results), so resumed runs see every chunk."""
+    sheet = SheetUnit.objects.select_related("template").get(id=sheet_id)
+    chunks = list(
+        MappedChunk.objects.filter(sheet_unit=sheet).order_by("chunk_index")
+        .values("chunk_index", "start_row", "end_row", "status", "records", "column_mapping")
+    )
+    unfinished = [c["chunk_index"] for c in chunks if c["status"] != "done"]
+    if unfinished:
+        record_incomplete_mapping(sheet, len(chunks), unfinished)
+        return {"sheet_id": sheet_id, "status": "incomplete", "unfinished": unfinished}
+
+    records, chunk_provenance = merge_chunks(chunks)
+    mapping, agreement = consensus_mapping(chunks)
+    persist_mapped_result(sheet, records, _provenance(
+        sheet, "llm", chunks=chunk_provenance, column_mapping=mapping, mapping_agreement=agreement,
+    ))
+
+    # Every chunk agreed on the columns: later sheets with exactly this layout skip the LLM
+    template = sheet.template
+    if template and not template.schema_mapping and mapping and agreement == 1.0 and same_layout(sheet, template):
+        SheetTemplate.objects.filter(id=template.id, schema_mapping__isnull=True).update(schema_mapping=mapping)
+    return {"sheet_id": sheet_id, "status": "done", "records": len(records)}
+
+
+@shared_task
+def task_mapping_failed(request, exc, traceback, sheet_id):
+    """Chord errback: a chunk task crashed, so the merge never runs; fail what is left and report it."""
+    chunks = MappedChunk.objects.filter(sheet_unit_id=sheet_id)
+    chunks.filter(status="pending").update(status="failed", error=str(exc))
+    unfinished = list(chunks.exclude(status="done").order_by("chunk_index").values_list("chunk_index", flat=True))
+    record_incomplete_mapping(SheetUnit.objects.get(id=sheet_id), chunks.count(), unfinished, error=str(exc))
@@ -8,11 +8,42 @@ from django.db import models
 
 
 class UploadedFile(models.Model):
+    STATUS_CHOICES = [
+        ("uploaded", "Uploaded"),
+        ("processing", "Processing"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
     file_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     filename = models.CharField(max_length=512)
     s3_path = models.FileField(upload_to="UploadedFile/",null=True,blank=True)   # or use Django Storage's FileField
     uploaded_at = models.DateTimeField(auto_now_add=True)
     metadata = models.JSONField(null=True, blank=True)
+    status = models.CharField(max_length=50, choices=STATUS_CHOICES, default="uploaded")
+    stage = models.CharField(max_length=50, null=True, blank=True)  # current pipeline step
+    progress = models.PositiveSmallIntegerField(default=0)  # percent complete
+    stage_updated_at = models.DateTimeField(null=True, blank=True)
+    sheets_done = models.PositiveIntegerField(default=0)
+    job_id = models.CharField(max_length=255, null=True, blank=True)  # celery task id
+    content_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)  # sha256 of the upload
+    reused_from = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, blank=True, related_name="reuses")
+    company = models.ForeignKey("common.Company", on_delete=models.SET_NULL, null=True, blank=True, related_name="workbook_uploads")
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="workbook_uploads")
+
+class SheetTemplate(models.Model):
+    """A recurring sheet layout (same normalized name/headers/width) and what we learned about it."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    signature = models.CharField(max_length=64, unique=True)  # sha256 of normalized name + headers + width
+    sheet_name = models.CharField(max_length=255)              # normalized
+    header_tokens = models.JSONField(default=list)             # normalized header cells, in order
+    minhash = models.JSONField(default=list)                   # MinHash of header/name tokens, for near matches
+    col_count = models.IntegerField()
+    classification = models.CharField(max_length=128)
+    classification_source = models.CharField(max_length=64, null=True, blank=True)
+    schema_mapping = models.JSONField(null=True, blank=True)   # column -> schema field, filled by the mapper
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_matched_at = models.DateTimeField(null=True, blank=True)
 
 class SheetUnit(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -29,6 +60,9 @@ class SheetUnit(models.Model):
     table_index=models.IntegerField(null=True,blank=True)
     classification = models.CharField(max_length=128, null=True)
     classification_confidence = models.FloatField(null=True)
+    classification_source = models.CharField(max_length=64, null=True, blank=True)  # rulebasedclassifier / mlclassifier / manual
+    classified_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    template = models.ForeignKey(SheetTemplate, on_delete=models.SET_NULL, null=True, blank=True, related_name='sheets')
     created_at = models.DateTimeField(auto_now_add=True)
 
 class StructuredDocument(models.Model):
@@ -46,6 +80,28 @@ class Annexure(models.Model):
     reason = models.TextField(null=True)  # why annexure: "unknown format" etc.
     created_at = models.DateTimeField(auto_now_add=True)
 
+class MappedChunk(models.Model):
+    """Mapper output for one row window of a sheet; done chunks are skipped when a sheet is re-mapped."""
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+    id = models.AutoField(primary_key=True)
+    sheet_unit = models.ForeignKey(SheetUnit, on_delete=models.CASCADE, related_name='mapped_chunks')
+    chunk_index = models.IntegerField()
+    start_row = models.IntegerField()
+    end_row = models.IntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    records = models.JSONField(null=True)         # [{"_row": n, <schema fields>}], rows are absolute indexes
+    column_mapping = models.JSONField(null=True)  # {"<col index>": "<schema field>"} reported by the mapper
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("sheet_unit", "chunk_index")
+
 class AuditLog(models.Model):
     id = models.AutoField(primary_key=True)
     sheet_unit = models.ForeignKey(SheetUnit, on_delete=models.SET_NULL, null=True)
@@ -1,3 +1,664 @@
-from django.test import TestCase
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from openpyxl import Workbook
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from common.utils.workbook_loader import WorkbookSource
+from documents.chunker import tasks as chunker_tasks
+from documents.chunker.planner import plan_chunks
+from documents.classifier import model_store
+from documents.classifier.online import OnlineSheetTrainer
+from documents.classifier.tasks import MLClassifier
+from documents.classifier.templates import TemplateIndex, template_signature
+from documents.extractor import tasks as extractor_tasks
+from documents.mapper import tasks as mapper_tasks
+from documents.extractor.raw_tables import RawTableReader, spill_raw_table
+from documents.extractor.table_detector import detect_tables_2d
+from common.models import User
+from documents.models import AuditLog, MappedChunk, SheetTemplate, SheetUnit, StructuredDocument, UploadedFile
+from documents.utils import financial_type_classifier as doc_types
+from documents.views import SheetUnitLabelView, UploadStatusView
+
+
+# ------------------------------------------------
+# 🔹 Reference: the per-cell DFS detector this module replaced
+# ------------------------------------------------
+def reference_detect_tables_2d(df, max_header_search=15, sample_limit=20,
+                               max_header_rows=3, min_block_size=5, gap_tolerance=1):
+    """
+    The previous implementation, verbatim except for the neighbour test: it
+    pushed every cell in the gap window (its `or` clause was always true) and
+    so flood-filled through blanks. Only non-empty neighbours are followed here.
+    """
+    row_count, col_count = df.shape
+    mask = df.map(lambda x: str(x).strip() != "")
+
+    tables = []
+    visited = np.zeros(mask.shape, dtype=bool)
+
+    def dfs(r, c, coords):
+        stack = [(r, c)]
+        while stack:
+            rr, cc = stack.pop()
+            if 0 <= rr < row_count and 0 <= cc < col_count and not visited[rr, cc]:
+                visited[rr, cc] = True
+                coords.append((rr, cc))
+                for dr in range(-gap_tolerance, gap_tolerance + 1):
+                    for dc in range(-gap_tolerance, gap_tolerance + 1):
+                        nr, nc = rr + dr, cc + dc
+                        if 0 <= nr < row_count and 0 <= nc < col_count and not visited[nr, nc]:
+                            if mask.iat[nr, nc]:
+                                stack.append((nr, nc))
+
+    for r in range(row_count):
+        for c in range(col_count):
+            if mask.iat[r, c] and not visited[r, c]:
+                coords = []
+                dfs(r, c, coords)
+                if len(coords) >= min_block_size:
+                    rows = [p[0] for p in coords]
+                    cols = [p[1] for p in coords]
+                    rmin, rmax = min(rows), max(rows)
+                    cmin, cmax = min(cols), max(cols)
+                    tables.append((rmin, rmax, cmin, cmax, df.iloc[rmin:rmax + 1, cmin:cmax + 1]))
+
+    results = []
+    for (rmin, rmax, cmin, cmax, block_df) in tables:
+        non_empty_rows = [i for i in range(block_df.shape[0]) if block_df.iloc[i].notna().any()]
+        if not non_empty_rows:
+            continue
+
+        def score_row(row_idx):
+            values = [str(v).strip() for v in block_df.iloc[row_idx].tolist()]
+            non_empty = sum(1 for v in values if v)
+            text_like = sum(1 for v in values if v.isalpha())
+            num_like = sum(1 for v in values if v.replace(".", "", 1).isdigit())
+            return non_empty + text_like - num_like
+
+        candidates = non_empty_rows[:max_header_search]
+        scores = {r: score_row(r) for r in candidates}
+        header_row_idx = max(scores, key=scores.get)
+
+        header_rows = [list(block_df.iloc[header_row_idx].tolist())]
+        for i in range(1, max_header_rows):
+            if header_row_idx + i < block_df.shape[0]:
+                next_score = score_row(header_row_idx + i)
+                if next_score >= scores[header_row_idx] * 0.6:
+                    header_rows.append(list(block_df.iloc[header_row_idx + i].tolist()))
+                else:
+                    break
+
+        pre_header_context = [list(block_df.iloc[r].tolist()) for r in non_empty_rows if r < header_row_idx]
+        last_header_row = header_row_idx + len(header_rows) - 1
+        sample_rows = [list(block_df.iloc[r].tolist()) for r in non_empty_rows if r > last_header_row][:sample_limit]
+
+        results.append({
+            "header_rows": header_rows,
+            "sample_rows": sample_rows,
+            "pre_header_context": pre_header_context,
+            "raw_table": block_df.values.tolist(),
+            "bounding_box": {"row_min": rmin, "row_max": rmax, "col_min": cmin, "col_max": cmax},
+            "row_count": block_df.shape[0],
+            "col_count": block_df.shape[1],
+        })
+    return results
+
+
+def grid(rows):
+    """DataFrame in the extractor contract: every cell a string, blanks as ""."""
+    width = max(len(r) for r in rows)
+    return pd.DataFrame([[str(v) for v in r] + [""] * (width - len(r)) for r in rows])
+
+
+class TableDetectorParityTests(SimpleTestCase):
+    def assertParity(self, df, **kwargs):
+        expected = reference_detect_tables_2d(df, **kwargs)
+        self.assertEqual(detect_tables_2d(df, **kwargs), expected)
+        return expected
+
+    def test_single_table_with_header(self):
+        tables = self.assertParity(grid([
+            ["Particulars", "FY23", "FY24"],
+            ["Revenue", "100", "120"],
+            ["EBITDA", "20", "25"],
+        ]))
+        self.assertEqual(len(tables), 1)
+        self.assertEqual(tables[0]["header_rows"][0], ["Particulars", "FY23", "FY24"])
+
+    def test_merged_cells(self):
+        # openpyxl reads a merged range as the top-left value and blanks for the rest
+        tables = self.assertParity(grid([
+            ["Balance Sheet", "", "", ""],
+            ["", "As at 31 March", "", ""],
+            ["Particulars", "2023", "2024", "Note"],
+            ["Cash", "10", "12", "4"],
+            ["", "", "", ""],
+            ["Total", "10", "12", ""],
+        ]))
+        self.assertEqual([t["bounding_box"]["row_max"] for t in tables], [3])
+
+    def test_gaps_within_and_beyond_tolerance(self):
+        df = grid([
+            ["a", "b", "c", "", "", "x", "y"],
+            ["1", "2", "3", "", "", "7", "8"],
+            ["", "", "", "", "", "9", "0"],
+            ["4", "5", "6", "", "", "", ""],
+            ["7", "8", "9", "", "", "", ""],
+        ])
+        for gap in (1, 2, 3):
+            with self.subTest(gap=gap):
+                self.assertParity(df, gap_tolerance=gap)
+        self.assertEqual(len(detect_tables_2d(df, gap_tolerance=1)), 3)
+        self.assertEqual(len(detect_tables_2d(df, gap_tolerance=2)), 2)
+        self.assertEqual(len(detect_tables_2d(df, gap_tolerance=3)), 1)
+
+    def test_single_cell_tables(self):
+        df = grid([["", "", ""], ["", "only", ""], ["", "", ""]])
+        self.assertEqual(self.assertParity(df), [])
+        tables = self.assertParity(df, min_block_size=1)
+        self.assertEqual(tables[0]["raw_table"], [["only"]])
+        self.assertEqual(tables[0]["bounding_box"], {"row_min": 1, "row_max": 1, "col_min": 1, "col_max": 1})
+
+    def test_blocks_sharing_a_top_row_keep_scan_order(self):
+        self.assertParity(grid([
+            ["", "", "", "", "t", "t", "t", "t", "t"],
+            ["a", "a", "", "", "", "", "", "", ""],
+            ["a", "a", "", "", "", "", "", "", ""],
+            ["a", "a", "", "", "", "", "", "", ""],
+        ]))
+        self.assertParity(grid([
+            ["a", "a", "", "", "t", "t", "t", "t", "t"],
+            ["a", "a", "", "", "", "", "", "", ""],
+            ["a", "a", "", "", "", "", "", "", ""],
+        ]), min_block_size=1)
+
+    def test_empty_frames(self):
+        self.assertEqual(detect_tables_2d(pd.DataFrame()), [])
+        self.assertParity(grid([["", ""], ["", ""]]))
+
+    def test_randomised_grids(self):
+        rng = random.Random(7)
+        for trial in range(150):
+            rows, cols = rng.randint(1, 25), rng.randint(1, 12)
+            density = rng.choice((0.15, 0.4, 0.7))
+            values = ["", "Revenue", "Total", "12", "3.5", " ", "FY24"]
+            df = grid([
+                [rng.choice(values[1:]) if rng.random() < density else "" for _ in range(cols)]
+                for _ in range(rows)
+            ])
+            kwargs = {"gap_tolerance": rng.randint(1, 3), "min_block_size": rng.choice((1, 3, 5))}
+            with self.subTest(trial=trial, **kwargs):
+                self.assertParity(df, **kwargs)
+
+
+# ------------------------------------------------
+# 🔹 Workbook extraction
+# ------------------------------------------------
+def workbook_bytes(sheets: dict) -> bytes:
+    """xlsx bytes for {sheet name: rows}."""
+    wb = Workbook()
+    wb.remove(wb.active)
+    for name, rows in sheets.items():
+        ws = wb.create_sheet(name)
+        for row in rows:
+            ws.append(row)
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+TABLE = [["Particulars", "FY23", "FY24"], ["Revenue", 100, 120], ["EBITDA", 20, 25]]
+
+
+class MediaRootMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._media = tempfile.mkdtemp()
+        cls._media_override = override_settings(MEDIA_ROOT=cls._media)
+        cls._media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._media_override.disable()
+        shutil.rmtree(cls._media, ignore_errors=True)
+        super().tearDownClass()
+
+    def make_upload(self, sheets: dict, **fields) -> UploadedFile:
+        uploaded = UploadedFile(filename="book.xlsx", **fields)
+        uploaded.s3_path.save("book.xlsx", ContentFile(workbook_bytes(sheets)), save=True)
+        return uploaded
+
+
+@override_settings(SHEETS_PER_TASK=3)
+class SheetBatchingTests(MediaRootMixin, TestCase):
+    def test_sheets_are_batched_and_each_batch_loads_the_workbook_once(self):
+        names = [f"S{i}" for i in range(7)]
+        uploaded = self.make_upload({name: TABLE for name in names})
+
+        loads = []
+
+        def counting_source(source):
+            loads.append(source)
+            return WorkbookSource(source)
+
+        with patch.object(extractor_tasks, "chord") as chord, \
+                patch.object(extractor_tasks, "WorkbookSource", side_effect=counting_source):
+            extractor_tasks.task_extract_workbook(str(uploaded.file_id))
+            header = chord.call_args.args[0]
+            batches = [sig.args[1] for sig in header.tasks]
+            self.assertEqual(batches, [names[0:3], names[3:6], names[6:7]])
+
+            results = [extractor_tasks.task_extract_sheets(*sig.args) for sig in header.tasks]
+
+        # One load to list the sheets, then one per batch (not one per sheet)
+        self.assertEqual(len(loads), 1 + len(batches))
+        self.assertEqual([r["sheet_name"] for batch in results for r in batch], names)
+        self.assertEqual(SheetUnit.objects.filter(uploaded_file=uploaded).count(), len(names))
+
+
+class RawTableSpillTests(MediaRootMixin, SimpleTestCase):
+    def test_types_come_from_the_data_rows_and_header_rows_stay_text(self):
+        rows = [["Statement of profit and loss", "", ""], ["Particulars", "FY23", "FY24"]]
+        rows += [[f"Item {i}", str(i), f"{i}.5"] for i in range(400)]
+        table = detect_tables_2d(grid(rows))[0]
+        self.assertEqual(extractor_tasks.header_end(table), 2)
+
+        pointer = spill_raw_table("spill", table["raw_table"], leading_rows=extractor_tasks.header_end(table))
+        self.assertEqual(pointer["schema"], {"c0": "string", "c1": "int64", "c2": "double"})
+        self.assertEqual(pointer["row_count"], 402)
+
+        with RawTableReader(pointer) as reader:
+            self.assertEqual(reader.row_count, 402)
+            self.assertEqual(reader.read_rows(0, 3), [rows[0], rows[1], ["Item 0", 0, 0.5]])
+            self.assertEqual(reader.read_rows(401), [["Item 399", 399, 399.5]])
+            handle = reader._handle
+        self.assertTrue(handle.closed)
+
+
+class IncrementalVersionTests(MediaRootMixin, TestCase):
+    def extract(self, uploaded) -> list[str]:
+        """Run the extraction chord inline; returns the sheet unit ids sent to the mapper."""
+        def fake_group(signatures):
+            return MagicMock(tasks=list(signatures))
+
+        with patch.object(extractor_tasks, "chord") as chord, \
+                patch.object(extractor_tasks, "group", side_effect=fake_group), \
+                patch.object(extractor_tasks, "task_process_sheet") as process_sheet:
+            extractor_tasks.task_extract_workbook(str(uploaded.file_id))
+            header = chord.call_args.args[0]
+            results = [extractor_tasks.task_extract_sheets(*sig.args) for sig in header.tasks]
+            extractor_tasks.task_finalize_extraction(results, str(uploaded.file_id))
+        return sorted(call.args[0] for call in process_sheet.s.call_args_list)
+
+    def map_everything(self, uploaded):
+        for unit in SheetUnit.objects.filter(uploaded_file=uploaded):
+            StructuredDocument.objects.create(sheet_unit=unit, schema_type="pnl", json_data={"records": [unit.sheet_name]})
+            MappedChunk.objects.create(sheet_unit=unit, chunk_index=0, start_row=0, end_row=3, status="done")
+
+    def test_unchanged_sheets_keep_their_mapping_and_skip_the_mapper(self):
+        owner = User.objects.create(email="analyst@example.com", name="Analyst")
+        first = self.make_upload({"P&L": TABLE, "BS": TABLE}, uploaded_by=owner)
+        self.assertEqual(len(self.extract(first)), 2)
+        self.map_everything(first)
+
+        changed = [TABLE[0], ["Revenue", 100, 130], TABLE[2]]
+        second = self.make_upload({"P&L": TABLE, "BS": changed}, uploaded_by=owner)
+        mapped = self.extract(second)
+
+        units = {u.sheet_name: u for u in SheetUnit.objects.filter(uploaded_file=second)}
+        self.assertEqual(mapped, [str(units["BS"].id)])
+        self.assertEqual(units["P&L"].structured.json_data, {"records": ["P&L"]})
+        self.assertEqual(units["P&L"].mapped_chunks.get().status, "done")
+
+    def test_previous_version_is_scoped_to_the_uploader(self):
+        first = self.make_upload({"P&L": TABLE}, uploaded_by=User.objects.create(email="a@example.com", name="A"))
+        self.extract(first)
+        other = self.make_upload({"P&L": TABLE}, uploaded_by=User.objects.create(email="b@example.com", name="B"))
+        anonymous = self.make_upload({"P&L": TABLE})
+
+        self.assertIsNone(extractor_tasks.find_previous_version(other))
+        self.assertIsNone(extractor_tasks.find_previous_version(anonymous))
+        self.assertEqual(len(self.extract(other)), 1)
+
+    def test_identical_bytes_are_only_reused_for_the_same_owner(self):
+        owner = User.objects.create(email="a@example.com", name="A")
+        first = self.make_upload({"P&L": TABLE}, uploaded_by=owner, content_hash="same")
+        self.extract(first)
+
+        stranger = self.make_upload({"P&L": TABLE}, content_hash="same",
+                                    uploaded_by=User.objects.create(email="b@example.com", name="B"))
+        self.assertIsNone(extractor_tasks.find_reusable_upload(stranger))
+        self.assertIsNone(extractor_tasks.find_reusable_upload(self.make_upload({"P&L": TABLE}, content_hash="same")))
+        again = self.make_upload({"P&L": TABLE}, uploaded_by=owner, content_hash="same")
+        self.assertEqual(extractor_tasks.find_reusable_upload(again), first)
+
+
+# ------------------------------------------------
+# 🔹 Chunk planning
+# ------------------------------------------------
+class PlanChunksTests(SimpleTestCase):
+    def test_million_row_plan_covers_every_row_and_terminates(self):
+        chunks = list(plan_chunks(1_000_000, 300, 2))
+        self.assertEqual(len(chunks), 3356)
+        self.assertEqual([c["chunk_index"] for c in chunks], list(range(len(chunks))))
+        self.assertEqual(chunks[0]["start"], 0)
+        self.assertEqual(chunks[-1]["end"], 1_000_000)
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertEqual(chunk["start"], previous["end"] - 2)
+
+    def test_edge_sizes(self):
+        self.assertEqual(list(plan_chunks(0, 300, 2)), [])
+        self.assertEqual(list(plan_chunks(300, 300, 2)), [{"chunk_index": 0, "start": 0, "end": 300}])
+        self.assertEqual([c["end"] for c in plan_chunks(301, 300, 2)], [300, 301])
+        with self.assertRaises(ValueError):
+            list(plan_chunks(10, 2, 2))
+
+
+# ------------------------------------------------
+# 🔹 Sheet templates
+# ------------------------------------------------
+class TemplateMappingTests(TestCase):
+    MAPPING = {"0": "line_item", "1": "values.", "2": "values."}
+
+    def make_sheet(self, header, **fields):
+        uploaded = UploadedFile.objects.create(filename="book.xlsx")
+        return SheetUnit.objects.create(
+            uploaded_file=uploaded, sheet_name="P&L", row_count=3, col_count=3, table_index=1,
+            header_rows=[header], raw_table=[header, ["Revenue", 100, 120], ["EBITDA", 20, 25]],
+            classification="pnl", classification_confidence=0.9, classification_source="mlclassifier", **fields,
+        )
+
+    def learned_template(self, header):
+        sheet = self.make_sheet(header)
+        template = TemplateIndex().learn([sheet])[template_signature(sheet)]
+        SheetTemplate.objects.filter(id=template.id).update(schema_mapping=self.MAPPING)
+        return SheetTemplate.objects.get(id=template.id)
+
+    def process(self, sheet):
+        with patch.object(chunker_tasks, "chord") as chord, \
+                patch("documents.mapper.tasks.map_with_template") as map_with_template:
+            result = chunker_tasks.task_process_sheet(str(sheet.id))
+        return result, chord, map_with_template
+
+    def test_exact_layout_uses_the_learned_mapping(self):
+        template = self.learned_template(["Particulars", "FY23", "FY24"])
+        sheet = self.make_sheet(["Particulars", "FY23", "FY24"], template=template)
+        result, chord, map_with_template = self.process(sheet)
+        self.assertEqual(result["source"], "template")
+        map_with_template.assert_called_once()
+        chord.assert_not_called()
+
+    def test_near_match_with_reordered_columns_goes_to_the_llm(self):
+        template = self.learned_template(["Particulars", "FY23", "FY24"])
+        sheet = self.make_sheet(["FY23", "Particulars", "FY24"])
+        matched, similarity = TemplateIndex().match_many([sheet])[0]
+        self.assertEqual(matched, template)
+        self.assertGreaterEqual(similarity, 0.85)
+        sheet.template = matched
+        sheet.save(update_fields=["template"])
+
+        result, chord, map_with_template = self.process(sheet)
+        self.assertEqual(result["status"], "mapping")
+        map_with_template.assert_not_called()
+        chord.assert_called_once()
+
+    def test_chunk_crash_on_the_last_attempt_fails_the_chunk(self):
+        sheet = self.make_sheet(["Particulars", "FY23", "FY24"])
+        chunker_tasks.sync_chunk_plan(sheet, 3)
+        task = mapper_tasks.task_process_chunk
+        task.push_request(retries=task.max_retries)
+        try:
+            with patch("documents.mapper.tasks.schema_map_rows", side_effect=KeyError("choices")):
+                result = task({"sheet_id": str(sheet.id), "chunk_index": 0})
+        finally:
+            task.pop_request()
+        self.assertEqual(result["status"], "failed")
+        chunk = sheet.mapped_chunks.get()
+        self.assertEqual((chunk.status, chunk.error), ("failed", "'choices'"))
+
+    def test_chord_errback_records_the_sheet_as_incomplete(self):
+        sheet = self.make_sheet(["Particulars", "FY23", "FY24"])
+        result, chord, _ = self.process(sheet)
+        callback = chord.return_value.call_args.args[0]
+        self.assertEqual(callback.options["link_error"][0]["task"], mapper_tasks.task_mapping_failed.name)
+
+        mapper_tasks.task_mapping_failed(None, RuntimeError("OPENROUTER_API_KEY is not set"), None, str(sheet.id))
+        self.assertEqual(sheet.mapped_chunks.get().status, "failed")
+        audit = AuditLog.objects.get(sheet_unit=sheet, action="mapping_incomplete")
+        self.assertEqual(audit.details["unfinished"], [0])
+
+    def test_manual_relabel_drops_the_mapping(self):
+        template = self.learned_template(["Particulars", "FY23", "FY24"])
+        sheet = self.make_sheet(["Particulars", "FY23", "FY24"])
+        sheet.classification_source = "manual"
+
+        TemplateIndex().learn([sheet], overwrite=True)
+        self.assertEqual(SheetTemplate.objects.get(id=template.id).schema_mapping, self.MAPPING)
+
+        sheet.classification = "balance_sheet"
+        TemplateIndex().learn([sheet], overwrite=True)
+        template.refresh_from_db()
+        self.assertEqual(template.classification, "balance_sheet")
+        self.assertIsNone(template.schema_mapping)
+
+
+# ------------------------------------------------
+# 🔹 Classifier artifacts and online updates
+# ------------------------------------------------
+class ModelDirMixin:
+    def setUp(self):
+        super().setUp()
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_dir, ignore_errors=True)
+        override = override_settings(SHEET_CLASSIFIER_MODEL_DIR=self.model_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        model_store.reset_cache()
+        self.addCleanup(model_store.reset_cache)
+
+
+class ModelStoreTests(ModelDirMixin, SimpleTestCase):
+    def test_concurrent_publishers_get_distinct_versions(self):
+        paths = []
+        threads = [
+            threading.Thread(target=lambda i=i: paths.append(model_store.save_artifact({"model": i, "meta": {}})))
+            for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(paths)), 8)
+        self.assertEqual(model_store.current_version(), 8)
+
+
+LABELLED = {
+    "pnl": (["Particulars", "FY23", "FY24"], ["Revenue", "EBITDA", "Net income"]),
+    "balance_sheet": (["Particulars", "Mar-23", "Mar-24"], ["Total assets", "Liabilities", "Equity"]),
+}
+
+
+def labelled_sheets(count, source, confidence=1.0):
+    uploaded = UploadedFile.objects.create(filename="book.xlsx")
+    sheets = []
+    for i in range(count):
+        label = sorted(LABELLED)[i % 2]
+        header, items = LABELLED[label]
+        sheets.append(SheetUnit.objects.create(
+            uploaded_file=uploaded, sheet_name=f"{label} {i}", row_count=3, col_count=3, table_index=1,
+            header_rows=[header], sample_rows=[[item, 1, 2] for item in items], metadata={},
+            classification=label, classification_confidence=confidence, classification_source=source,
+            classified_at=timezone.now(),
+        ))
+    return sheets
+
+
+class UploadStatusViewTests(TestCase):
+    def status(self, user, uploaded):
+        request = APIRequestFactory().get(f"/upload_file/{uploaded.file_id}/status/")
+        force_authenticate(request, user=user)
+        return json.loads(UploadStatusView.as_view()(request, file_id=uploaded.file_id).content)
+
+    def test_only_the_uploader_sees_the_status(self):
+        owner = User.objects.create(email="owner@example.com", name="Owner")
+        uploaded = UploadedFile.objects.create(filename="book.xlsx", uploaded_by=owner,
+                                               metadata={"sheet_fingerprints": {"P&L": "abc"}})
+        stranger = User.objects.create(email="stranger@example.com", name="Stranger")
+
+        self.assertEqual(self.status(stranger, uploaded)["exception"]["code"], "404")
+        self.assertTrue(self.status(owner, uploaded)["success"])
+
+
+class SheetUnitLabelViewTests(TestCase):
+    def relabel(self, user, sheet, label):
+        request = APIRequestFactory().patch(f"/sheet_units/{sheet.id}/label/", {"classification": label}, format="json")
+        force_authenticate(request, user=user)
+        return json.loads(SheetUnitLabelView.as_view()(request, pk=sheet.id).content)
+
+    def setUp(self):
+        self.owner = User.objects.create(email="owner@example.com", name="Owner")
+        self.sheet = labelled_sheets(1, "mlclassifier", confidence=0.7)[0]
+        UploadedFile.objects.filter(sheets=self.sheet).update(uploaded_by=self.owner)
+
+    def test_only_the_uploader_can_relabel(self):
+        stranger = User.objects.create(email="stranger@example.com", name="Stranger")
+        self.assertEqual(self.relabel(stranger, self.sheet, "pnl")["exception"]["code"], "404")
+        self.sheet.refresh_from_db()
+        self.assertEqual(self.sheet.classification_source, "mlclassifier")
+
+        self.assertTrue(self.relabel(self.owner, self.sheet, "pnl")["success"])
+        self.sheet.refresh_from_db()
+        self.assertEqual((self.sheet.classification, self.sheet.classification_source), ("pnl", "manual"))
+
+    def test_unknown_labels_are_rejected(self):
+        response = self.relabel(self.owner, self.sheet, "revenue schedule")
+        self.assertEqual(response["exception"]["code"], "400")
+        self.sheet.refresh_from_db()
+        self.assertEqual(self.sheet.classification_source, "mlclassifier")
+        self.assertFalse(SheetTemplate.objects.exists())
+
+
+class OnlineTrainerTests(ModelDirMixin, TestCase):
+
+    def publish_batch_model(self, sheets):
+        clf = MLClassifier(artifact={})
+        clf.train(sheets)
+        model_store.save_artifact(clf.artifact(kind="batch"))
+        model_store.reset_cache()
+
+    @override_settings(SHEET_CLASSIFIER_MIN_ONLINE_LABELS=50)
+    def test_few_manual_labels_do_not_replace_the_batch_model(self):
+        self.publish_batch_model(labelled_sheets(20, "mlclassifier"))
+        labelled_sheets(10, "manual")
+
+        result = OnlineSheetTrainer().update()
+        self.assertFalse(result["published"])
+        self.assertEqual(result["reason"], "too few manual labels to replace the batch model")
+        self.assertEqual(model_store.current_version(), 1)
+
+    def test_first_model_is_published_without_a_batch_model(self):
+        labelled_sheets(10, "manual")
+        self.assertTrue(OnlineSheetTrainer().update()["published"])
+        self.assertEqual(model_store.load_artifact()["meta"]["kind"], "online")
+
+
+class TrainCommandTests(ModelDirMixin, TestCase):
+    def test_rule_and_template_labels_are_not_training_data(self):
+        labelled_sheets(6, "manual")
+        labelled_sheets(6, "mlclassifier", confidence=0.9)
+        labelled_sheets(6, "mlclassifier", confidence=0.5)
+        labelled_sheets(20, "rulebasedclassifier")
+        labelled_sheets(20, "template")
+
+        call_command("train_sheet_classifier", stdout=io.StringIO())
+        meta = model_store.load_artifact()["meta"]
+        self.assertEqual(meta["sources"], {"manual": 6, "mlclassifier": 6})
+        self.assertEqual(meta["samples"], 12)
+
+
+# ------------------------------------------------
+# 🔹 Document type calibration
+# ------------------------------------------------
+class DocTypeCalibrationTests(SimpleTestCase):
+    def synthetic(self, rng, label, categories=4, chunks=3):
+        """Cosines around 0.2, with the true category about 0.15 higher."""
+        sim = np.array([[0.2 + rng.uniform(-0.03, 0.03) for _ in range(categories)] for _ in range(chunks)])
+        if label is not None:
+            sim[:, label] += 0.15
+        return sim
+
+    def test_scale_and_threshold_separate_typed_from_untyped_documents(self):
+        rng = random.Random(11)
+        labels = [i % 4 for i in range(40)] + [None] * 20
+        sims = [self.synthetic(rng, label) for label in labels]
+
+        fitted = doc_types.calibrate(sims, labels, target_precision=1.0)
+        self.assertEqual(fitted["precision"], 1.0)
+        self.assertEqual(fitted["coverage"], round(40 / 60, 3))
+        for sim, label in zip(sims, labels):
+            score = doc_types.document_scores(sim, fitted["logit_scale"]).max()
+            self.assertEqual(score >= fitted["threshold"], label is not None)
+
+    def test_untyped_only_examples_are_rejected(self):
+        with self.assertRaises(ValueError):
+            doc_types.calibrate([np.zeros((1, 3))], [None])
+
+    def test_calibration_file_applies_to_its_own_model_only(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump({"model": "encoder-a", "logit_scale": 30.0, "threshold": 0.4}, f)
+        self.addCleanup(os.remove, f.name)
+        with override_settings(DOC_TYPE_CALIBRATION_FILE=f.name, TEXT_ENCODER_MODEL="encoder-a"):
+            clf = doc_types.FinancialDocClassifier()
+            self.assertEqual((clf.logit_scale, clf.prob_threshold), (30.0, 0.4))
+            other = doc_types.FinancialDocClassifier(model_name="encoder-b")
+            self.assertEqual((other.logit_scale, other.prob_threshold), (doc_types.LOGIT_SCALE, doc_types.PROB_THRESHOLD))
+
+
+class DocTypeRealModelTests(SimpleTestCase):
+    """Needs sentence-transformers and the encoder weights; skipped where they are unavailable."""
+
+    EXAMPLES = [
+        ("balance sheet", "Balance sheet as at 31 March 2024. Non-current assets: property, plant and equipment "
+                          "1,204. Current assets: inventories, trade receivables, cash and cash equivalents. "
+                          "Equity and liabilities: share capital, retained earnings, borrowings. Total assets 5,310."),
+        ("invoice", "Invoice no. 4471. Bill to: Acme Ltd. Item, quantity, unit price, amount. Subtotal 1,200.00, "
+                    "VAT 20% 240.00, total due 1,440.00. Payment due within 30 days."),
+        ("bank statement", "Account statement for the period 1-31 May. Opening balance 10,000.00. Date, "
+                           "description, debit, credit, balance. Card payment, salary credit, ATM withdrawal. "
+                           "Closing balance 8,412.55."),
+    ]
+    UNRELATED = "Preheat the oven to 180 degrees. Whisk the eggs and sugar, fold in the flour and bake for 25 minutes."
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        try:
+            cls.classifier = doc_types.FinancialDocClassifier()
+            cls.classifier.label_vectors()
+        except Exception as e:  # no sentence-transformers, no weights, no hub access
+            raise unittest.SkipTest(f"text encoder unavailable: {e}")
+
+    def test_typed_documents_clear_the_threshold(self):
+        for label, text in self.EXAMPLES:
+            with self.subTest(label=label):
+                result = self.classifier.classify(text)
+                self.assertEqual(result["predicted"], label, result)
+
+    def test_unrelated_text_stays_below_the_threshold(self):
+        result = self.classifier.classify(self.UNRELATED)
+        self.assertLess(result["confidence"], self.classifier.prob_threshold, result)
@@ -1,6 +1,6 @@
 from rest_framework.routers import DefaultRouter
 # from .views import (DocumentUploadViewSet, ParaphrasePDFView, ParaphraseDOCXView ,ParaphraseExcelView, DocumentUploadView,FileTextClassificationView)
-from .views import UploadZipView
+from .views import UploadZipView, UploadStatusView, SheetUnitLabelView
 from django.urls import path
 
 router = DefaultRouter()
@@ -12,5 +12,7 @@ urlpatterns = [
     # path('upload-zip/', DocumentUploadView.as_view(), name='upload-zip'),
     # path('filetype/', FileTextClassificationView.as_view(), name='filetype'),
     path('upload_file/', UploadZipView.as_view(),name='upload_file'),
+    path('upload_file/<uuid:file_id>/status/', UploadStatusView.as_view(),name='upload_file_status'),
+    path('sheet_units/<uuid:pk>/label/', SheetUnitLabelView.as_view(),name='sheet_unit_label'),
 ]
 urlpatterns += router.urls
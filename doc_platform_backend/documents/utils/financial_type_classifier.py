@@ -1,14 +1,41 @@
-import os
-import requests
-from transformers import AutoTokenizer
+import json
+import logging
+
+import numpy as np
+from django.conf import settings
+
+from common.utils.text_encoder import DEFAULT_ENCODER, get_text_encoder
+
+logger = logging.getLogger(__name__)
+
+LABEL_TEMPLATE = "This document is a {}."  # same hypothesis wording zero-shot NLI uses
+# Uncalibrated defaults; `manage.py calibrate_doc_classifier` fits both on labelled documents
+LOGIT_SCALE = 50.0  # cosine similarities are close together; sharpen them before the softmax
+PROB_THRESHOLD = 0.6
+ENCODE_BATCH = 32
+SCALE_GRID = np.geomspace(5.0, 200.0, 60)
+
+# Label embeddings per encoder model, computed once per process
+_label_vectors = {}
+
 
 class FinancialDocClassifier:
-    def __init__(self, prob_threshold: float = 0.6):
-        self.api_url = "https://api-inference.huggingface.co/models/facebook/bart-large-mnli"
-        self.headers = {
-            "Authorization": f"Bearer {os.environ.get('HF_TOKEN')}"
-        }
-        self.prob_threshold = prob_threshold
+    """
+    Zero-shot document type classifier on sentence embeddings.
+
+    The category descriptions are embedded once per process; a document is
+    split into encoder-sized chunks, embedded in batches and scored against
+    every category with one matrix multiply. Per-chunk softmax scores are
+    averaged into the document confidence.
+    """
+
+    def __init__(self, prob_threshold: float | None = None, model_name: str | None = None):
+        self.model_name = model_name
+        calibration = load_calibration(model_name)
+        self.logit_scale = calibration.get("logit_scale", LOGIT_SCALE)
+        self.prob_threshold = prob_threshold if prob_threshold is not None else calibration.get(
+            "threshold", PROB_THRESHOLD
+        )
 
         self.categories = [
             # Core Financial Statements
@@ -46,12 +73,34 @@ class FinancialDocClassifier:
             "financial disclosure", "insurance claim", "grant report", "other"
         ]
 
-        self.tokenizer = AutoTokenizer.from_pretrained("facebook/bart-large-mnli")
-
-    def chunk_text(self, text: str, max_length: int = 512):
-        tokens = self.tokenizer.encode(text, add_special_tokens=False)
+    @property
+    def encoder(self):
+        # Loaded on first use, not when the views module is imported
+        return get_text_encoder(self.model_name)
+
+    def label_vectors(self) -> np.ndarray:
+        key = (id(self.encoder), tuple(self.categories))
+        if key not in _label_vectors:
+            _label_vectors[key] = self.encoder.encode(
+                [LABEL_TEMPLATE.format(label) for label in self.categories],
+                batch_size=ENCODE_BATCH,
+                normalize_embeddings=True,
+            )
+        return _label_vectors[key]
+
+    def chunk_text(self, text: str, max_length: int | None = None):
+        """Split text into chunks within the encoder's max sequence length"""
+        tokenizer = self.encoder.tokenizer
+        max_length = max_length or self.encoder.max_seq_length - 2  # room for [CLS]/[SEP]
+        tokens = tokenizer.encode(text, add_special_tokens=False)
         for i in range(0, len(tokens), max_length):
-            yield self.tokenizer.decode(tokens[i:i+max_length])
+            yield tokenizer.decode(tokens[i:i+max_length])
+
+    def similarities(self, text: str, chunks: list[str] | None = None) -> np.ndarray:
+        """(chunks, categories) cosine similarities of a document."""
+        chunks = list(self.chunk_text(text)) if chunks is None else chunks
+        chunk_vectors = self.encoder.encode(chunks, batch_size=ENCODE_BATCH, normalize_embeddings=True)
+        return chunk_vectors @ self.label_vectors().T
 
     def classify(self, text: str, top_n: int = 3) -> dict:
         """Classify input text into financial document type."""
@@ -59,36 +108,20 @@ class FinancialDocClassifier:
             return {"predicted": "other", "nearest": "other", "confidence": 0.0, "top_n": []}
 
         try:
-            predictions = {}
-
-            for chunk in self.chunk_text(text):
-                payload = {
-                    "inputs": chunk,
-                    "parameters": {"candidate_labels": self.categories}
-                }
-                response = requests.post(self.api_url, headers=self.headers, json=payload)
-                result = response.json()
-
-                if "error" in result:
-                    print(f"[Error] {result['error']}")
-                    continue
-
-                for label, score in zip(result["labels"], result["scores"]):
-                    predictions[label] = predictions.get(label, 0) + score
-
-            if not predictions:
+            chunks = list(self.chunk_text(text))
+            if not chunks:
                 return {"predicted": "other", "nearest": "other", "confidence": 0.0, "top_n": []}
 
-            # Sort predictions
-            sorted_preds = sorted(predictions.items(), key=lambda x: x[1], reverse=True)
+            scores = document_scores(self.similarities(text, chunks), self.logit_scale)
 
-            best_label, best_score = sorted_preds[0]
+            order = np.argsort(scores)[::-1]
+            best_label, best_score = self.categories[order[0]], float(scores[order[0]])
 
             return {
                 "predicted": best_label if best_score >= self.prob_threshold else "other",
                 "nearest": best_label,
                 "confidence": round(best_score, 3),
-
+                "top_n": [(self.categories[i], round(float(scores[i]), 3)) for i in order[:top_n]],
             }
 
         except Exception as e:
@@ -96,3 +129,73 @@ class FinancialDocClassifier:
                 "predicted": "error", "nearest": "error", "confidence": 0.0,
                 "message": str(e)
             }
+
+
+# ------------------------------------------------
+# 🔹 Scoring + calibration
+# ------------------------------------------------
+def document_scores(similarities: np.ndarray, logit_scale: float) -> np.ndarray:
+    """Per-category document score: softmax of the scaled cosines per chunk, averaged over chunks."""
+    logits = logit_scale * similarities
+    logits = logits - logits.max(axis=1, keepdims=True)
+    probs = np.exp(logits)
+    probs /= probs.sum(axis=1, keepdims=True)
+    return probs.mean(axis=0)
+
+
+def calibrate(similarities: list[np.ndarray], labels: list[int | None], target_precision: float = 0.9) -> dict:
+    """
+    Fit the logit scale and acceptance threshold on labelled documents.
+
+    similarities: one (chunks, categories) cosine matrix per document; labels:
+    the true category index, or None for documents of no listed type. The
+    scale minimises the negative log-likelihood of the true categories; the
+    threshold is the lowest document score at which accepted predictions
+    reach `target_precision` (documents of no listed type are never correct).
+    """
+    typed = [(sim, label) for sim, label in zip(similarities, labels) if label is not None]
+    if not typed:
+        raise ValueError("calibration needs documents labelled with one of the categories")
+
+    def nll(scale):
+        return -np.mean([np.log(document_scores(sim, scale)[label] + 1e-12) for sim, label in typed])
+
+    scale = float(min(SCALE_GRID, key=nll))
+
+    best, correct = [], []
+    for sim, label in zip(similarities, labels):
+        scores = document_scores(sim, scale)
+        best.append(float(scores.max()))
+        correct.append(label is not None and int(scores.argmax()) == label)
+    order = np.argsort(best)[::-1]
+    hits = np.cumsum(np.array(correct)[order])
+    precision = hits / np.arange(1, len(order) + 1)
+
+    # Lowest score whose accepted set (everything scoring at least that) meets the target
+    meeting = np.flatnonzero(precision >= target_precision)
+    cut = int(meeting.max()) if len(meeting) else int(precision.argmax())
+    return {
+        "logit_scale": round(scale, 3),
+        "threshold": float(np.floor(best[order[cut]] * 1e4) / 1e4),  # rounded down: the cut document stays accepted
+        "precision": round(float(precision[cut]), 3),
+        "coverage": round((cut + 1) / len(order), 3),
+        "nll": round(float(nll(scale)), 4),
+        "examples": len(labels),
+    }
+
+
+def load_calibration(model_name: str | None = None) -> dict:
+    """Calibrated values for this encoder, or {} (module defaults) when none were fitted for it."""
+    path = getattr(settings, "DOC_TYPE_CALIBRATION_FILE", None)
+    if not path:
+        return {}
+    try:
+        with open(path) as f:
+            calibration = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        logger.warning("Ignoring unreadable document type calibration %s", path)
+        return {}
+    model = model_name or getattr(settings, "TEXT_ENCODER_MODEL", DEFAULT_ENCODER)
+    return calibration if calibration.get("model") == model else {}
@@ -12,8 +12,13 @@ doc_classifier = FinancialDocClassifier()
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .models import UploadedFile
+from django.utils import timezone
+from .models import UploadedFile, SheetUnit, AuditLog
+from .classifier.tasks import SheetClassifier
+from .classifier.templates import TemplateIndex, template_signature
 from documents.extractor.tasks import task_extract_workbook  # celery task
+from common.utils.progress import job_status_payload
+from common.utils.content_hash import uploaded_file_hash
 
 class UploadZipView(APIView):
     def post(self, request):
@@ -25,12 +30,73 @@ class UploadZipView(APIView):
             uploaded = UploadedFile.objects.create(
                 filename=f.name,
                 s3_path=f,  # uses your configured storage backend
-                metadata={"file_size": file_size_mb}
+                metadata={"file_size": file_size_mb},
+                content_hash=uploaded_file_hash(request, f),
+                company_id=request.data.get('company') or None,  # links monthly versions for incremental extraction
+                uploaded_by=request.user if request.user.is_authenticated else None,
             )
-            # enqueue extraction
-            # task_extract_workbook.delay(str(uploaded.file_id)
-            r=task_extract_workbook(str(uploaded.file_id))
-            return JSONResponseSender.send_success({"uploaded_file_id": str(uploaded.file_id),"result":r})
+            # enqueue extraction: one task per sheet, fanned back in by a chord callback
+            job = task_extract_workbook.delay(str(uploaded.file_id))
+            uploaded.job_id = job.id
+            uploaded.save(update_fields=["job_id"])
+            return JSONResponseSender.send_success({"uploaded_file_id": str(uploaded.file_id),"job_id":job.id,"status":uploaded.status})
+        except Exception as e:
+            return JSONResponseSender.send_error("500",str(e),str(e))
+
+
+class UploadStatusView(APIView):
+    """
+    Poll workbook extraction: stage, percent complete and sheets processed so far.
+    """
+    def get(self, request, file_id):
+        uploaded = UploadedFile.objects.filter(file_id=file_id, uploaded_by=request.user).first()
+        if not uploaded:
+            return JSONResponseSender.send_error("404", "Upload not found", "Upload not found")
+        try:
+            sheet_count = (uploaded.metadata or {}).get("sheet_count")
+            progress = uploaded.progress
+            if uploaded.stage == "extracting_sheets" and sheet_count:
+                # 5% for loading, 90% spread over sheets, last 5% for the chord callback
+                progress = 5 + int(90 * uploaded.sheets_done / sheet_count)
+            return JSONResponseSender.send_success({
+                **job_status_payload(uploaded, progress=progress),
+                "uploaded_file_id": str(uploaded.file_id),
+                "sheets_done": uploaded.sheets_done,
+                "sheet_count": sheet_count,
+            })
+        except Exception as e:
+            return JSONResponseSender.send_error("500",str(e),str(e))
+
+
+class SheetUnitLabelView(APIView):
+    """
+    Analyst correction of a sheet's classification; picked up by the online classifier update.
+    """
+    def patch(self, request, pk):
+        label = (request.data.get("classification") or "").strip()
+        if not label:
+            return JSONResponseSender.send_error("400", "classification required", "classification required")
+        if label not in SheetClassifier.LABELS:
+            msg = f"classification must be one of: {', '.join(SheetClassifier.LABELS)}"
+            return JSONResponseSender.send_error("400", msg, msg)
+        sheet = SheetUnit.objects.filter(id=pk, uploaded_file__uploaded_by=request.user).only(*SheetClassifier.CLASSIFY_FIELDS, "template").first()
+        if not sheet:
+            return JSONResponseSender.send_error("404", "Sheet not found", "Sheet not found")
+        try:
+            previous = sheet.classification
+            sheet.classification = label
+            sheet.classification_confidence = 1.0
+            sheet.classification_source = "manual"
+            sheet.classified_at = timezone.now()
+            # The correction also relabels this sheet's layout for future uploads
+            sheet.template = TemplateIndex().learn([sheet], overwrite=True).get(template_signature(sheet))
+            sheet.save(update_fields=SheetClassifier.LABEL_FIELDS + ["template"])
+            AuditLog.objects.create(
+                sheet_unit_id=pk,
+                action="classified_manual",
+                details={"label": label, "previous": previous, "user": getattr(request.user, "pk", None)},
+            )
+            return JSONResponseSender.send_success({"sheet_unit_id": str(pk), "classification": label})
         except Exception as e:
             return JSONResponseSender.send_error("500",str(e),str(e))
 
@@ -1,6 +1,6 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import FileUploadView, GeneratedReportViewSet,AssetAnalysisViewSet
+from .views import FileUploadView, FileUploadStatusView, GeneratedReportViewSet,AssetAnalysisViewSet
 
 router = DefaultRouter()
 router.register(r'reports', GeneratedReportViewSet, basename='reports')
@@ -10,6 +10,7 @@ router.register(r'assets', AssetAnalysisViewSet, basename='assets')
 
 urlpatterns = [
     path("upload/", FileUploadView.as_view(), name="file-upload"),
+    path("upload/<int:pk>/status/", FileUploadStatusView.as_view(), name="file-upload-status"),
 ]
 
 urlpatterns+=router.urls
\ No newline at end of file
@@ -2,10 +2,14 @@ from common.utils.doc_paraphraser import DocumentParaphraser
 from common.utils.pdf_paraphraser import Paraphrasepdf
 from common.utils.excel_pharaphraser import ExcelDataProcessor
 from common.utils.finance_classifire import FinancialTextClassifier
+from common.utils.keyword_matcher import get_keyword_matcher
+from common.utils.document_processor import iter_document_pages, sample_native_pages
+from django.conf import settings
 import os
 import pandas as pd
 import re
 fin_classifier = FinancialTextClassifier()
+SAMPLE_MIN_GLYPHS = 200  # a sample with less native text than this (scans) is not judged before OCR
 def is_financial_text(text: str) -> bool:
     financial_keywords = [
         # Core financial statements
@@ -54,11 +58,14 @@ def is_financial_text(text: str) -> bool:
     ]
 
     text_lower = text.lower()
-    for kw in financial_keywords:
-        print(f"fin_classifier.is_financial(text_lower) :: {fin_classifier.is_financial(text_lower)}")
-        return (fin_classifier.is_financial(text_lower))
+    # Cheap prefilter: without a single finance term there is no need to call the model
+    matcher = get_keyword_matcher(tuple(kw.lower() for kw in financial_keywords), whole_words=True)
+    if not matcher.any_match(text_lower):
+        return False
 
-    return False
+    is_financial = fin_classifier.is_financial(text_lower)
+    print(f"fin_classifier.is_financial(text_lower) :: {is_financial}")
+    return is_financial
 
 
 
@@ -84,3 +91,22 @@ def extract_text_from_file(file_path,file_bytes):
     else:
         return "", "unknown"
 
+
+def iter_pages_from_file(file_path, file_bytes=None):
+    """Streaming form of extract_text_from_file: (page_no, text, source) per page, as soon as it is ready."""
+    return iter_document_pages(file_path, file_bytes)
+
+
+def screen_sampled_pages(file_path, file_bytes=None):
+    """
+    Staged screening: run the keyword prefilter and classifier on the native text
+    of sampled pages (first, middle, last) before anything is OCRed.
+
+    Returns the is_financial_text verdict, or None when the sample carries too
+    little native text to judge (scanned documents) and the full text must decide.
+    """
+    pages = sample_native_pages(file_path, file_bytes, samples=settings.REPORT_SCREEN_SAMPLE_PAGES)
+    text = "\n".join(text for _, text in pages)
+    if sum(1 for c in text if not c.isspace()) < SAMPLE_MIN_GLYPHS:
+        return None
+    return is_financial_text(text)
@@ -0,0 +1,72 @@
+from django.db import transaction
+
+from common.models import UserFile, ExtractedData, GeneratedInsight, Visualization, GeneratedReports
+
+
+def find_reusable_file(user_file):
+    """Latest finished upload with identical bytes by the same user, if any."""
+    if not user_file.content_hash or not user_file.created_by_id:
+        return None
+    return (
+        UserFile.objects
+        .filter(content_hash=user_file.content_hash, status__in=["done", "declined"],
+                created_by_id=user_file.created_by_id)
+        .exclude(id=user_file.id)
+        .order_by("-created_at")
+        .first()
+    )
+
+
+def clone_report_results(source, target):
+    """
+    Copy extraction, insights, charts and the report of `source` onto `target`.
+
+    The generated PDF is shared (same storage path) rather than rendered again.
+    """
+    with transaction.atomic():
+        target.extracted_text = source.extracted_text
+        target.is_valid = source.is_valid
+        target.validation_reason = source.validation_reason
+        target.status = source.status
+        target.reused_from = source
+        target.save(update_fields=["extracted_text", "is_valid", "validation_reason", "status", "reused_from"])
+
+        if source.status != "done":
+            return target
+
+        extracted = ExtractedData.objects.filter(file=source).first()
+        if extracted:
+            ExtractedData.objects.create(
+                file=target,
+                raw_text=extracted.raw_text,
+                tables=extracted.tables,
+                structured_sections=extracted.structured_sections,
+            )
+
+        insight = GeneratedInsight.objects.filter(file=source).first()
+        new_insight = None
+        if insight:
+            new_insight = GeneratedInsight.objects.create(
+                file=target, summary=insight.summary, insights=insight.insights,
+            )
+
+        Visualization.objects.bulk_create([
+            Visualization(
+                file=target,
+                insight=new_insight if viz.insight_id else None,
+                chart_type=viz.chart_type,
+                title=viz.title,
+                config=viz.config,
+            )
+            for viz in Visualization.objects.filter(file=source)
+        ])
+
+        GeneratedReports.objects.bulk_create([
+            GeneratedReports(
+                raw_file=target,
+                report_file=report.report_file.name,
+                file_name=f"{target.file_name}_report.pdf",
+            )
+            for report in GeneratedReports.objects.filter(raw_file=source)
+        ])
+    return target
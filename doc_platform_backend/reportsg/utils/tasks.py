@@ -1,6 +1,8 @@
 from celery import shared_task
 from common.models import UserFile, ExtractedData,GeneratedInsight,Visualization,GeneratedReports
-from .document_processor import extract_text_from_file, is_financial_text
+from django.conf import settings
+from .document_processor import extract_text_from_file, is_financial_text, screen_sampled_pages
+from .reuse import find_reusable_file, clone_report_results
 import pandas as pd
 import numpy as np
 import json
@@ -8,6 +10,7 @@ from ..agents.agent2 import ChartGeneratorAgent
 from ..agents.agnet3 import ReportGeneratorAgent
 from ..agents.agent1 import FinancialDocumentInterpreter
 from pathlib import Path
+from common.utils.progress import report_progress
 from django.core.files import File
 
 FDI=FinancialDocumentInterpreter()
@@ -33,26 +36,49 @@ def dataframe_to_json_serializable(df: pd.DataFrame):
     # Final guard: ensure JSON-safe (NaN -> null, Infinity -> error out)
     return json.loads(json.dumps(records, allow_nan=False))
 
+def _decline(user_file):
+    user_file.is_valid = False
+    user_file.status="declined"
+    user_file.validation_reason = "Document not financial"
+    user_file.save()
+    report_progress(user_file, "declined", 100)
+    return "Not financial"
+
+
 @shared_task
 def preprocess_file_task(file_id):
     try:
         user_file = UserFile.objects.get(id=file_id)
+
+        # Identical bytes were processed before: reuse extraction, insights, charts and PDF
+        previous = find_reusable_file(user_file)
+        if previous:
+            clone_report_results(previous, user_file)
+            report_progress(user_file, user_file.status, 100)
+            return f"Reused results of file {previous.id}"
+
         user_file.status = "processing"
         user_file.save()
-
-        # --- existing code for extraction ---
         file_path = user_file.file.path
         with open(file_path, "rb") as f:
             file_bytes = f.read()
-        text, file_type = extract_text_from_file(file_path, file_bytes)
 
-        if  is_financial_text(text)==False :
+        # Staged screening: judge sampled native pages before paying for OCR; None = sample too thin (scans)
+        screened = None
+        if settings.REPORT_SCREENING == "staged":
+            report_progress(user_file, "screening", 5)
+            screened = screen_sampled_pages(file_path, file_bytes)
+            if screened == False:
+                return _decline(user_file)
 
-            user_file.is_valid = False
-            user_file.status="declined"
-            user_file.validation_reason = "Document not financial"
-            user_file.save()
-            return "Not financial"
+        # --- existing code for extraction ---
+        report_progress(user_file, "extracting", 10)
+        text, file_type = extract_text_from_file(file_path, file_bytes)
+
+        if screened is None:
+            report_progress(user_file, "screening", 30)
+            if  is_financial_text(text)==False :
+                return _decline(user_file)
 
         sections = {"narrative": text}
 
@@ -67,12 +93,14 @@ def preprocess_file_task(file_id):
         user_file.validation_reason = "Financial document detected"
         user_file.save()
 
+        report_progress(user_file, "interpreting", 45)
         summary, insights,tables= FDI.run(text)
         print(f"Summary : {summary} \n  insights: {insights} \n tables : {tables}")
 
         generated_insight = GeneratedInsight.objects.create(file=user_file, summary=summary, insights=insights)
 
         # --- Agent 4 (NEW) ---
+        report_progress(user_file, "charting", 65)
         charts=[]
         if tables:
             charts = CGI.generate_charts(tables)
@@ -86,9 +114,7 @@ def preprocess_file_task(file_id):
                     config=cfg,
                 )
 
-        user_file.status = "done"
-        user_file.save()
-
+        report_progress(user_file, "rendering", 85)
         output_dir = Path("media/reports")
         output_dir.mkdir(parents=True, exist_ok=True)
 
@@ -102,10 +128,13 @@ def preprocess_file_task(file_id):
         )
         print(f"pdf :{pdf}")
 
+        # Only flip to done once the PDF exists, so pollers never see a missing report
+        user_file.status = "done"
+        user_file.save()
+        report_progress(user_file, "done", 100)
+
         return "Report generated Successfully"
 
     except Exception as e:
-        user_file.status = "error"
-        user_file.validation_reason = str(e)
-        user_file.save()
+        UserFile.objects.filter(id=file_id).update(status="error", stage="error", validation_reason=str(e))
         return {"error": str(e)}
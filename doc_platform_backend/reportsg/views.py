@@ -1,4 +1,7 @@
 import os
+from django.conf import settings
+from django.http import Http404
+from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework import viewsets
 from rest_framework.generics import ListAPIView, RetrieveAPIView
@@ -12,6 +15,8 @@ from common.serializers import (
     AssetAnalysisSerializer,
     ReportSerializer,
 )
+from common.utils.progress import job_status_payload
+from common.utils.content_hash import uploaded_file_hash
 from .utils.tasks import preprocess_file_task
 from .utils.AssetAnalysis import FinancialAnalysisPipeline
 
@@ -32,8 +37,9 @@ class FileUploadView(APIView):
         if ext not in [".pdf", ".xls", ".xlsx", ".doc", ".docx"]:
             return JSONResponseSender.send_error("400", "Unsupported file type", "support only excel, docs and pdf")
 
-        if uploaded_file.size > 3 * 1024 * 1024:
-            return JSONResponseSender.send_error("400", "File too large", "Max file size is 3MB")
+        max_mb = settings.REPORT_UPLOAD_MAX_MB
+        if uploaded_file.size > max_mb * 1024 * 1024:
+            return JSONResponseSender.send_error("400", "File too large", f"Max file size is {max_mb}MB")
 
         try:
             obj = UserFile.objects.create(
@@ -43,20 +49,37 @@ class FileUploadView(APIView):
                 is_valid=True,
                 validation_reason="Passed initial validation",
                 created_by=created_by,
+                content_hash=uploaded_file_hash(request, uploaded_file),
             )
-            response=preprocess_file_task(obj.id)
-            obj.refresh_from_db()
-
-            if "Report generated Successfully" in response:
-                return JSONResponseSender.send_success(
-                {"file_id": obj.id, "status": obj.status, "valid": obj.is_valid, "message":"Report generated Successfully","uploaded_by":obj.created_by.name},
+            # Processing (OCR, classification, LLM, PDF) runs on a worker; poll the status endpoint
+            job = preprocess_file_task.delay(obj.id)
+            obj.job_id = job.id
+            obj.save(update_fields=["job_id"])
+
+            return JSONResponseSender.send_success(
+                {"file_id": obj.id, "job_id": job.id, "status": obj.status, "valid": obj.is_valid,
+                 "message": "File queued for processing", "uploaded_by": obj.created_by.name},
             )
-            elif "Not financial" in response:
-                return JSONResponseSender.send_error("400","Document not financial","Document not financial")
 
-            else:
-                return JSONResponseSender.send_error("400",response.get("error", "Unknown error"),response.get("error", "Unknown error"))
+        except Exception as e:
+            return JSONResponseSender.send_error("500", str(e), str(e))
 
+
+class FileUploadStatusView(APIView):
+    """
+    Poll the processing pipeline of an uploaded report file.
+    """
+    def get(self, request, pk):
+        try:
+            obj = get_object_or_404(UserFile, id=pk, created_by=request.user)
+            return JSONResponseSender.send_success(job_status_payload(
+                obj,
+                file_id=obj.id,
+                valid=obj.is_valid,
+                message=obj.validation_reason,
+            ))
+        except Http404:
+            return JSONResponseSender.send_error("404", "File not found", "File not found")
         except Exception as e:
             return JSONResponseSender.send_error("500", str(e), str(e))
 
@@ -1,12 +1,18 @@
 "use client";
-import React, { useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import UploadSection from "./components/UploadSection";
 import UploadedDocumentList from "./components/UploadedDocumentList";
 import GenerateReportButton from "./components/GenerateReportButton";
 import InfoCard from "./components/InfoCard";
 import BackendReportsList from "./components/BackendReportsList";
 import { Upload, TrendingUp, Download } from "lucide-react";
-import { uploadReportFile, listReports } from "./services/uploadService";
+import { uploadReportFile, getUploadStatus, TERMINAL_UPLOAD_STATUSES } from "./services/uploadService";
+
+// Status polling: back off from 2s to 15s, give up after 15 minutes or 3 failed checks in a row
+const POLL_INITIAL_MS = 2000;
+const POLL_MAX_MS = 15000;
+const POLL_DEADLINE_MS = 15 * 60 * 1000;
+const MAX_STATUS_FAILURES = 3;
 
 interface UploadedDocument {
   id: string;
@@ -24,6 +30,10 @@ export default function FinancialReportGenerator() {
   const [isGenerating, setIsGenerating] = useState(false);
   const [reportsRefreshToken, setReportsRefreshToken] = useState(0);
   const [toast, setToast] = useState<{ message: string; type: "success" | "error" } | null>(null);
+  const pollAbort = useRef<AbortController | null>(null);
+
+  // stop polling when the page is left
+  useEffect(() => () => pollAbort.current?.abort(), []);
 
   // ✅ Handle file select (store only; do NOT call backend yet)
   const handleFileUpload = (files: FileList | null) => {
@@ -57,7 +67,14 @@ export default function FinancialReportGenerator() {
   };
 
   // ✅ Generate report: now triggers backend upload for selected file(s)
-  const sleep = (ms: number) => new Promise((r) => setTimeout(r, ms));
+  const sleep = (ms: number, signal: AbortSignal) =>
+    new Promise<void>((resolve) => {
+      const timer = setTimeout(resolve, ms);
+      signal.addEventListener("abort", () => {
+        clearTimeout(timer);
+        resolve();
+      }, { once: true });
+    });
 
   const generateReport = async () => {
     if (uploadedDocs.length === 0) {
@@ -86,25 +103,53 @@ export default function FinancialReportGenerator() {
       return;
     }
 
-    // mark as completed and clear the uploaded item from the list
-    setUploadedDocs((prev) => prev.filter((d) => d.id !== target.id));
-
-    // Show success toast (use backend message if present)
-    const backendMsg = (data && (data.message || data.data?.message)) || "Report generated Successfully";
-    setToast({ message: backendMsg, type: "success" });
-
-    // Poll the reports endpoint until the new report appears (up to ~5s)
+    // upload accepted: processing continues on the backend, poll its status
     const fileId = (data && (data.data?.file_id || data.file_id)) as number | undefined;
-    let found = false;
-    for (let i = 0; i < 5; i++) {
-      await sleep(1000);
-      const rep = await listReports();
-      if (rep.ok && Array.isArray(rep.data) && fileId) {
-        if (rep.data.some((it) => it.raw_file?.id === fileId)) {
-          found = true;
-          break;
-        }
+    pollAbort.current?.abort();
+    const controller = new AbortController();
+    pollAbort.current = controller;
+
+    let finalStatus = fileId ? "processing" : "error";
+    let finalMessage = fileId ? "" : "Upload response did not include a file id";
+    const deadline = Date.now() + POLL_DEADLINE_MS;
+    let delay = POLL_INITIAL_MS;
+    let failures = 0;
+    while (fileId) {
+      await sleep(delay, controller.signal);
+      if (controller.signal.aborted) return; // unmounted: nothing left to update
+      if (Date.now() > deadline) {
+        finalStatus = "error";
+        finalMessage = "Report generation is taking longer than expected; check the reports list later";
+        break;
+      }
+      delay = Math.min(delay * 2, POLL_MAX_MS);
+
+      const st = await getUploadStatus(fileId, controller.signal);
+      if (controller.signal.aborted) return;
+      if (!st.ok || !st.data) {
+        // transient failures are retried with the same backoff
+        failures += 1;
+        if (failures < MAX_STATUS_FAILURES) continue;
+        finalStatus = "error";
+        finalMessage = st.error || "Status check failed";
+        break;
       }
+      failures = 0;
+      if (TERMINAL_UPLOAD_STATUSES.includes(st.data.status)) {
+        finalStatus = st.data.status;
+        finalMessage = st.data.message || "";
+        break;
+      }
+    }
+    pollAbort.current = null;
+
+    if (finalStatus === "done") {
+      // mark as completed and clear the uploaded item from the list
+      setUploadedDocs((prev) => prev.filter((d) => d.id !== target.id));
+      setToast({ message: "Report generated Successfully", type: "success" });
+    } else {
+      setUploadedDocs((prev) => prev.map((d) => (d.id === target.id ? { ...d, status: "error" } : d)));
+      setToast({ message: finalMessage || "Report generation failed", type: "error" });
     }
 
     // bump refresh token to reload reports list
@@ -49,3 +49,31 @@ export async function listReports(): Promise<UploadResult & { data?: ReportListI
     return { ok: false, error: message };
   }
 }
+
+export type UploadStatus = {
+  file_id: number;
+  status: string; // uploaded | processing | done | declined | error
+  stage: string;
+  progress: number; // 0-100
+  job_id?: string;
+  message?: string;
+};
+
+export const TERMINAL_UPLOAD_STATUSES = ["done", "declined", "error"];
+
+export async function getUploadStatus(
+  fileId: number,
+  signal?: AbortSignal,
+): Promise<UploadResult & { data?: UploadStatus }> {
+  try {
+    const res = await api.get(`/upload/${fileId}/status/`, { signal });
+    const payload = res.data?.data ?? res.data;
+    return { ok: true, data: payload as UploadStatus };
+  } catch (err: any) {
+    const status = err?.response?.status;
+    const payload = err?.response?.data;
+    const message = (payload && (payload.error || payload.detail)) ||
+      (status ? `Status check failed with status ${status}` : (err?.message || "Network error while checking status"));
+    return { ok: false, error: message };
+  }
+}